@@ -93,17 +93,40 @@ class ActionsController(object):
         """Notify the update of the monitoring."""
         self.machines_control_manager.pm_monitoring = self.machines_monitoring()
 
-    def monitor_again(self):
-        """Notify the monitoring controller to monitor again."""
-        self.monitoring_controller.monitor_again()
+    def monitor_again(self, changed=()):
+        """Notify the monitoring controller to monitor again.
 
-    def new_metrics(self, metrics: dict):
+        :param changed: Hostnames of the machines that have just changed
+        :type changed: list[str]
+        """
+        self.monitoring_controller.monitor_again(changed)
+
+    def metric_history(self):
+        """Get the metric history from the monitoring controller.
+
+        :return: metric history
+        :rtype: MetricHistory
+        """
+        return self.monitoring_controller.metric_history()
+
+    def new_metrics(self, metrics: dict, snapshot=None):
         """Get the new metrics from the monitoring controller.
 
         :param metrics: new metrics
         :type metrics: dict
+        :param snapshot: columnar snapshot of the new metrics
+        :type snapshot: FleetSnapshot
+        """
+        self.machines_control_manager.new_metrics(metrics, snapshot)
+
+    def notify_status_updated(self, m_ip: str):
+        """Notify the machines control manager of a new energy status in the database.
+
+        :param m_ip: management IP of the machine
+        :type m_ip: str
         """
-        self.machines_control_manager.new_metrics(metrics)
+        if self.machines_control_manager is not None:
+            self.machines_control_manager.forget_power_state(m_ip)
 
     def notify_machine_status(self, machine_list: list[Machine]):
         """Notify the status of a machine to the machine manager.
@@ -219,7 +242,16 @@ def _get_vm_optimizations(name: str = None):
     **Returns**: A dict with the vm optimizations
 
     **Raises**: HTTPException (status code 404): VM Optimization not found
+
+    **Raises**: HTTPException (status code 503): Machines control not running
     """
+    # Check if the machines control manager is running
+    if actions_controller.machines_control_manager.trio_token is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The machines control manager is not running",
+        )
+
     # If a name is provided, check if the vm optimization exists
     if name:
         if (
@@ -247,7 +279,16 @@ def _get_pm_optimizations(name: str = None):
     **Returns**: A dict with the pm optimizations
 
     **Raises**: HTTPException (status code 404): PM Optimization not found
+
+    **Raises**: HTTPException (status code 503): Machines control not running
     """
+    # Check if the machines control manager is running
+    if actions_controller.machines_control_manager.trio_token is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The machines control manager is not running",
+        )
+
     # If a name is provided, check if the pm optimization exists
     if name:
         if (
@@ -164,6 +164,10 @@ class MachineManager(object):
         db_session.add(machine_model)
         db_session.commit()
 
+        # The cached power state of the machine is not valid anymore
+        if self.actions_controller is not None:
+            self.actions_controller.notify_status_updated(machine_model.management_ip)
+
         # Log the machine status
         LOG.critical(
             f"Machine with hostname: {hostname} updated: energy status to {energy_status}"
@@ -1,5 +1,7 @@
 """API endpoints for the monitoring controller."""
 
+from datetime import datetime
+
 from fastapi import APIRouter, HTTPException, status
 
 from cems2 import log
@@ -7,6 +9,7 @@ from cems2.schemas.machine import Machine
 from cems2.schemas.message import Message
 from cems2.schemas.metric import Metric
 from cems2.schemas.plugin import Plugin
+from cems2.schemas.sample import Sample
 
 # Create the monitoring controller router
 monitoring = APIRouter()
@@ -77,13 +80,31 @@ class MonitoringController(object):
             self.machines_monitoring_and_on()
         )
 
-    def monitor_again(self):
-        """Notify to the CloudAnalyticsManager to monitor again."""
-        self.cloud_analytics_manager.running = True
+    def monitor_again(self, changed=()):
+        """Notify to the CloudAnalyticsManager to monitor again.
+
+        :param changed: Hostnames of the machines that have just changed
+        :type changed: list[str]
+        """
+        self.cloud_analytics_manager.monitor_again(changed)
 
-    def notify_new_metrics(self, metrics: dict):
-        """Notify to the ActionsController a new metrics update."""
-        self.actions_controller.new_metrics(metrics)
+    def metric_history(self):
+        """Get the metric history of the CloudAnalyticsManager.
+
+        :return: metric history
+        :rtype: MetricHistory
+        """
+        return self.cloud_analytics_manager.history
+
+    def notify_new_metrics(self, metrics: dict, snapshot=None):
+        """Notify to the ActionsController a new metrics update.
+
+        :param metrics: new metrics
+        :type metrics: dict
+        :param snapshot: columnar snapshot of the new metrics
+        :type snapshot: FleetSnapshot
+        """
+        self.actions_controller.new_metrics(metrics, snapshot)
 
 
 # Create the monitoring controller
@@ -117,14 +138,14 @@ def _get_metrics(metric_name: str = None):
     # Obtain the metrics from the Cloud Analytics Application
     metric_dict = monitoring_controller.cloud_analytics_manager.obtain_last_metrics()
 
-    # Filter the metrics by metric_name
+    # Filter the metrics by metric_name (in a new dict, the obtained one is shared)
     if metric_name:
-        # For each machine in the dict of metrics (key: hostname, value: list of metrics)
-        for machine in metric_dict:
-            # Filter the metrics by metric_name
-            metric_dict[machine] = [
-                metric for metric in metric_dict[machine] if metric.name == metric_name
-            ]
+        # For each machine in the dict of metrics
+        # (key: hostname, value: list of metrics)
+        metric_dict = {
+            machine: [metric for metric in metric_list if metric.name == metric_name]
+            for machine, metric_list in metric_dict.items()
+        }
 
     # Return the dict of metrics
     return metric_dict
@@ -234,6 +255,73 @@ def _get_metrics_by_hostname(hostname: str, metric_name: str = None):
         return metric_dict[machine.hostname]
 
 
+@monitoring.get(
+    "/monitoring/history/hostname={hostname}",
+    summary="Get the history of a metric of a machine identified by its hostname",
+    status_code=status.HTTP_200_OK,
+    response_model=list[Sample],
+)
+def _get_metric_history_by_hostname(
+    hostname: str,
+    metric_name: str,
+    start: datetime = None,
+    end: datetime = None,
+    resolution: str = "raw",
+):
+    """
+    Get the history of a metric of a machine by its hostname with the following data:
+
+    - **timestamp**: Timestamp of the sample (start of the aggregate)
+    - **value**: Value of the sample (mean of the aggregate)
+    - **min**: Minimum value of the aggregate
+    - **max**: Maximum value of the aggregate
+    - **count**: Number of samples of the aggregate
+
+    **Returns**: A list of samples
+
+    **Optional filters:** The history can be filtered by the following parameters:
+    - **start**: Start of the range
+    - **end**: End of the range
+    - **resolution**: Resolution of the history (raw, 1m or 1h)
+
+    **Raises:**
+    - **HTTPException: 400**: If the machine does not exist by its hostname
+    - **HTTPException: 400**: If the resolution is not valid
+    """
+
+    # Check if the machine exists and raise an exception if it does not
+    machine = monitoring_controller.machine_manager.get_machine_by_hostname(hostname)
+
+    if not machine:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Machine with hostname: {hostname} does not exist",
+        )
+
+    # Obtain the history from the Cloud Analytics Application
+    try:
+        samples = monitoring_controller.cloud_analytics_manager.obtain_metric_history(
+            hostname, metric_name, start, end, resolution
+        )
+    except ValueError as err:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(err),
+        )
+
+    # Convert the samples to the schema
+    return [
+        Sample(
+            timestamp=datetime.fromtimestamp(timestamp),
+            value=value,
+            min=minimum,
+            max=maximum,
+            count=count,
+        )
+        for timestamp, value, minimum, maximum, count in samples
+    ]
+
+
 @monitoring.get(
     "/monitoring/plugins",
     summary="Get the plugins installed by type and status",
@@ -33,22 +33,24 @@ async def start_cloud_analytics_manager(cloud_analytics_manager):
     """Start the Cloud Analytics Manager."""
     try:
         LOG.info("Starting Cloud Analytics Manager")
-        # Run the Cloud Analytics Manager in a separate thread
-        await trio.to_thread.run_sync(cloud_analytics_manager.run, cancellable=True)
+        # Run the Cloud Analytics Manager as a task of the main event loop
+        await cloud_analytics_manager.run()
     except trio.Cancelled:
         # If the Cloud Analytics Manager stops, log it
         LOG.critical("Cloud Analytics Manager stopped")
+        raise
 
 
 async def start_machines_control_manager(machines_control_manager):
     """Start the Machine Control Manager."""
     try:
         LOG.info("Starting Machine Control Manager")
-        # Run the Machine Control Manager in a separate thread
-        await trio.to_thread.run_sync(machines_control_manager.run, cancellable=True)
+        # Run the Machine Control Manager as a task of the main event loop
+        await machines_control_manager.run()
     except trio.Cancelled:
         # If the Machine Control Manager stops, log it
         LOG.critical("Machine Control Manager stopped")
+        raise
 
 
 async def async_main():
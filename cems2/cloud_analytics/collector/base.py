@@ -6,10 +6,24 @@ from abc import ABCMeta, abstractmethod
 class MetricCollectorBase(metaclass=ABCMeta):
     """Allows to collect the metrics obtained through the plug-ins."""
 
+    # If the collector queries several machines at once in collect_metrics_batch
+    supports_batch = False
+
     @abstractmethod
     def __init__(self):
         """Initialize the connection to the cloud platform."""
 
+    async def open(self):
+        """Open the resources shared by all the collections (optional).
+
+        The collector is instantiated only once, so the sessions, connection
+        pools or authentication tokens opened here are reused for every
+        machine and every monitoring interval.
+        """
+
+    async def close(self):
+        """Close the resources opened by the collector (optional)."""
+
     @abstractmethod
     async def collect_metric(self, machine_id):
         """Collect the metric from the cloud platform.
@@ -20,3 +34,18 @@ class MetricCollectorBase(metaclass=ABCMeta):
         :return: The metric.
         :rtype: Metric
         """
+
+    async def collect_metrics_batch(self, machine_ids):
+        """Collect the metric of several machines in a single query.
+
+        The collector manager calls this method instead of collect_metric for
+        each machine when supports_batch is True. By default, the machines
+        are collected one after the other with collect_metric.
+
+        :param machine_ids: The IDs of the machines.
+        :type machine_ids: list[str]
+
+        :return: The metrics (one for each machine obtained).
+        :rtype: list[Metric]
+        """
+        return [await self.collect_metric(machine_id) for machine_id in machine_ids]
@@ -1,5 +1,7 @@
 """Collector Manager module."""
 
+from contextlib import AsyncExitStack, asynccontextmanager
+
 import trio
 
 from cems2 import config_loader, log
@@ -15,8 +17,12 @@ CONFIG = config_loader.get_config()
 class Manager(object):
     """Manager for the Cloud Analytics Collectors."""
 
-    def __init__(self):
-        """Initialize the collector manager."""
+    def __init__(self, limiter=None):
+        """Initialize the collector manager.
+
+        :param limiter: Global limiter of the concurrent collections
+        :type limiter: trio.CapacityLimiter
+        """
         # Obtain the list of collectors configured in the config file
         collectors_list = CONFIG.getlist("cloud_analytics.plugins", "collectors")
 
@@ -30,49 +36,193 @@ class Manager(object):
                 raise RuntimeError(f"Collector plugin '{collector}' is not installed.")
 
         # Get the collectors from the plugin loader
-        collectors = [(i, plugin_loader.get_collectors()[i]) for i in collectors_list]
+        installed_collectors = plugin_loader.get_collectors()
+        collectors = [(i, installed_collectors[i]) for i in collectors_list]
+
+        # Create an instance of each collector (Only one object for each collector)
+        collectors = [(i, j()) for i, j in collectors]
+
         self.collectors = collectors
         LOG.debug("Collectors loaded: %s", collectors_list)
 
         # Set the collector plugin timeout
         self.timeout = CONFIG.getint("cloud_analytics", "collector_timeout")
 
+        # Set the global limiter of concurrent collections
+        self.limiter = limiter
+
+        # Set the limiters of concurrent collections of each collector (optional)
+        self.collector_limiters = {}
+        if CONFIG.has_section("cloud_analytics.max_concurrency"):
+            for collector_name, _ in self.collectors:
+                max_concurrency = CONFIG.getint(
+                    "cloud_analytics.max_concurrency", collector_name, fallback=None
+                )
+                if max_concurrency is not None:
+                    self.collector_limiters[collector_name] = trio.CapacityLimiter(
+                        max_concurrency
+                    )
+                    LOG.debug(
+                        "Max concurrency of the collector '%s' set to %s",
+                        collector_name,
+                        max_concurrency,
+                    )
+
+    async def open(self):
+        """Open the shared resources of all the collectors."""
+        async with trio.open_nursery() as nursery:
+            for collector_name, collector in self.collectors:
+                LOG.debug("Opening the collector '%s'", collector_name)
+                nursery.start_soon(collector.open)
+
+    async def close(self):
+        """Close the shared resources of all the collectors."""
+        for collector_name, collector in self.collectors:
+            LOG.debug("Closing the collector '%s'", collector_name)
+            try:
+                await collector.close()
+            except Exception as e:
+                LOG.error("Error closing the collector '%s': %s", collector_name, e)
+
     async def get_metrics(self, machine_id):
         """Get the metric list from the collectors for the instance.
 
+        All the collectors run concurrently, each one with its own timeout,
+        so the collection is bounded by the slowest collector.
+
         :param machine_id: The ID of the machine
         :type machine_id: str
 
         :return: The metric list
         :rtype: list[Metric]
         """
-        metric_list = []
-
-        for collector_name, collector_cls in self.collectors:
-            # Create an async task for each collector and set a timeout
-            with trio.move_on_after(self.timeout) as cancel_scope:
-                async with trio.open_nursery() as nursery:
-                    nursery.start_soon(
-                        self._obtain_metrics, collector_cls, machine_id, metric_list
-                    )
-
-            if cancel_scope.cancelled_caught:
-                LOG.error(
-                    "Timeout reached for the collector '%s' from the machine %s",
+        # One slot for each collector to keep the configured order
+        results = [None] * len(self.collectors)
+
+        # Create an async task for each collector
+        async with trio.open_nursery() as nursery:
+            for index, (collector_name, collector) in enumerate(self.collectors):
+                nursery.start_soon(
+                    self._obtain_metrics_with_timeout,
                     collector_name,
+                    collector,
                     machine_id,
+                    results,
+                    index,
                 )
 
-        return metric_list
+        # Return the partial results (without the collectors that timed out)
+        return [metric for metric in results if metric is not None]
 
-    async def _obtain_metrics(self, collector, machine_id, metric_list):
+    async def _obtain_metrics_with_timeout(
+        self, collector_name, collector, machine_id, results, index
+    ):
+        # Wait for a free slot before starting the timeout of the collector
+        async with self._limit(collector_name):
+            # Set a timeout for the collector
+            with trio.move_on_after(self.timeout) as cancel_scope:
+                results[index] = await self._obtain_metrics(
+                    collector_name, collector, machine_id
+                )
+
+        if cancel_scope.cancelled_caught:
+            LOG.error(
+                "Timeout reached for the collector '%s' from the machine %s",
+                collector_name,
+                machine_id,
+            )
+
+    @asynccontextmanager
+    async def _limit(self, collector_name):
+        """Hold a slot of the global limiter and of the collector limiter.
+
+        :param collector_name: The name of the collector
+        :type collector_name: str
+        """
+        async with AsyncExitStack() as stack:
+            # Take the collector slot first to not hold a global slot while waiting
+            if collector_name in self.collector_limiters:
+                await stack.enter_async_context(self.collector_limiters[collector_name])
+            if self.limiter is not None:
+                await stack.enter_async_context(self.limiter)
+            yield
+
+    async def _obtain_metrics(self, collector_name, collector, machine_id):
         LOG.info(
             "Collecting metrics from '%s', from the machine %s",
-            collector.__name__,
+            collector_name,
             machine_id,
         )
-        metric = await collector().collect_metric(machine_id)
-        metric_list.append(metric)
+        return await collector.collect_metric(machine_id)
+
+    async def get_metrics_batch(self, machine_ids):
+        """Get the metric lists from the collectors for several machines.
+
+        The collectors that support the batch collection are queried once
+        for all the machines, the rest of them once for each machine.
+
+        :param machine_ids: The IDs of the machines
+        :type machine_ids: list[str]
+
+        :return: The metric list of each machine
+        :rtype: dict{key: hostname, value: list[Metric]}
+        """
+        # One dict for each collector (key: hostname, value: Metric)
+        results = [{} for _ in self.collectors]
+
+        # Create an async task for each collector
+        async with trio.open_nursery() as nursery:
+            for index, (collector_name, collector) in enumerate(self.collectors):
+                if collector.supports_batch:
+                    nursery.start_soon(
+                        self._obtain_metrics_batch_with_timeout,
+                        collector_name,
+                        collector,
+                        machine_ids,
+                        results[index],
+                    )
+                else:
+                    for machine_id in machine_ids:
+                        nursery.start_soon(
+                            self._obtain_metrics_with_timeout,
+                            collector_name,
+                            collector,
+                            machine_id,
+                            results[index],
+                            machine_id,
+                        )
+
+        # Group the metrics by machine keeping the configured collectors order
+        return {
+            machine_id: [
+                result[machine_id] for result in results if machine_id in result
+            ]
+            for machine_id in machine_ids
+        }
+
+    async def _obtain_metrics_batch_with_timeout(
+        self, collector_name, collector, machine_ids, results
+    ):
+        # Wait for a free slot before starting the timeout of the collector
+        async with self._limit(collector_name):
+            # Set a timeout for the collector
+            with trio.move_on_after(self.timeout) as cancel_scope:
+                LOG.info(
+                    "Collecting metrics from '%s', from %s machines",
+                    collector_name,
+                    len(machine_ids),
+                )
+                metric_list = await collector.collect_metrics_batch(machine_ids)
+
+                for metric in metric_list:
+                    results[metric.hostname] = metric
+
+        if cancel_scope.cancelled_caught:
+            LOG.error(
+                "Timeout reached for the collector '%s' from %s machines",
+                collector_name,
+                len(machine_ids),
+            )
 
     def get_installed_plugins(self):
         """Get the list of installed collectors.
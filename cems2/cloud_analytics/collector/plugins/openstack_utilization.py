@@ -17,8 +17,16 @@ class OpenStackUtilization(MetricCollectorBase):
 
     def __init__(self):
         """Initialize the connection to the OpenStack cloud platform."""
+        self.session = None
+
+    async def open(self):
+        """Open a session to the OpenStack cloud platform (shared by all hosts)."""
         # TODO: Open a session to the OpenStack cloud platform
 
+    async def close(self):
+        """Close the session to the OpenStack cloud platform."""
+        self.session = None
+
     async def collect_metric(self, machine_id):
         """Collect the utilization metric from the OpenStack cloud platform."""
         LOG.info(
@@ -30,6 +38,7 @@ class OpenStackUtilization(MetricCollectorBase):
             unit="%",
             timestamp=datetime.now(),
             hostname=machine_id,
+            collected_by="openstack_utilization",
         )
         rich.print("OPENSTACK-UTILIZATION", metric)
         return metric
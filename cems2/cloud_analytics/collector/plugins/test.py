@@ -1,6 +1,5 @@
 """Metric collector test plug-in."""
 
-import json
 import random
 from datetime import datetime
 
@@ -33,15 +32,11 @@ class Test(MetricCollectorBase):
         # Simulate a delay in the collection of the metric
         await trio.sleep(random.randint(1, 5))
 
-        # Generate a payload with a random value and a unit of %
-        payload = {"value": round(random.uniform(0, 100), 3), "unit": "%"}
-
-        # Coverting the payload to json
-        payload_json = json.dumps(payload)
-
+        # Generate a metric with a random value and a unit of %
         metric = Metric(
             name="test",
-            payload=payload_json,
+            value=round(random.uniform(0, 100), 3),
+            unit="%",
             timestamp=datetime.now(),
             hostname=machine_id,
             collected_by="test",
@@ -1,6 +1,5 @@
 """Metric collector test2 plug-in."""
 
-import json
 import random
 from datetime import datetime
 
@@ -33,15 +32,11 @@ class Test2(MetricCollectorBase):
         # Simulate a delay in the collection of the metric
         await trio.sleep(random.randint(5, 15))
 
-        # Generate a payload with a random value and a unit of MB/s
-        payload = {"value": round(random.uniform(1000, 2000), 3), "unit": "MB/s"}
-
-        # Coverting the payload to json
-        payload_json = json.dumps(payload)
-
+        # Generate a metric with a random value and a unit of MB/s
         metric = Metric(
             name="test2",
-            payload=payload_json,
+            value=round(random.uniform(1000, 2000), 3),
+            unit="MB/s",
             timestamp=datetime.now(),
             hostname=machine_id,
             collected_by="test2",
@@ -1,6 +1,5 @@
 """Metric collector utilization test plug-in."""
 
-import json
 import random
 from datetime import datetime
 
@@ -38,15 +37,11 @@ class TestUtilization(MetricCollectorBase):
             random.choice([random.uniform(0, 100), 3, 0.0])
         )  # To have more chances of having 0.0
 
-        # Generate a payload with a random value and a unit of %
-        payload = {"value": value, "unit": "%"}
-
-        # Coverting the payload to json
-        payload_json = json.dumps(payload)
-
+        # Generate a metric with the random value and a unit of %
         metric = Metric(
             name="utilization",
-            payload=payload_json,
+            value=value,
+            unit="%",
             timestamp=datetime.now(),
             hostname=machine_id,
             collected_by="testUtilization",
@@ -1,6 +1,5 @@
 """Metric collector utilization test plug-in."""
 
-import json
 import random
 import uuid
 from datetime import datetime
@@ -11,6 +10,7 @@ import trio
 from cems2 import log
 from cems2.cloud_analytics.collector.base import MetricCollectorBase
 from cems2.schemas.metric import Metric
+from cems2.schemas.vm import VM, Amount
 
 # Get the logger
 LOG = log.get_logger(__name__)
@@ -41,24 +41,21 @@ class TestVMs(MetricCollectorBase):
 
         for _ in range(num_vms):
             vms_list.append(
-                {
-                    "vcpus": random.randint(1, 8),
-                    "memory": {"amount": random.randint(1024, 8192), "unit": "MB"},
-                    "disk": {"amount": random.randint(10, 50), "unit": "GB"},
-                    "managed_by": "test",  # The VM connector that manages the VM
-                }
+                VM(
+                    vcpus=random.randint(1, 8),
+                    memory=Amount(amount=random.randint(1024, 8192), unit="MB"),
+                    disk=Amount(amount=random.randint(10, 50), unit="GB"),
+                    managed_by="test",  # The VM connector that manages the VM
+                )
             )
 
         # Create a dict with the VMs
         vms_dict = {str(uuid.uuid4()): vm for vm in vms_list}
 
-        # Convert the dict to a json
-        vms_json = json.dumps(vms_dict)
-
         # Create a multiple metric
         metric = Metric(
             name="vms",
-            payload=vms_json,
+            vms=vms_dict,
             timestamp=datetime.now(),
             hostname=machine_id,
             collected_by="test_VMs",
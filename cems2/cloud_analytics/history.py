@@ -0,0 +1,568 @@
+"""Embedded time-series history of the collected metrics."""
+
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from cems2 import log
+from cems2.cloud_analytics.ring_buffer import RingBuffer
+
+# Get the logger
+LOG = log.get_logger(__name__)
+
+# Resolutions of the history (raw samples and aggregates of 1 minute and 1 hour)
+RAW = "raw"
+MINUTE = "1m"
+HOUR = "1h"
+
+# Width of the aggregates of each resolution (seconds)
+ROLLUPS = {MINUTE: 60, HOUR: 3600}
+
+RESOLUTIONS = (RAW, MINUTE, HOUR)
+
+# Maximum length of the names of the files of the on-disk history
+MAX_FILE_NAME = 200
+
+
+def _check_resolution(resolution):
+    """Check that a resolution of the history is valid.
+
+    :param resolution: Resolution of the history
+    :type resolution: str
+
+    :raises ValueError: If the resolution is not valid
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f"Resolution '{resolution}' is not one of {RESOLUTIONS}")
+
+
+def _get_range(start, end):
+    """Get the timestamps of a range.
+
+    :param start: Start of the range (all the history if None)
+    :type start: datetime
+    :param end: End of the range (until now if None)
+    :type end: datetime
+
+    :return: The start and end timestamps
+    :rtype: tuple(float, float)
+    """
+    start = start.timestamp() if start is not None else float("-inf")
+    end = end.timestamp() if end is not None else float("inf")
+    return start, end
+
+
+class _Columns(object):
+    """Append-only columns of floats stored in fixed-size array chunks.
+
+    The first column is the timestamp (ascending), so the chunks can be
+    sliced by time with a binary search and expired as a whole.
+    """
+
+    def __init__(self, width, chunk_size):
+        """Initialize the columns.
+
+        :param width: Number of columns
+        :type width: int
+        :param chunk_size: Number of rows of each chunk
+        :type chunk_size: int
+        """
+        self.width = width
+        self.chunk_size = chunk_size
+        self.chunks = []
+
+    def append(self, row):
+        """Append a row (the timestamp first).
+
+        :param row: Values of the columns
+        :type row: tuple(float)
+        """
+        if not self.chunks or len(self.chunks[-1][0]) >= self.chunk_size:
+            self.chunks.append(tuple(array("d") for _ in range(self.width)))
+
+        for column, value in zip(self.chunks[-1], row):
+            column.append(value)
+
+    def expire(self, oldest):
+        """Drop the chunks with all their rows older than a timestamp.
+
+        :param oldest: Oldest timestamp to keep
+        :type oldest: float
+        """
+        while self.chunks and self.chunks[0][0][-1] < oldest:
+            self.chunks.pop(0)
+
+    def rows(self, start, end):
+        """Get the rows between two timestamps (both included).
+
+        :param start: Start timestamp
+        :type start: float
+        :param end: End timestamp
+        :type end: float
+
+        :return: The rows
+        :rtype: list[tuple(float)]
+        """
+        rows = []
+        for chunk in self.chunks:
+            timestamps = chunk[0]
+            if timestamps[-1] < start:
+                continue
+            if timestamps[0] > end:
+                break
+            first = bisect_left(timestamps, start)
+            last = bisect_right(timestamps, end)
+            rows.extend(zip(*(column[first:last] for column in chunk)))
+        return rows
+
+    def __bool__(self):
+        """Get if there is any row."""
+        return bool(self.chunks)
+
+
+class _Series(object):
+    """History of a metric of a machine (raw samples and aggregates)."""
+
+    def __init__(self, chunk_size):
+        """Initialize the series.
+
+        :param chunk_size: Number of rows of each chunk
+        :type chunk_size: int
+        """
+        self.last_timestamp = None
+
+        # Raw samples (timestamp, value)
+        self.raw = _Columns(2, chunk_size)
+
+        # Closed aggregates of each rollup (timestamp, count, sum, min, max)
+        self.rollups = {resolution: _Columns(5, chunk_size) for resolution in ROLLUPS}
+
+        # Aggregate still open of each rollup [timestamp, count, sum, min, max]
+        self.open_buckets = dict.fromkeys(ROLLUPS)
+
+    def append(self, timestamp, value):
+        """Append a sample (only if it is newer than the last one).
+
+        :param timestamp: Timestamp of the sample
+        :type timestamp: float
+        :param value: Value of the sample
+        :type value: float
+
+        :return: True if the sample is appended
+        :rtype: bool
+        """
+        if self.last_timestamp is not None and timestamp <= self.last_timestamp:
+            return False
+        self.last_timestamp = timestamp
+
+        self.raw.append((timestamp, value))
+
+        for resolution, width in ROLLUPS.items():
+            bucket_start = timestamp - timestamp % width
+            bucket = self.open_buckets[resolution]
+
+            # Close the aggregate when the sample falls in a new bucket
+            if bucket is not None and bucket[0] != bucket_start:
+                self.rollups[resolution].append(bucket)
+                bucket = None
+
+            if bucket is None:
+                self.open_buckets[resolution] = [bucket_start, 1, value, value, value]
+            else:
+                bucket[1] += 1
+                bucket[2] += value
+                bucket[3] = min(bucket[3], value)
+                bucket[4] = max(bucket[4], value)
+
+        return True
+
+    def expire(self, now, retention):
+        """Drop the samples and aggregates older than their retention.
+
+        :param now: Current timestamp
+        :type now: float
+        :param retention: Retention of each resolution (seconds)
+        :type retention: dict{key: resolution, value: float}
+        """
+        self.raw.expire(now - retention[RAW])
+        for resolution, columns in self.rollups.items():
+            columns.expire(now - retention[resolution])
+
+            bucket = self.open_buckets[resolution]
+            if bucket is not None and bucket[0] + ROLLUPS[resolution] < (
+                now - retention[resolution]
+            ):
+                self.open_buckets[resolution] = None
+
+    def query(self, start, end, resolution):
+        """Get the samples or aggregates between two timestamps.
+
+        :param start: Start timestamp
+        :type start: float
+        :param end: End timestamp
+        :type end: float
+        :param resolution: Resolution of the history
+        :type resolution: str
+
+        :return: The samples as (timestamp, mean, min, max, count)
+        :rtype: list[tuple]
+        """
+        if resolution == RAW:
+            return [
+                (timestamp, value, value, value, 1)
+                for timestamp, value in self.raw.rows(start, end)
+            ]
+
+        rows = self.rollups[resolution].rows(start, end)
+        bucket = self.open_buckets[resolution]
+        if bucket is not None and start <= bucket[0] <= end:
+            rows.append(tuple(bucket))
+
+        return [
+            (timestamp, total / count, minimum, maximum, int(count))
+            for timestamp, count, total, minimum, maximum in rows
+        ]
+
+    def __bool__(self):
+        """Get if there is any sample."""
+        return bool(self.raw) or any(
+            bucket is not None for bucket in self.open_buckets.values()
+        )
+
+
+class MetricHistory(object):
+    """Append-only history of the numeric metrics of each machine.
+
+    The samples are stored by (hostname, metric name) in chunks of compact
+    float arrays, rolled up to aggregates of 1 minute and 1 hour, and the
+    chunks older than the retention of each resolution are dropped. The
+    history is written by the monitoring loop and read by the API and the
+    optimizations from other threads.
+    """
+
+    def __init__(self, retention, chunk_size=1024):
+        """Initialize the history.
+
+        :param retention: Retention of each resolution (seconds)
+        :type retention: dict{key: resolution, value: float}
+        :param chunk_size: Number of samples of each chunk
+        :type chunk_size: int
+        """
+        self.retention = retention
+        self.chunk_size = chunk_size
+
+        # Series of each metric (key: (hostname, metric name), value: _Series)
+        self._series = {}
+
+        # Lock to protect the series (the API runs in a different thread)
+        self._lock = threading.Lock()
+
+    def add_metrics(self, metrics):
+        """Append the numeric metrics of the machines.
+
+        :param metrics: The metrics of each machine
+        :type metrics: dict{key: hostname, value: list[Metric]}
+        """
+        with self._lock:
+            for hostname, metric_list in metrics.items():
+                for metric in metric_list:
+                    value = metric.get_value()
+                    if value is None:
+                        continue
+
+                    key = (hostname, metric.name)
+                    if key not in self._series:
+                        self._series[key] = _Series(self.chunk_size)
+                    self._series[key].append(metric.timestamp.timestamp(), value)
+
+            self._expire(time.time())
+
+    def _expire(self, now):
+        """Drop the history older than the retention.
+
+        :param now: Current timestamp
+        :type now: float
+        """
+        for key, series in list(self._series.items()):
+            series.expire(now, self.retention)
+            if not series:
+                del self._series[key]
+
+    def query(self, hostname, metric_name, start=None, end=None, resolution=RAW):
+        """Get the history of a metric of a machine.
+
+        :param hostname: Hostname of the machine
+        :type hostname: str
+        :param metric_name: Name of the metric
+        :type metric_name: str
+        :param start: Start of the range (all the history if None)
+        :type start: datetime
+        :param end: End of the range (until now if None)
+        :type end: datetime
+        :param resolution: Resolution of the history (raw, 1m or 1h)
+        :type resolution: str
+
+        :return: The samples as (timestamp, mean, min, max, count)
+        :rtype: list[tuple]
+        """
+        _check_resolution(resolution)
+        start, end = _get_range(start, end)
+
+        with self._lock:
+            series = self._series.get((hostname, metric_name))
+            if series is None:
+                return []
+            return series.query(start, end, resolution)
+
+    def get_metric_names(self, hostname):
+        """Get the names of the metrics with history of a machine.
+
+        :param hostname: Hostname of the machine
+        :type hostname: str
+
+        :return: The names of the metrics
+        :rtype: list[str]
+        """
+        with self._lock:
+            return sorted(name for host, name in self._series if host == hostname)
+
+    def close_hosts(self, hostnames):
+        """Release the resources of machines no longer monitored.
+
+        The history in memory is kept (and expired with its retention), so it
+        can still be queried.
+
+        :param hostnames: Hostnames of the machines
+        :type hostnames: set[str]
+        """
+
+    def close(self):
+        """Close the history (nothing to release in memory)."""
+
+
+def _file_name(name):
+    """Get the name of the file of a hostname or a metric name.
+
+    The names are percent-encoded, so they can not escape the directory of
+    the history (e.g. with "/" or ".."), and decoded back with unquote().
+
+    :param name: The hostname or the metric name
+    :type name: str
+
+    :return: The file name (None if the name can not be stored)
+    :rtype: str
+    """
+    file_name = quote(name, safe="")
+    if file_name.startswith("."):
+        file_name = "%2E" + file_name[1:]
+    if not file_name or len(file_name) > MAX_FILE_NAME:
+        return None
+    return file_name
+
+
+class MmapMetricHistory(object):
+    """History of the numeric metrics stored in on-disk ring buffers.
+
+    Each metric of each machine has its own memory-mapped ring buffer file
+    of samples (timestamp, value), in a directory of the machine, so the
+    history costs almost no heap, survives restarts and the retention of a
+    series is the capacity of its buffer whatever the size of the fleet.
+    The buffers are opened on first use and each one holds a file
+    descriptor, so only the max_open most recently used are kept open (the
+    rest are closed and opened again when needed). The aggregates of 1
+    minute and 1 hour are computed from the samples of the range on each
+    query.
+    """
+
+    def __init__(self, directory, capacity, max_open=256):
+        """Open (or create) the directory of the ring buffers.
+
+        :param directory: Directory of the ring buffer files
+        :type directory: str
+        :param capacity: Number of samples of each new ring buffer
+        :type capacity: int
+        :param max_open: Number of ring buffers kept open
+        :type max_open: int
+        """
+        self.directory = directory
+        self.capacity = capacity
+        self.max_open = max(max_open, 1)
+        os.makedirs(directory, exist_ok=True)
+        LOG.info("Metric history opened from %s", directory)
+
+        # Open ring buffers, the least recently used first
+        # (key: (hostname, metric name), value: RingBuffer)
+        self._buffers = OrderedDict()
+
+        # Lock to protect the buffers (the API runs in a different thread)
+        self._lock = threading.Lock()
+
+    def _get_buffer(self, hostname, metric_name, create=False):
+        """Get the ring buffer of a metric of a machine.
+
+        :param hostname: Hostname of the machine
+        :type hostname: str
+        :param metric_name: Name of the metric
+        :type metric_name: str
+        :param create: If the ring buffer is created when it does not exist
+        :type create: bool
+
+        :return: The ring buffer (None if it does not exist)
+        :rtype: RingBuffer
+        """
+        key = (hostname, metric_name)
+        if key in self._buffers:
+            self._buffers.move_to_end(key)
+            return self._buffers[key]
+
+        host_dir = _file_name(hostname)
+        file_name = _file_name(metric_name)
+        if host_dir is None or file_name is None:
+            return None
+
+        path = os.path.join(self.directory, host_dir, f"{file_name}.ring")
+        if not os.path.exists(path):
+            if not create:
+                return None
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Close the least recently used buffers to bound the open files
+        while len(self._buffers) >= self.max_open:
+            _, buffer = self._buffers.popitem(last=False)
+            buffer.close()
+
+        self._buffers[key] = RingBuffer(path, self.capacity)
+        return self._buffers[key]
+
+    def add_metrics(self, metrics):
+        """Append the numeric metrics of the machines.
+
+        :param metrics: The metrics of each machine
+        :type metrics: dict{key: hostname, value: list[Metric]}
+        """
+        with self._lock:
+            for hostname, metric_list in metrics.items():
+                for metric in metric_list:
+                    value = metric.get_value()
+                    if value is None:
+                        continue
+
+                    buffer = self._get_buffer(hostname, metric.name, create=True)
+                    if buffer is None:
+                        LOG.warning(
+                            "Metric '%s' of %s can not be stored in the history",
+                            metric.name,
+                            hostname,
+                        )
+                        continue
+
+                    # Keep the samples of each buffer in chronological order
+                    timestamp = metric.timestamp.timestamp()
+                    if timestamp <= buffer.last_timestamp():
+                        continue
+
+                    buffer.append(
+                        np.array([timestamp], dtype="<f8"),
+                        np.array([value], dtype="<f8"),
+                    )
+
+    def query(self, hostname, metric_name, start=None, end=None, resolution=RAW):
+        """Get the history of a metric of a machine.
+
+        :param hostname: Hostname of the machine
+        :type hostname: str
+        :param metric_name: Name of the metric
+        :type metric_name: str
+        :param start: Start of the range (all the history if None)
+        :type start: datetime
+        :param end: End of the range (until now if None)
+        :type end: datetime
+        :param resolution: Resolution of the history (raw, 1m or 1h)
+        :type resolution: str
+
+        :return: The samples as (timestamp, mean, min, max, count)
+        :rtype: list[tuple]
+        """
+        _check_resolution(resolution)
+        start, end = _get_range(start, end)
+
+        # Copy only the samples of the range out of the mapped file
+        with self._lock:
+            buffer = self._get_buffer(hostname, metric_name)
+            if buffer is None:
+                return []
+            timestamps, values = buffer.range(start, end)
+
+        if resolution == RAW:
+            return [
+                (timestamp, value, value, value, 1)
+                for timestamp, value in zip(timestamps.tolist(), values.tolist())
+            ]
+
+        if len(timestamps) == 0:
+            return []
+
+        # Aggregate the samples of each bucket of the rollup
+        width = ROLLUPS[resolution]
+        buckets = timestamps - timestamps % width
+        buckets, first, counts = np.unique(
+            buckets, return_index=True, return_counts=True
+        )
+        return list(
+            zip(
+                buckets.tolist(),
+                (np.add.reduceat(values, first) / counts).tolist(),
+                np.minimum.reduceat(values, first).tolist(),
+                np.maximum.reduceat(values, first).tolist(),
+                counts.tolist(),
+            )
+        )
+
+    def get_metric_names(self, hostname):
+        """Get the names of the metrics with history of a machine.
+
+        :param hostname: Hostname of the machine
+        :type hostname: str
+
+        :return: The names of the metrics
+        :rtype: list[str]
+        """
+        host_dir = _file_name(hostname)
+        if host_dir is None:
+            return []
+
+        path = os.path.join(self.directory, host_dir)
+        if not os.path.isdir(path):
+            return []
+
+        names = []
+        for file_name in os.listdir(path):
+            name, extension = os.path.splitext(file_name)
+            if extension == ".ring":
+                names.append(unquote(name))
+        return sorted(names)
+
+    def close_hosts(self, hostnames):
+        """Close the ring buffers of machines no longer monitored.
+
+        The files are kept, so their history can still be queried.
+
+        :param hostnames: Hostnames of the machines
+        :type hostnames: set[str]
+        """
+        with self._lock:
+            for key in [key for key in self._buffers if key[0] in hostnames]:
+                self._buffers.pop(key).close()
+
+    def close(self):
+        """Write the ring buffers to disk and close them."""
+        with self._lock:
+            for buffer in self._buffers.values():
+                buffer.close()
+            self._buffers = OrderedDict()
@@ -1,6 +1,6 @@
 """cloud_analytics manager module."""
 
-import time
+from datetime import datetime
 
 import trio
 
@@ -8,6 +8,10 @@ import cems2.cloud_analytics.collector.manager as collector_manager
 import cems2.cloud_analytics.reporter.manager as reporter_manager
 from cems2 import config_loader, log
 from cems2.API.routes.monitoring import monitoring_controller
+from cems2.cloud_analytics import history
+from cems2.cloud_analytics.scheduler import Scheduler
+from cems2.cloud_analytics.snapshot import FleetSnapshot
+from cems2.event import ThreadSafeEvent
 from cems2.schemas.plugin import Plugin
 
 # Get the logger
@@ -39,15 +43,50 @@ class Manager(object):
 
         # Dictionary to store the last metrics of each machine
         # (key: hostname, value: list of metrics)
+        # Copy-on-write: it is replaced (never modified) on each update, so the
+        # readers (API, optimizations) can keep it without copying it
         self.metrics = {}
 
+        # History of the numeric metrics of each machine
+        self.history = self._load_history()
+
         # Monitoring interval
         self.monitoring_interval = None
 
+        # Scheduler of the monitoring of each machine
+        self.scheduler = None
+
+        # If the next round has to monitor all the machines (not only the due ones)
+        self._force_round = True
+
+        # Machines not monitored yet since the last snapshot of the metrics
+        self._round_pending = set()
+
+        # Time when the current round started (None before the first round)
+        self._round_start = None
+
+        # Hostnames of the machines currently scheduled by the monitoring loop
+        self._monitored_hosts = set()
+
+        # Limiter of the concurrent tasks over the monitored machines
+        self.limiter = None
+
         # On/off switch
         self._running = None
         self._admin_lock = False
 
+        # Events to wake up the monitoring loop (set from any thread)
+        self._running_event = ThreadSafeEvent()
+        self._machines_event = ThreadSafeEvent()
+        self._membership_event = ThreadSafeEvent()
+
+        # Event to monitor all the machines without waiting for the interval
+        self._monitor_event = ThreadSafeEvent()
+
+        # Machines that have just changed (e.g. VMs migrated to them), to be
+        # polled at the minimum interval
+        self._changed_hosts = set()
+
     @property
     def machines_monitoring(self):
         """Get the machines to monitor."""
@@ -57,14 +96,33 @@ class Manager(object):
     def machines_monitoring(self, machines_list):
         """Update the machines to monitor.
 
+        Only the added and removed machines are applied by the monitoring loop,
+        so an update that does not change the monitored machines (e.g. the
+        status of a single machine) does not trigger any monitoring.
+
         :param machines_list: list of machines to monitor
         :type machines_list: list[Machine]
         """
+        old_hostnames = {machine.hostname for machine in self._machines_monitoring}
+        new_hostnames = {machine.hostname for machine in machines_list}
+
         self._machines_monitoring = machines_list
-        LOG.info(
-            "PMs to monitor: %s",
-            [machine.hostname for machine in self.machines_monitoring],
-        )
+
+        if new_hostnames != old_hostnames:
+            LOG.info(
+                "PMs to monitor: %s (added: %s, removed: %s)",
+                [machine.hostname for machine in self.machines_monitoring],
+                sorted(new_hostnames - old_hostnames),
+                sorted(old_hostnames - new_hostnames),
+            )
+            # Wake up the monitoring loop to apply the changes
+            self._membership_event.set()
+
+        # Wake up the monitoring loop if there are machines to monitor
+        if self._machines_monitoring:
+            self._machines_event.set()
+        else:
+            self._machines_event.clear()
 
     @property
     def running(self):
@@ -84,8 +142,11 @@ class Manager(object):
 
             if value is True:
                 LOG.warning("Cloud Analytics Manager started")
+                # Wake up the monitoring loop
+                self._running_event.set()
             else:
                 LOG.warning("Cloud Analytics Manager stopped")
+                self._running_event.clear()
 
     @property
     def admin_lock(self):
@@ -101,24 +162,93 @@ class Manager(object):
         """
         self._admin_lock = value
 
+    def _load_history(self):
+        """Create the metric history.
+
+        If a directory is configured, the history is stored in on-disk ring
+        buffers (bounded by their capacity), if not it is kept in memory with
+        the configured retention.
+
+        :return: The metric history
+        :rtype: MetricHistory or MmapMetricHistory
+        """
+        directory = CONFIG.get("cloud_analytics", "history_dir", fallback="")
+        if directory:
+            return history.MmapMetricHistory(
+                directory,
+                CONFIG.getint("cloud_analytics", "history_capacity"),
+                CONFIG.getint("cloud_analytics", "history_max_open", fallback=256),
+            )
+
+        retention = {
+            history.RAW: CONFIG.getint("cloud_analytics", "history_retention"),
+            history.MINUTE: CONFIG.getint("cloud_analytics", "history_retention_1m"),
+            history.HOUR: CONFIG.getint("cloud_analytics", "history_retention_1h"),
+        }
+        LOG.info("Metric history retention set to %s seconds", retention)
+
+        return history.MetricHistory(
+            retention,
+            chunk_size=CONFIG.getint("cloud_analytics", "history_chunk_size"),
+        )
+
     def _load_managers(self):
         """Load the collector and reporter managers."""
-        self.collector = collector_manager.Manager()
-        self.reporter = reporter_manager.Manager()
+        # Create the global limiter of concurrent tasks
+        max_concurrency = CONFIG.getint("cloud_analytics", "max_concurrency")
+        self.limiter = trio.CapacityLimiter(max_concurrency)
+        LOG.info("Max concurrency set to %s tasks", max_concurrency)
+
+        self.collector = collector_manager.Manager(self.limiter)
+        self.reporter = reporter_manager.Manager(self.limiter)
+
+    async def _open_managers(self):
+        """Open the shared resources of the collector and reporter plug-ins."""
+        await self.collector.open()
+        await self.reporter.open()
+
+    async def _close_managers(self):
+        """Close the shared resources of the collector and reporter plug-ins."""
+        await self.collector.close()
+        await self.reporter.close()
 
     def _set_monitoring_interval(self):
         """Set the monitoring interval of the manager."""
         self.monitoring_interval = CONFIG.getint("cloud_analytics", "interval")
         LOG.info("Monitoring interval set to %s seconds", self.monitoring_interval)
 
-    def run(self):
+        # Create the scheduler (with the adaptive interval if configured)
+        adaptive = CONFIG.getboolean("cloud_analytics", "adaptive_interval")
+        self.scheduler = Scheduler(
+            self.monitoring_interval,
+            adaptive=adaptive,
+            min_interval=CONFIG.getint("cloud_analytics", "min_interval"),
+            max_interval=CONFIG.getint("cloud_analytics", "max_interval"),
+            volatility_threshold=CONFIG.getfloat(
+                "cloud_analytics", "volatility_threshold"
+            ),
+            backoff_factor=CONFIG.getfloat("cloud_analytics", "backoff_factor"),
+            stagger=CONFIG.getboolean("cloud_analytics", "stagger"),
+        )
+
+        if adaptive:
+            LOG.info(
+                "Adaptive monitoring interval between %s and %s seconds",
+                self.scheduler.min_interval,
+                self.scheduler.max_interval,
+            )
+
+    async def run(self):
         """Run the cloud_analytics manager.
 
         - Load the collector and reporter managers
         - Set the monitoring interval
+        - Open the collector and reporter plug-ins (only once)
+        - Start the reporting workers
         - Run periodically as the monitoring interval
             - Get the metrics from the collector manager
-            - Send the metrics to the reporter manager
+            - Notify the new metrics to the monitoring API controller
+            - Queue the metrics to the reporting workers
         """
         # Load the managers
         self._load_managers()
@@ -129,66 +259,255 @@ class Manager(object):
         # Set the running status to True
         self.running = True
 
-        # Run periodically as the monitoring interval
-        while True:
-            if self.machines_monitoring and self.running:
-                # Run the monitoring async function
-                trio.run(self._monitoring)
+        # Open the plug-ins (sessions are shared among machines and intervals)
+        await self._open_managers()
+
+        try:
+            async with trio.open_nursery() as nursery:
+                # Start the reporting workers (they drain the reporting queue)
+                await nursery.start(self.reporter.run)
+
+                # Run periodically as the monitoring interval
+                await self._monitoring_loop()
+        finally:
+            # Close the plug-ins
+            with trio.CancelScope(shield=True):
+                await self._close_managers()
 
-                # Notify the monitoring API controller of the new metrics obtained
-                self.api_controller.notify_new_metrics(self.metrics)
+            # Write the metric history to disk (if it is stored on disk)
+            self.history.close()
 
-                # Set the running status to False
-                self.running = False
+    async def _monitoring_loop(self):
+        """Run the monitoring periodically as the monitoring interval."""
+        while True:
+            if self.machines_monitoring and self.running:
+                # Monitor all the machines if it was requested meanwhile
+                force = self._force_round or self._monitor_event.is_set()
+                self._monitor_event.clear()
+                self._force_round = False
+
+                # Get the metrics of the machines (all of them or the due ones)
+                metrics, round_completed = await self._monitoring(force)
+
+                # Notify the monitoring API controller of a consistent snapshot
+                # of the latest metrics (without waiting for the reporters)
+                if round_completed:
+                    self.api_controller.notify_new_metrics(
+                        self.metrics,
+                        FleetSnapshot.from_metrics(self.metrics, datetime.now()),
+                    )
+
+                # Queue the new metrics to the reporting workers
+                if metrics:
+                    await self.reporter.enqueue_metrics(metrics)
 
                 # Wait for the monitoring interval
-                trio.run(self._wait_moniring_interval)
+                await self._wait_moniring_interval()
 
             else:
-                # Sleep until the manager is started again
-                time.sleep(1)
+                # Wait until the manager is started again and there are machines
+                await self._running_event.wait()
+                await self._machines_event.wait()
 
-    async def _monitoring(self):
-        # Create an async task for each machine
-        async with trio.open_nursery() as nursery:
-            for machine in self.machines_monitoring:
-                nursery.start_soon(self._monitor_machine, machine)
+                # Monitor all the machines after the pause
+                self._force_round = True
+
+    async def _monitoring(self, force):
+        """Monitor the machines.
 
-    async def _monitor_machine(self, machine):
-        metrics = await self.collector.get_metrics(machine.hostname)
-        self.metrics[machine.hostname] = metrics
-        await self.reporter.send_metrics(metrics)
+        The round is completed (and a snapshot of the metrics has to be
+        notified) when all the machines of the round have been monitored
+        since the last snapshot, or when the round lasted the maximum
+        interval (so the volatile machines do not complete a round on each
+        of their monitorings, and a slow one does not delay it forever).
+
+        :param force: If all the machines have to be monitored (not only the due ones)
+        :type force: bool
+
+        :return: The new metrics and if the round is completed
+        :rtype: tuple(dict{key: hostname, value: list[Metric]}, bool)
+        """
+        # Apply the added and removed machines since the last monitoring
+        all_hostnames, _ = self._update_monitored_hosts()
+
+        # Poll the machines that have just changed at the minimum interval
+        changed, self._changed_hosts = self._changed_hosts, set()
+        self.scheduler.mark_changed(changed, trio.current_time())
+
+        # Monitor all the machines if forced, if not only the due ones
+        due = self.scheduler.due(all_hostnames, trio.current_time())
+        hostnames = all_hostnames if force else due
+
+        metrics = {}
+        if hostnames:
+            # Get the metrics of the machines (batched by collector if possible)
+            metrics = await self.collector.get_metrics_batch(hostnames)
+
+            # Discard the metrics of the machines removed during the collection
+            all_hostnames, _ = self._update_monitored_hosts()
+            metrics = {
+                hostname: metric_list
+                for hostname, metric_list in metrics.items()
+                if hostname in self._monitored_hosts
+            }
+            self.metrics = {**self.metrics, **metrics}
+            self.history.add_metrics(metrics)
+
+        # Schedule the next monitoring of each machine (the ones monitored
+        # before they were due do not back off)
+        now = trio.current_time()
+        due = set(due)
+        for hostname, metric_list in metrics.items():
+            self.scheduler.update(hostname, metric_list, now, hostname in due)
+
+        # Check if all the machines of the round have been monitored since the
+        # last snapshot (the removed ones are not waited for)
+        self._round_pending.intersection_update(all_hostnames)
+        self._round_pending.difference_update(metrics)
+        round_completed = (
+            self._round_start is None
+            or not self._round_pending
+            or now - self._round_start >= self.scheduler.max_interval
+        )
+
+        # Start a new round
+        if round_completed:
+            self._round_pending = set(all_hostnames)
+            self._round_start = now
+
+        return metrics, round_completed
+
+    def _update_monitored_hosts(self):
+        """Apply the changes of the machines to monitor.
+
+        The added machines are scheduled to be monitored immediately, and the
+        removed ones are unscheduled, their last metrics are evicted and their
+        history files are closed.
+
+        :return: The hostnames of the machines to monitor and the removed ones
+        :rtype: tuple(list[str], set[str])
+        """
+        # Clear the event before reading the machines (to not lose any change)
+        self._membership_event.clear()
+
+        all_hostnames = [machine.hostname for machine in self.machines_monitoring]
+        current = set(all_hostnames)
+
+        added = current - self._monitored_hosts
+        removed = self._monitored_hosts - current
+
+        now = trio.current_time()
+        for hostname in added:
+            self.scheduler.add(hostname, now)
+            # The added machines are due in the current round
+            self._round_pending.add(hostname)
+
+        for hostname in removed:
+            self.scheduler.remove(hostname)
+            self._round_pending.discard(hostname)
+
+        if removed:
+            self.metrics = {
+                hostname: metric_list
+                for hostname, metric_list in self.metrics.items()
+                if hostname not in removed
+            }
+            # Release the history resources of the removed machines
+            self.history.close_hosts(removed)
+
+        if added or removed:
+            LOG.debug(
+                "Monitoring started for %s and stopped for %s",
+                sorted(added),
+                sorted(removed),
+            )
+
+        self._monitored_hosts = current
+        return all_hostnames, removed
 
     async def _wait_moniring_interval(self):
+        # Time until the next machine has to be monitored
+        hostnames = [machine.hostname for machine in self.machines_monitoring]
+        interval = self.scheduler.time_to_next(hostnames, trio.current_time())
+
         # With a timeout of the monitoring interval
-        with trio.move_on_after(self.monitoring_interval) as cancel_scope:
-            # Create an async coroutine to wait for the manager to be started again
+        with trio.move_on_after(interval) as cancel_scope:
+            # Create an async coroutine to wait for a monitoring request
             async with trio.open_nursery() as nursery:
-                nursery.start_soon(self._wait_for_monitoring)
+                nursery.start_soon(self._wait_for_monitoring, interval)
 
-        # If the manager is not started again
         if cancel_scope.cancelled_caught:
             LOG.debug("Monitoring interval finished")
-            # Set the running status to True to start the manager again
-            self.running = True
+        elif self._monitor_event.is_set():
+            LOG.debug("Monitoring of all the machines requested")
+        else:
+            LOG.debug("Machines to monitor changed")
 
-    async def _wait_for_monitoring(self):
+    async def _wait_for_monitoring(self, interval):
         LOG.debug(
-            "Waiting for the monitoring interval (%s) to finish",
-            self.monitoring_interval,
+            "Waiting for the monitoring interval (%.1f) to finish",
+            interval,
         )
-        while not self.running:
-            await trio.sleep(1)
+        # Wait for a monitoring request or the machines to change
+        async with trio.open_nursery() as nursery:
+            for event in (self._monitor_event, self._membership_event):
+                nursery.start_soon(self._wake_up, event, nursery.cancel_scope)
+
+    async def _wake_up(self, event, cancel_scope):
+        """Cancel the wait as soon as the event is set.
+
+        :param event: The event to wait for
+        :type event: ThreadSafeEvent
+        :param cancel_scope: The scope of the wait
+        :type cancel_scope: trio.CancelScope
+        """
+        await event.wait()
+        cancel_scope.cancel()
 
     # Communication with de API monitoring controller
+    def monitor_again(self, changed=()):
+        """Monitor all the machines without waiting for the interval.
+
+        The request is kept until the manager is running.
+
+        :param changed: Hostnames of the machines that have just changed (e.g.
+            VMs migrated to them or powered on), polled at the minimum interval
+        :type changed: list[str]
+        """
+        self._changed_hosts.update(changed)
+        self._monitor_event.set()
+
     def obtain_last_metrics(self):
         """Obtain the last metrics of each machine.
 
+        The dictionary is shared (not copied), so it must not be modified.
+
         :return: dictionary with the last metrics of each machine
         :rtype: dict{key: hostname, value: list[Metric]}
         """
         return self.metrics
 
+    def obtain_metric_history(
+        self, hostname, metric_name, start=None, end=None, resolution=history.RAW
+    ):
+        """Obtain the history of a metric of a machine.
+
+        :param hostname: hostname of the machine
+        :type hostname: str
+        :param metric_name: name of the metric
+        :type metric_name: str
+        :param start: start of the range (all the history if None)
+        :type start: datetime
+        :param end: end of the range (until now if None)
+        :type end: datetime
+        :param resolution: resolution of the history (raw, 1m or 1h)
+        :type resolution: str
+
+        :return: list of samples as (timestamp, mean, min, max, count)
+        :rtype: list[tuple]
+        """
+        return self.history.query(hostname, metric_name, start, end, resolution)
+
     def get_plugins(self):
         """Obtain the installed plugins.
 
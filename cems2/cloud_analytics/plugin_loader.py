@@ -1,6 +1,6 @@
 """Module to load the plug-ins into the Cloud Analytics Application."""
 
-import stevedore
+from cems2 import plugin_registry
 
 COLLECTOR_NAMESPACE = "cems2.cloud_analytics.collector"
 REPORTER_NAMESPACE = "cems2.cloud_analytics.reporter"
@@ -15,8 +15,7 @@ def _get_names(namespace):
     :return: The names of the plug-ins in the specified namespace
     :rtype: frozenset
     """
-    mgr = stevedore.ExtensionManager(namespace=namespace)
-    return frozenset(mgr.names())
+    return plugin_registry.get_names(namespace)
 
 
 def _get_extensions(namespace):
@@ -28,8 +27,13 @@ def _get_extensions(namespace):
     :return: The extensions of the plug-ins in the specified namespace
     :rtype: dict
     """
-    mgr = stevedore.ExtensionManager(namespace=namespace, propagate_map_exceptions=True)
-    return dict(mgr.map(lambda ext: (ext.entry_point.name, ext.plugin)))
+    return plugin_registry.get_extensions(namespace)
+
+
+def refresh():
+    """Scan again the plug-ins installed in the namespaces of this module."""
+    for namespace in (COLLECTOR_NAMESPACE, REPORTER_NAMESPACE):
+        plugin_registry.refresh(namespace)
 
 
 def get_collectors_names():
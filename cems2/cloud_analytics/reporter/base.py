@@ -6,10 +6,24 @@ from abc import ABCMeta, abstractmethod
 class MetricReporterBase(metaclass=ABCMeta):
     """Allows to report the metrics forwarding it through the plug-ins."""
 
+    # If the reporter writes several machines at once in report_metrics_batch
+    supports_batch = False
+
     @abstractmethod
     def __init__(self):
         """Initialize the connection to report platform."""
 
+    async def open(self):
+        """Open the resources shared by all the reports (optional).
+
+        The reporter is instantiated only once, so the sessions, connection
+        pools or authentication tokens opened here are reused for every
+        machine and every monitoring interval.
+        """
+
+    async def close(self):
+        """Close the resources opened by the reporter (optional)."""
+
     @abstractmethod
     async def report_metric(self, metric_list):
         """Report the metric to report platform.
@@ -17,3 +31,16 @@ class MetricReporterBase(metaclass=ABCMeta):
         :param metric_list: The list of metrics to report
         :type metric_list: list[Metric]
         """
+
+    async def report_metrics_batch(self, metrics):
+        """Report the metrics of several machines in a single write.
+
+        The reporter manager calls this method instead of report_metric for
+        each machine when supports_batch is True. By default, the metrics of
+        the machines are reported one after the other with report_metric.
+
+        :param metrics: The metrics of each machine
+        :type metrics: dict{key: hostname, value: list[Metric]}
+        """
+        for metric_list in metrics.values():
+            await self.report_metric(metric_list)
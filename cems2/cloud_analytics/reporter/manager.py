@@ -1,5 +1,7 @@
 """Reporter Manager module."""
 
+from contextlib import asynccontextmanager
+
 import trio
 
 from cems2 import config_loader, log
@@ -11,12 +13,22 @@ LOG = log.get_logger(__name__)
 # Get the configurtion
 CONFIG = config_loader.get_config()
 
+# Policies of the reporting queue when it is full
+BLOCK = "block"  # Wait for a free slot (backpressure on the monitoring)
+DROP_OLDEST = "drop_oldest"  # Discard the oldest round queued
+DROP_NEWEST = "drop_newest"  # Discard the new round
+REPORTING_POLICIES = (BLOCK, DROP_OLDEST, DROP_NEWEST)
+
 
 class Manager(object):
     """Manager for the Cloud Analytics Reporters."""
 
-    def __init__(self):
-        """Initialize the reporter manager."""
+    def __init__(self, limiter=None):
+        """Initialize the reporter manager.
+
+        :param limiter: Global limiter of the concurrent reports
+        :type limiter: trio.CapacityLimiter
+        """
         # Obtain the list of reporters configured in the config file
         reporters_list = CONFIG.getlist("cloud_analytics.plugins", "reporters")
 
@@ -30,16 +42,110 @@ class Manager(object):
                 raise RuntimeError(f"Reporter plugin '{reporter}' is not installed.")
 
         # Get the reporters from the plugin loader
-        reporters = [(i, plugin_loader.get_reporters()[i]) for i in reporters_list]
+        installed_reporters = plugin_loader.get_reporters()
+        reporters = [(i, installed_reporters[i]) for i in reporters_list]
+
+        # Create an instance of each reporter (Only one object for each reporter)
+        reporters = [(i, j()) for i, j in reporters]
+
         self.reporters = reporters
         LOG.debug("Reporters loaded: %s", reporters_list)
 
         # Set the reporter plugin timeout
         self.timeout = CONFIG.getint("cloud_analytics", "reporter_timeout")
 
+        # Set the global limiter of concurrent reports
+        self.limiter = limiter
+
+        # Set the reporting queue (rounds of metrics waiting to be reported)
+        self.queue_size = CONFIG.getint("cloud_analytics", "reporting_queue_size")
+        self.workers = CONFIG.getint("cloud_analytics", "reporting_workers")
+        self.policy = CONFIG.get("cloud_analytics", "reporting_policy")
+
+        if self.policy not in REPORTING_POLICIES:
+            LOG.error("Reporting policy '%s' is not valid.", self.policy)
+            raise RuntimeError(f"Reporting policy '{self.policy}' is not valid.")
+
+        self._send_channel = None
+        self._receive_channel = None
+
+    async def open(self):
+        """Open the shared resources of all the reporters."""
+        async with trio.open_nursery() as nursery:
+            for reporter_name, reporter in self.reporters:
+                LOG.debug("Opening the reporter '%s'", reporter_name)
+                nursery.start_soon(reporter.open)
+
+    async def close(self):
+        """Close the shared resources of all the reporters."""
+        for reporter_name, reporter in self.reporters:
+            LOG.debug("Closing the reporter '%s'", reporter_name)
+            try:
+                await reporter.close()
+            except Exception as e:
+                LOG.error("Error closing the reporter '%s': %s", reporter_name, e)
+
+    async def run(self, task_status=trio.TASK_STATUS_IGNORED):
+        """Run the reporting workers that drain the reporting queue.
+
+        :param task_status: Status to notify when the queue is ready
+        :type task_status: trio.TaskStatus
+        """
+        self._send_channel, self._receive_channel = trio.open_memory_channel(
+            self.queue_size
+        )
+        LOG.debug(
+            "Reporting queue of %s rounds with %s workers (policy: %s)",
+            self.queue_size,
+            self.workers,
+            self.policy,
+        )
+
+        async with self._receive_channel:
+            async with trio.open_nursery() as nursery:
+                for _ in range(self.workers):
+                    nursery.start_soon(self._reporting_worker)
+
+                # The queue is ready to receive metrics
+                task_status.started()
+
+    async def _reporting_worker(self):
+        """Report the rounds of metrics queued."""
+        async for metrics in self._receive_channel:
+            await self.send_metrics_batch(metrics)
+
+    async def enqueue_metrics(self, metrics):
+        """Queue a round of metrics to be reported by the reporting workers.
+
+        :param metrics: The metrics of each machine
+        :type metrics: dict{key: hostname, value: list[Metric]}
+        """
+        # If the queue has a free slot, queue the metrics without waiting
+        try:
+            self._send_channel.send_nowait(metrics)
+            return
+        except trio.WouldBlock:
+            pass
+
+        # Apply the policy when the queue is full
+        if self.policy == BLOCK:
+            LOG.warning("Reporting queue full: waiting for the reporters")
+            await self._send_channel.send(metrics)
+        elif self.policy == DROP_OLDEST:
+            LOG.warning("Reporting queue full: discarding the oldest round")
+            try:
+                self._receive_channel.receive_nowait()
+            except trio.WouldBlock:
+                pass
+            self._send_channel.send_nowait(metrics)
+        else:
+            LOG.warning("Reporting queue full: discarding the new round")
+
     async def send_metrics(self, metric_list):
         """Send the metrics to the reporters.
 
+        All the reporters run concurrently, each one with its own timeout.
+
         :param metric_list: The list of metrics to send
         :type metric_list: list[Metric]
         """
@@ -47,26 +153,107 @@ class Manager(object):
         if not metric_list:
             return
 
-        for reporter_name, reporter_cls in self.reporters:
-            # Create an async task for each reporter and set a timeout
+        # Create an async task for each reporter
+        async with trio.open_nursery() as nursery:
+            for reporter_name, reporter in self.reporters:
+                nursery.start_soon(
+                    self._forward_metrics_with_timeout,
+                    reporter_name,
+                    reporter,
+                    metric_list,
+                )
+
+    async def send_metrics_batch(self, metrics):
+        """Send the metrics of several machines to the reporters.
+
+        All the reporters run concurrently. The reporters that support the
+        batch report receive all the machines in a single call, the rest of
+        them one call for each machine.
+
+        :param metrics: The metrics of each machine
+        :type metrics: dict{key: hostname, value: list[Metric]}
+        """
+        # Do not report the machines without metrics
+        metrics = {
+            hostname: metric_list
+            for hostname, metric_list in metrics.items()
+            if metric_list
+        }
+
+        # If there are no metrics, do nothing
+        if not metrics:
+            return
+
+        # Create an async task for each reporter (and machine if not batched)
+        async with trio.open_nursery() as nursery:
+            for reporter_name, reporter in self.reporters:
+                if reporter.supports_batch:
+                    nursery.start_soon(
+                        self._forward_metrics_batch_with_timeout,
+                        reporter_name,
+                        reporter,
+                        metrics,
+                    )
+                else:
+                    for metric_list in metrics.values():
+                        nursery.start_soon(
+                            self._forward_metrics_with_timeout,
+                            reporter_name,
+                            reporter,
+                            metric_list,
+                        )
+
+    async def _forward_metrics_with_timeout(self, reporter_name, reporter, metric_list):
+        # Wait for a free slot before starting the timeout of the reporter
+        async with self._limit():
+            # Set a timeout for the reporter
             with trio.move_on_after(self.timeout) as cancel_scope:
-                async with trio.open_nursery() as nursery:
-                    nursery.start_soon(self._forward_metrics, reporter_cls, metric_list)
+                await self._forward_metrics(reporter_name, reporter, metric_list)
 
-            if cancel_scope.cancelled_caught:
-                LOG.error(
-                    "Timeout reached for the reporter '%s' for the machine %s",
+        if cancel_scope.cancelled_caught:
+            LOG.error(
+                "Timeout reached for the reporter '%s' for the machine %s",
+                reporter_name,
+                metric_list[0].hostname,
+            )
+
+    async def _forward_metrics_batch_with_timeout(
+        self, reporter_name, reporter, metrics
+    ):
+        # Wait for a free slot before starting the timeout of the reporter
+        async with self._limit():
+            # Set a timeout for the reporter
+            with trio.move_on_after(self.timeout) as cancel_scope:
+                LOG.info(
+                    "Reporting metrics to '%s', from %s machines",
                     reporter_name,
-                    metric_list[0].hostname,
+                    len(metrics),
                 )
+                await reporter.report_metrics_batch(metrics)
+
+        if cancel_scope.cancelled_caught:
+            LOG.error(
+                "Timeout reached for the reporter '%s' for %s machines",
+                reporter_name,
+                len(metrics),
+            )
+
+    @asynccontextmanager
+    async def _limit(self):
+        """Hold a slot of the global limiter (if any)."""
+        if self.limiter is None:
+            yield
+        else:
+            async with self.limiter:
+                yield
 
-    async def _forward_metrics(self, reporter, metric_list):
+    async def _forward_metrics(self, reporter_name, reporter, metric_list):
         LOG.info(
             "Reporting metrics to '%s', from the machine %s",
-            reporter.__name__,
+            reporter_name,
             metric_list[0].hostname,
         )
-        await reporter().report_metric(metric_list)
+        await reporter.report_metric(metric_list)
 
     def get_installed_plugins(self):
         """Get the list of installed reporters.
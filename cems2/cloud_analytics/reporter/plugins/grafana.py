@@ -12,6 +12,8 @@ LOG = log.get_logger(__name__)
 class Grafana(MetricReporterBase):
     """Allows to report the metrics to Grafana Dashboard."""
 
+    supports_batch = True
+
     def __init__(self):
         """Initialize the connection to Grafana Dashboard."""
 
@@ -24,3 +26,13 @@ class Grafana(MetricReporterBase):
         LOG.info("Reporting metrics to Grafana Dashboard")
         rich.print("GRAFANA", metric_list)
         # Report the metric to Grafana Dashboard
+
+    async def report_metrics_batch(self, metrics):
+        """Report the metrics of all the machines to Grafana in a single write.
+
+        :param metrics: The metrics of each machine
+        :type metrics: dict{key: hostname, value: list[Metric]}
+        """
+        LOG.info("Reporting metrics of %s machines to Grafana Dashboard", len(metrics))
+        rich.print("GRAFANA", metrics)
+        # Report all the metrics to Grafana Dashboard in a single bulk write
@@ -0,0 +1,181 @@
+"""Memory-mapped ring buffer of metric samples stored on disk."""
+
+import os
+
+import numpy as np
+
+from cems2 import log
+
+# Get the logger
+LOG = log.get_logger(__name__)
+
+# Header of the file (position of the next sample and number of samples)
+HEADER = np.dtype(
+    [("magic", "S8"), ("capacity", "<u8"), ("position", "<u8"), ("count", "<u8")]
+)
+
+# Size of the header on disk (the columns start after it)
+HEADER_SIZE = 64
+
+MAGIC = b"CEMS2RB2"
+
+
+class RingBuffer(object):
+    """Fixed-size ring buffer of the samples of a series mapped from a file.
+
+    The file has a column of timestamps and a column of values, so the
+    samples are written directly into the mapped file (without building any
+    Python object per sample) and a range of timestamps is found with a
+    binary search on the mapped column. The oldest samples are overwritten
+    when the buffer is full. The file keeps the position of the buffer, so
+    the samples survive restarts. The file is mapped once (one file
+    descriptor) and the header and the columns are views of the mapping,
+    which is released by close().
+
+    The samples must be appended in chronological order.
+    """
+
+    def __init__(self, path, capacity):
+        """Open (or create) the ring buffer file.
+
+        If the file already exists, its own capacity is kept.
+
+        :param path: Path of the file
+        :type path: str
+        :param capacity: Number of samples of a new file
+        :type capacity: int
+        """
+        self.path = path
+
+        if not os.path.exists(path):
+            self._create(path, capacity)
+
+        # Map the whole file once and view the header and the columns in it
+        self._map = np.memmap(path, dtype=np.uint8, mode="r+")
+        self._header = self._map[: HEADER.itemsize].view(HEADER)
+        if self._header["magic"][0] != MAGIC:
+            self.close()
+            raise RuntimeError(f"File '{path}' is not a metric ring buffer")
+
+        self.capacity = int(self._header["capacity"][0])
+        if self.capacity != capacity:
+            LOG.debug(
+                "Ring buffer %s keeps its capacity of %s samples", path, self.capacity
+            )
+
+        columns = self._map[HEADER_SIZE : HEADER_SIZE + self.capacity * 16]
+        self._timestamps = columns[: self.capacity * 8].view("<f8")
+        self._values = columns[self.capacity * 8 :].view("<f8")
+
+    @staticmethod
+    def _create(path, capacity):
+        """Create an empty ring buffer file.
+
+        :param path: Path of the file
+        :type path: str
+        :param capacity: Number of samples of the file
+        :type capacity: int
+        """
+        with open(path, "wb") as file:
+            file.truncate(HEADER_SIZE + capacity * 16)
+
+        header = np.memmap(path, dtype=HEADER, mode="r+", shape=(1,))
+        header[0] = (MAGIC, capacity, 0, 0)
+        header.flush()
+        del header
+
+    def __len__(self):
+        """Get the number of samples in the buffer."""
+        return int(self._header["count"][0])
+
+    def append(self, timestamps, values):
+        """Append a batch of samples (overwriting the oldest ones).
+
+        :param timestamps: Timestamps of the samples (ascending)
+        :type timestamps: numpy.ndarray
+        :param values: Values of the samples
+        :type values: numpy.ndarray
+        """
+        size = len(timestamps)
+        if size == 0:
+            return
+
+        # Only the last samples fit in the buffer
+        if size > self.capacity:
+            first = size - self.capacity
+            timestamps = timestamps[first:]
+            values = values[first:]
+            size = self.capacity
+
+        position = int(self._header["position"][0])
+
+        # Write the samples in (at most) two slices, wrapping around the end
+        first = min(size, self.capacity - position)
+        for start, stop, offset in ((0, first, position), (first, size, 0)):
+            if start == stop:
+                continue
+            end = offset + stop - start
+            self._timestamps[offset:end] = timestamps[start:stop]
+            self._values[offset:end] = values[start:stop]
+
+        self._header["position"] = (position + size) % self.capacity
+        self._header["count"] = min(len(self) + size, self.capacity)
+
+    def _slices(self):
+        """Get the slices of the buffer in chronological order.
+
+        :return: The older and the newer slices of the buffer
+        :rtype: tuple(slice, slice)
+        """
+        position = int(self._header["position"][0])
+        if len(self) < self.capacity:
+            return slice(0, 0), slice(0, position)
+        return slice(position, self.capacity), slice(0, position)
+
+    def last_timestamp(self):
+        """Get the timestamp of the newest sample.
+
+        :return: The timestamp (-inf if the buffer is empty)
+        :rtype: float
+        """
+        if len(self) == 0:
+            return float("-inf")
+        return float(self._timestamps[int(self._header["position"][0]) - 1])
+
+    def range(self, start, end):
+        """Get a copy of the samples of a range of timestamps.
+
+        Only the samples of the range are read from the mapped file.
+
+        :param start: Start of the range (included)
+        :type start: float
+        :param end: End of the range (included)
+        :type end: float
+
+        :return: The timestamps and the values of the samples
+        :rtype: tuple(numpy.ndarray, numpy.ndarray)
+        """
+        timestamps = []
+        values = []
+        for part in self._slices():
+            column = self._timestamps[part]
+            first = part.start + np.searchsorted(column, start, side="left")
+            last = part.start + np.searchsorted(column, end, side="right")
+            timestamps.append(np.array(self._timestamps[first:last]))
+            values.append(np.array(self._values[first:last]))
+        return np.concatenate(timestamps), np.concatenate(values)
+
+    def flush(self):
+        """Write the changes of the buffer to disk."""
+        self._map.flush()
+
+    def close(self):
+        """Write the changes to disk and release the mapping of the file.
+
+        The buffer can not be used after closing it.
+        """
+        if self._map is None:
+            return
+        self._map.flush()
+        # The file is unmapped (and its descriptor closed) with its last view
+        self._header = self._timestamps = self._values = self._map = None
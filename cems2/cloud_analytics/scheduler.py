@@ -0,0 +1,248 @@
+"""Scheduler of the monitoring of each machine."""
+
+import math
+import zlib
+
+from cems2 import log
+
+# Get the logger
+LOG = log.get_logger(__name__)
+
+
+class Scheduler(object):
+    """Decide when each machine has to be monitored again.
+
+    With the adaptive interval, the machines whose utilization changes fast
+    (or that have just started to be monitored or changed, e.g. powered on
+    or with VMs migrated to them) are polled at the minimum interval, and
+    the interval of the stable or idle ones is increased up to the maximum
+    interval.
+
+    With the staggered scheduling, each machine is monitored at a stable
+    phase offset within its interval (hashed from its hostname), so the
+    collection is an evenly spread stream instead of periodic bursts.
+    """
+
+    def __init__(
+        self,
+        interval,
+        adaptive=False,
+        min_interval=None,
+        max_interval=None,
+        volatility_threshold=None,
+        backoff_factor=None,
+        stagger=False,
+    ):
+        """Initialize the scheduler.
+
+        :param interval: Fixed monitoring interval (seconds)
+        :type interval: float
+        :param adaptive: If the interval of each machine is adaptive
+        :type adaptive: bool
+        :param min_interval: Minimum monitoring interval (seconds)
+        :type min_interval: float
+        :param max_interval: Maximum monitoring interval (seconds)
+        :type max_interval: float
+        :param volatility_threshold: Utilization change to consider a machine volatile
+        :type volatility_threshold: float
+        :param backoff_factor: Increase of the interval of a stable machine
+        :type backoff_factor: float
+        :param stagger: If each machine is monitored at its own phase offset
+        :type stagger: bool
+        """
+        self.interval = interval
+        self.adaptive = adaptive
+        self.min_interval = min_interval if adaptive else interval
+        self.max_interval = max_interval if adaptive else interval
+        self.volatility_threshold = volatility_threshold
+        self.backoff_factor = backoff_factor
+        self.stagger = stagger
+
+        # Interval of each machine (key: hostname, value: seconds)
+        self.intervals = {}
+
+        # Next time each machine has to be monitored (key: hostname, value: time)
+        self.next_due = {}
+
+        # Last utilization of each machine (key: hostname, value: float)
+        self.last_utilization = {}
+
+    def due(self, hostnames, now):
+        """Get the machines that have to be monitored.
+
+        The machines without a schedule yet are always due.
+
+        :param hostnames: Hostnames of the machines monitored
+        :type hostnames: list[str]
+        :param now: Current time
+        :type now: float
+
+        :return: Hostnames of the machines to monitor now
+        :rtype: list[str]
+        """
+        return [
+            hostname
+            for hostname in hostnames
+            if self.next_due.get(hostname, now) <= now
+        ]
+
+    def time_to_next(self, hostnames, now):
+        """Get the time until the next machine has to be monitored.
+
+        :param hostnames: Hostnames of the machines monitored
+        :type hostnames: list[str]
+        :param now: Current time
+        :type now: float
+
+        :return: Seconds until the next monitoring
+        :rtype: float
+        """
+        next_times = [self.next_due.get(hostname, now) for hostname in hostnames]
+        if not next_times:
+            return self.interval
+        return max(min(next_times) - now, 0)
+
+    def update(self, hostname, metric_list, now, backoff=True):
+        """Schedule the next monitoring of a machine from its new metrics.
+
+        :param hostname: Hostname of the machine
+        :type hostname: str
+        :param metric_list: New metrics of the machine
+        :type metric_list: list[Metric]
+        :param now: Current time
+        :type now: float
+        :param backoff: If the interval of a stable machine can be increased
+            (not when it was monitored before it was due, e.g. in a forced round)
+        :type backoff: bool
+
+        :return: True if the machine is new or volatile
+        :rtype: bool
+        """
+        interval, volatile = self._compute_interval(hostname, metric_list, backoff)
+        self.intervals[hostname] = interval
+        self.next_due[hostname] = self._next_slot(hostname, interval, now)
+        return volatile
+
+    def _next_slot(self, hostname, interval, now):
+        """Get the next time to monitor a machine.
+
+        With the staggered scheduling, the slots of a machine are the multiples
+        of its interval plus its phase offset, and the next one is the first
+        slot after half an interval (so consecutive monitorings of a machine
+        are between 0.5 and 1.5 intervals away, and exactly one interval once
+        the machine is in its phase).
+
+        :param hostname: Hostname of the machine
+        :type hostname: str
+        :param interval: Monitoring interval of the machine (seconds)
+        :type interval: float
+        :param now: Current time
+        :type now: float
+
+        :return: Next time to monitor the machine
+        :rtype: float
+        """
+        if not self.stagger:
+            return now + interval
+
+        # Stable phase offset of the machine within the interval
+        phase = zlib.crc32(hostname.encode()) / 2**32 * interval
+
+        # First slot of the machine after half an interval
+        slot = math.ceil((now + interval / 2 - phase) / interval)
+        return slot * interval + phase
+
+    def _compute_interval(self, hostname, metric_list, backoff=True):
+        """Compute the next monitoring interval of a machine.
+
+        :param hostname: Hostname of the machine
+        :type hostname: str
+        :param metric_list: New metrics of the machine
+        :type metric_list: list[Metric]
+        :param backoff: If the interval of a stable machine can be increased
+        :type backoff: bool
+
+        :return: Monitoring interval (seconds) and if the machine is volatile
+        :rtype: tuple(float, bool)
+        """
+        if not self.adaptive:
+            return self.interval, hostname not in self.intervals
+
+        utilization = self._get_utilization(metric_list)
+
+        # Without utilization, keep the interval (or the default one)
+        if utilization is None:
+            return self.intervals.get(hostname, self.interval), False
+
+        last_utilization = self.last_utilization.get(hostname)
+        self.last_utilization[hostname] = utilization
+
+        # A new machine (e.g. powered on) or a volatile one: minimum interval
+        if (
+            last_utilization is None
+            or abs(utilization - last_utilization) >= self.volatility_threshold
+        ):
+            if self.intervals.get(hostname) != self.min_interval:
+                LOG.debug("Machine %s is volatile: polling it faster", hostname)
+            return self.min_interval, True
+
+        # A stable or idle machine: back off until the maximum interval
+        interval = self.intervals.get(hostname, self.interval)
+        if backoff:
+            interval *= self.backoff_factor
+        return min(interval, self.max_interval), False
+
+    def _get_utilization(self, metric_list):
+        """Get the utilization from the metrics of a machine.
+
+        :param metric_list: Metrics of the machine
+        :type metric_list: list[Metric]
+
+        :return: The utilization (None if it is not collected)
+        :rtype: float
+        """
+        for metric in metric_list:
+            if metric.name == "utilization":
+                return metric.get_value()
+        return None
+
+    def add(self, hostname, now):
+        """Start the schedule of a machine that starts to be monitored.
+
+        The machine is due immediately.
+
+        :param hostname: Hostname of the machine
+        :type hostname: str
+        :param now: Current time
+        :type now: float
+        """
+        self.next_due[hostname] = now
+
+    def mark_changed(self, hostnames, now):
+        """Poll again at the minimum interval machines that have just changed.
+
+        The machines (e.g. with VMs just migrated to them or just powered on)
+        are due immediately and handled as new ones, so they are polled at
+        the minimum interval until their utilization is stable again.
+
+        :param hostnames: Hostnames of the machines
+        :type hostnames: list[str]
+        :param now: Current time
+        :type now: float
+        """
+        for hostname in hostnames:
+            if hostname not in self.next_due:
+                continue
+            self.next_due[hostname] = now
+            self.intervals[hostname] = self.min_interval
+            self.last_utilization.pop(hostname, None)
+
+    def remove(self, hostname):
+        """Forget the schedule of a machine that is no longer monitored.
+
+        :param hostname: Hostname of the machine
+        :type hostname: str
+        """
+        self.next_due.pop(hostname, None)
+        self.intervals.pop(hostname, None)
+        self.last_utilization.pop(hostname, None)
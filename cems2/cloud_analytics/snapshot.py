@@ -0,0 +1,183 @@
+"""Columnar snapshot of the metrics of the fleet."""
+
+from types import MappingProxyType
+
+import numpy as np
+
+# Factors to convert the amounts of the VMs to MB (memory) and GB (disk)
+_MB = {"KB": 1 / 1024, "MB": 1, "GB": 1024, "TB": 1024**2}
+_GB = {"KB": 1 / 1024**2, "MB": 1 / 1024, "GB": 1, "TB": 1024}
+
+
+def _to_unit(resource, factors):
+    """Convert the amount of a resource of a VM (unknown units are kept).
+
+    :param resource: The amount of the resource
+    :type resource: Amount
+    :param factors: Factors to convert each unit
+    :type factors: dict
+
+    :return: The converted amount
+    :rtype: float
+    """
+    return resource.amount * factors.get(resource.unit.upper(), 1)
+
+
+def _readonly(array):
+    """Make a NumPy array read-only.
+
+    :param array: The array
+    :type array: numpy.ndarray
+
+    :return: The same array (read-only)
+    :rtype: numpy.ndarray
+    """
+    array.flags.writeable = False
+    return array
+
+
+class FleetSnapshot(object):
+    """Immutable columnar snapshot of the metrics of the fleet.
+
+    The machines are indexed by hostname, and their utilization and the
+    resources of their VMs are NumPy arrays aligned with that index. The VMs
+    are grouped by machine in CSR style: the VMs of the machine i are the
+    slice vm_ptr[i]:vm_ptr[i + 1] of the VM arrays.
+    """
+
+    def __init__(self, hostnames, utilization, vm_ptr, vm_uuids, vms, timestamp=None):
+        """Initialize the snapshot.
+
+        :param hostnames: Hostnames of the machines
+        :type hostnames: tuple[str]
+        :param utilization: Utilization of each machine (NaN if not collected)
+        :type utilization: numpy.ndarray
+        :param vm_ptr: Offsets of the VMs of each machine (len(hostnames) + 1)
+        :type vm_ptr: numpy.ndarray
+        :param vm_uuids: UUIDs of the VMs grouped by machine
+        :type vm_uuids: tuple[str]
+        :param vms: VMs grouped by machine
+        :type vms: tuple[VM]
+        :param timestamp: Timestamp of the snapshot
+        :type timestamp: datetime
+        """
+        self.hostnames = tuple(hostnames)
+        self.host_index = MappingProxyType(
+            {hostname: i for i, hostname in enumerate(self.hostnames)}
+        )
+        self.utilization = _readonly(np.asarray(utilization, dtype=np.float64))
+        self.timestamp = timestamp
+
+        # VMs grouped by machine (CSR)
+        self.vm_ptr = _readonly(np.asarray(vm_ptr, dtype=np.int64))
+        self.vm_uuids = tuple(vm_uuids)
+        self.vms = tuple(vms)
+        # Entries of the VMs as {uuid: VM} (shared by all the distributions)
+        self.vm_entries = tuple(
+            {vm_uuid: vm} for vm_uuid, vm in zip(self.vm_uuids, self.vms)
+        )
+        self.vm_host = _readonly(
+            np.repeat(np.arange(len(self.hostnames)), np.diff(self.vm_ptr))
+        )
+
+        # Resources of each VM (vCPUs, memory in MB and disk in GB)
+        self.vm_vcpus = _readonly(
+            np.array([vm.vcpus for vm in self.vms], dtype=np.float64)
+        )
+        self.vm_memory = _readonly(
+            np.array([_to_unit(vm.memory, _MB) for vm in self.vms], dtype=np.float64)
+        )
+        self.vm_disk = _readonly(
+            np.array([_to_unit(vm.disk, _GB) for vm in self.vms], dtype=np.float64)
+        )
+
+        # Resources allocated on each machine (sum of its VMs)
+        self.vcpus = self._sum_by_host(self.vm_vcpus)
+        self.memory = self._sum_by_host(self.vm_memory)
+        self.disk = self._sum_by_host(self.vm_disk)
+
+    @classmethod
+    def from_metrics(cls, metrics, timestamp=None):
+        """Build the snapshot from the last metrics of each machine.
+
+        :param metrics: The metrics of each machine
+        :type metrics: dict{key: hostname, value: list[Metric]}
+        :param timestamp: Timestamp of the snapshot
+        :type timestamp: datetime
+
+        :return: The snapshot
+        :rtype: FleetSnapshot
+        """
+        hostnames = sorted(metrics)
+        utilization = np.full(len(hostnames), np.nan)
+        vm_ptr = np.zeros(len(hostnames) + 1, dtype=np.int64)
+        vm_uuids = []
+        vms = []
+
+        for i, hostname in enumerate(hostnames):
+            for metric in metrics[hostname]:
+                if metric.name == "utilization":
+                    value = metric.get_value()
+                    if value is not None:
+                        utilization[i] = value
+                elif metric.name == "vms":
+                    for vm_uuid, vm in (metric.get_vms() or {}).items():
+                        vm_uuids.append(vm_uuid)
+                        vms.append(vm)
+            vm_ptr[i + 1] = len(vms)
+
+        return cls(hostnames, utilization, vm_ptr, vm_uuids, vms, timestamp)
+
+    def _sum_by_host(self, values):
+        """Sum the values of the VMs of each machine.
+
+        :param values: Value of each VM
+        :type values: numpy.ndarray
+
+        :return: Sum of each machine
+        :rtype: numpy.ndarray
+        """
+        return _readonly(
+            np.bincount(self.vm_host, weights=values, minlength=len(self.hostnames))
+        )
+
+    def __len__(self):
+        """Get the number of machines of the snapshot."""
+        return len(self.hostnames)
+
+    def vm_slice(self, hostname):
+        """Get the slice of the VM arrays of a machine.
+
+        :param hostname: Hostname of the machine
+        :type hostname: str
+
+        :return: The slice of its VMs
+        :rtype: slice
+        """
+        i = self.host_index[hostname]
+        return slice(int(self.vm_ptr[i]), int(self.vm_ptr[i + 1]))
+
+    def get_vms(self, hostname):
+        """Get the VMs of a machine.
+
+        The entries are shared by all the calls (they must not be modified).
+
+        :param hostname: Hostname of the machine
+        :type hostname: str
+
+        :return: The VMs of the machine as ({uuid: VM}, ...)
+        :rtype: tuple[dict]
+        """
+        return self.vm_entries[self.vm_slice(hostname)]
+
+    def get_utilizations(self):
+        """Get the utilization of the machines where it is collected.
+
+        :return: The utilizations (key: hostname, value: utilization)
+        :rtype: dict
+        """
+        collected = np.flatnonzero(~np.isnan(self.utilization))
+        values = self.utilization[collected].tolist()
+        return {
+            self.hostnames[i]: value for i, value in zip(collected.tolist(), values)
+        }
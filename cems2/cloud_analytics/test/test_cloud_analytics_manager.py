@@ -0,0 +1,267 @@
+"""Unit tests of the Cloud Analytics Manager."""
+
+from types import SimpleNamespace
+
+import trio
+from trio.testing import MockClock
+
+from cems2.cloud_analytics.manager import Manager
+from cems2.cloud_analytics.scheduler import Scheduler
+from cems2.schemas.metric import Metric
+
+HOUR = 3600
+
+
+class FakeCollector(object):
+    """Collector manager that reports the utilization of the machines."""
+
+    def __init__(self, volatile):
+        """Initialize the collector.
+
+        :param volatile: Hostnames whose utilization changes on each monitoring
+        :type volatile: set[str]
+        """
+        self.volatile = volatile
+        self.collections = 0
+
+    async def get_metrics_batch(self, machine_ids):
+        """Get the utilization of the machines."""
+        self.collections += 1
+        return {
+            machine_id: [
+                Metric(
+                    name="utilization",
+                    value=50.0 * (self.collections % 2)
+                    if machine_id in self.volatile
+                    else 10.0,
+                    hostname=machine_id,
+                    collected_by="test",
+                )
+            ]
+            for machine_id in machine_ids
+        }
+
+
+def _get_manager(hostnames, volatile, adaptive):
+    """Create a manager monitoring the machines with a fake collector."""
+    manager = Manager()
+    manager.collector = FakeCollector(volatile)
+    manager.scheduler = Scheduler(
+        240,
+        adaptive=adaptive,
+        min_interval=60,
+        max_interval=960,
+        volatility_threshold=10.0,
+        backoff_factor=2.0,
+    )
+    manager.machines_monitoring = [
+        SimpleNamespace(hostname=hostname) for hostname in hostnames
+    ]
+    return manager
+
+
+def _count_rounds(manager, duration):
+    """Run the monitoring of the manager and count the completed rounds."""
+
+    async def main():
+        rounds = 0
+        force = True
+        while trio.current_time() < duration:
+            _, round_completed = await manager._monitoring(force)
+            rounds += round_completed
+            force = False
+
+            hostnames = [machine.hostname for machine in manager.machines_monitoring]
+            await trio.sleep(
+                manager.scheduler.time_to_next(hostnames, trio.current_time())
+            )
+        return rounds
+
+    return trio.run(main, clock=MockClock(autojump_threshold=0))
+
+
+# Test that a round is completed on each interval with a fixed interval
+def test_rounds_fixed_interval():
+    """Test that a round is completed on each interval with a fixed interval."""
+    manager = _get_manager(["host1", "host2", "host3"], set(), adaptive=False)
+    assert _count_rounds(manager, HOUR) == HOUR // 240
+
+
+# Test that a volatile machine does not complete a round on each monitoring
+def test_rounds_volatile_machine():
+    """Test that a volatile machine does not complete a round on each monitoring."""
+    hostnames = [f"host{i}" for i in range(10)]
+    manager = _get_manager(hostnames, {"host0"}, adaptive=True)
+
+    rounds = _count_rounds(manager, HOUR)
+
+    # The volatile machine is monitored each minimum interval
+    assert manager.collector.collections >= HOUR // 60
+    # The rounds wait for the stable machines (up to the maximum interval)
+    assert rounds <= HOUR // 240
+
+
+# Test that a round is completed when the pending machines are removed
+def test_round_completed_by_removal():
+    """Test that a round is completed when the pending machines are removed."""
+    manager = _get_manager(["host1", "host2"], set(), adaptive=False)
+
+    async def main():
+        # First round (all the machines)
+        _, round_completed = await manager._monitoring(True)
+        assert round_completed
+
+        # Only host1 is due, host2 is still pending
+        manager.scheduler.next_due["host1"] = trio.current_time()
+        _, round_completed = await manager._monitoring(False)
+        assert not round_completed
+
+        # host2 is removed, so the round does not wait for it
+        manager.machines_monitoring = [SimpleNamespace(hostname="host1")]
+        manager.scheduler.next_due["host1"] = trio.current_time()
+        metrics, round_completed = await manager._monitoring(False)
+        assert round_completed
+        assert "host2" not in manager.metrics
+
+    trio.run(main, clock=MockClock(autojump_threshold=0))
+
+
+class FakeReporter(object):
+    """Reporter manager that keeps the queued metrics."""
+
+    def __init__(self):
+        """Initialize the reporter."""
+        self.metrics = []
+
+    async def enqueue_metrics(self, metrics):
+        """Queue the metrics."""
+        self.metrics.append(metrics)
+
+
+class FakeController(object):
+    """API controller that counts the notified snapshots."""
+
+    def __init__(self):
+        """Initialize the controller."""
+        self.snapshots = 0
+
+    def notify_new_metrics(self, metrics, snapshot=None):
+        """Count the snapshot."""
+        self.snapshots += 1
+
+
+# Test that the monitoring loop does not switch the running status
+def test_loop_keeps_running_status():
+    """Test that the monitoring loop does not switch the running status."""
+    manager = _get_manager(["host1", "host2"], set(), adaptive=False)
+    manager.reporter = FakeReporter()
+    manager.api_controller = FakeController()
+    manager.running = True
+
+    async def main():
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(manager._monitoring_loop)
+            await trio.sleep(1)
+            for _ in range(4):
+                assert manager.running is True
+                await trio.sleep(240)
+            nursery.cancel_scope.cancel()
+
+    trio.run(main, clock=MockClock(autojump_threshold=0))
+    assert manager.running is True
+    assert manager.api_controller.snapshots == 5
+
+
+# Test that a monitoring request monitors all the machines without waiting
+def test_monitor_again():
+    """Test that a monitoring request monitors all the machines without waiting."""
+    manager = _get_manager(["host1", "host2"], set(), adaptive=False)
+    manager.reporter = FakeReporter()
+    manager.api_controller = FakeController()
+    manager.running = True
+
+    async def main():
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(manager._monitoring_loop)
+            await trio.sleep(100)
+            assert manager.collector.collections == 1
+
+            manager.monitor_again()
+            await trio.sleep(1)
+            assert manager.collector.collections == 2
+            assert manager.reporter.metrics[-1].keys() == {"host1", "host2"}
+            nursery.cancel_scope.cancel()
+
+    trio.run(main, clock=MockClock(autojump_threshold=0))
+
+
+# Test that the changed machines are polled at the minimum interval again
+def test_monitor_again_changed():
+    """Test that the changed machines are polled at the minimum interval again."""
+    manager = _get_manager(["host1", "host2"], set(), adaptive=True)
+    manager.reporter = FakeReporter()
+    manager.api_controller = FakeController()
+    manager.running = True
+
+    async def main():
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(manager._monitoring_loop)
+            await trio.sleep(2000)
+            assert manager.scheduler.intervals == {"host1": 960, "host2": 960}
+
+            # The forced round does not back off the machines not due
+            manager.monitor_again(["host1"])
+            await trio.sleep(1)
+            assert manager.scheduler.intervals == {"host1": 60, "host2": 960}
+            nursery.cancel_scope.cancel()
+
+    trio.run(main, clock=MockClock(autojump_threshold=0))
+
+
+# Test that a stopped manager does not monitor until it is started again
+def test_stopped():
+    """Test that a stopped manager does not monitor until it is started again."""
+    manager = _get_manager(["host1", "host2"], set(), adaptive=False)
+    manager.reporter = FakeReporter()
+    manager.api_controller = FakeController()
+    manager.running = True
+
+    async def main():
+        async with trio.open_nursery() as nursery:
+            nursery.start_soon(manager._monitoring_loop)
+            await trio.sleep(1)
+            manager.running = False
+            manager.monitor_again()
+            await trio.sleep(1000)
+            assert manager.collector.collections == 1
+
+            manager.running = True
+            await trio.sleep(1)
+            assert manager.collector.collections == 2
+            nursery.cancel_scope.cancel()
+
+    trio.run(main, clock=MockClock(autojump_threshold=0))
+
+
+# Test that the last metrics are replaced (not modified) on each round
+def test_metrics_copy_on_write():
+    """Test that the last metrics are replaced (not modified) on each round."""
+    manager = _get_manager(["host1", "host2"], set(), adaptive=False)
+
+    async def main():
+        await manager._monitoring(True)
+        metrics = manager.obtain_last_metrics()
+        host1 = metrics["host1"]
+
+        await manager._monitoring(True)
+        assert manager.obtain_last_metrics() is not metrics
+        assert metrics["host1"] is host1
+
+        # A removed machine is evicted from a new dict
+        manager.machines_monitoring = [SimpleNamespace(hostname="host1")]
+        metrics = manager.obtain_last_metrics()
+        await manager._monitoring(False)
+        assert "host2" in metrics
+        assert "host2" not in manager.obtain_last_metrics()
+
+    trio.run(main, clock=MockClock(autojump_threshold=0))
@@ -0,0 +1,126 @@
+"""Unit tests of the collector manager."""
+
+import trio
+from trio.testing import MockClock
+
+from cems2.cloud_analytics.collector.base import MetricCollectorBase
+from cems2.cloud_analytics.collector.manager import Manager
+from cems2.schemas.metric import Metric
+
+
+class SlowCollector(MetricCollectorBase):
+    """Collector that takes a fixed time for each machine."""
+
+    def __init__(self, name, delay):
+        """Initialize the collector."""
+        self.name = name
+        self.delay = delay
+        self.calls = []
+
+    async def collect_metric(self, machine_id):
+        """Collect the metric of a machine after the delay."""
+        self.calls.append(machine_id)
+        await trio.sleep(self.delay)
+        return Metric(
+            name=self.name, value=1.0, hostname=machine_id, collected_by=self.name
+        )
+
+
+class BatchCollector(SlowCollector):
+    """Collector that implements the batch collection."""
+
+    supports_batch = True
+
+    async def collect_metrics_batch(self, machine_ids):
+        """Collect the metric of all the machines in a single call."""
+        self.calls.append(tuple(machine_ids))
+        await trio.sleep(self.delay)
+        return [
+            Metric(name=self.name, value=2.0, hostname=i, collected_by=self.name)
+            for i in machine_ids
+        ]
+
+
+def _get_manager(collectors, timeout=10, limiter=None):
+    """Create a collector manager with the specified collectors."""
+    manager = Manager.__new__(Manager)
+    manager.collectors = [(collector.name, collector) for collector in collectors]
+    manager.timeout = timeout
+    manager.limiter = limiter
+    manager.collector_limiters = {}
+    return manager
+
+
+# Test that the default batch collection collects the machines one by one
+def test_default_batch():
+    """Test that the default batch collection collects the machines one by one."""
+    collector = SlowCollector("a", 1)
+    assert not collector.supports_batch
+
+    metrics = trio.run(
+        collector.collect_metrics_batch,
+        ["host1", "host2"],
+        clock=MockClock(autojump_threshold=0),
+    )
+
+    assert [metric.hostname for metric in metrics] == ["host1", "host2"]
+    assert collector.calls == ["host1", "host2"]
+
+
+# Test that the collectors of a machine run concurrently in the configured order
+def test_get_metrics_concurrent():
+    """Test that the collectors of a machine run concurrently in order."""
+    manager = _get_manager([SlowCollector("a", 1), SlowCollector("b", 1)])
+
+    async def main():
+        start = trio.current_time()
+        metrics = await manager.get_metrics("host1")
+        return metrics, trio.current_time() - start
+
+    metrics, elapsed = trio.run(main, clock=MockClock(autojump_threshold=0))
+    assert [metric.name for metric in metrics] == ["a", "b"]
+    assert elapsed == 1
+
+
+# Test that a collector that times out is left out of the results
+def test_get_metrics_timeout():
+    """Test that a collector that times out is left out of the results."""
+    manager = _get_manager([SlowCollector("a", 1), SlowCollector("b", 20)])
+
+    metrics = trio.run(
+        manager.get_metrics, "host1", clock=MockClock(autojump_threshold=0)
+    )
+    assert [metric.name for metric in metrics] == ["a"]
+
+
+# Test that the batch collectors are called once for all the machines
+def test_get_metrics_batch():
+    """Test that the batch collectors are called once for all the machines."""
+    single = SlowCollector("a", 1)
+    batch = BatchCollector("b", 1)
+    manager = _get_manager([single, batch])
+
+    metrics = trio.run(
+        manager.get_metrics_batch,
+        ["host1", "host2"],
+        clock=MockClock(autojump_threshold=0),
+    )
+    assert sorted(single.calls) == ["host1", "host2"]
+    assert batch.calls == [("host1", "host2")]
+    for hostname in ("host1", "host2"):
+        assert [metric.name for metric in metrics[hostname]] == ["a", "b"]
+        assert all(metric.hostname == hostname for metric in metrics[hostname])
+
+
+# Test that the global limiter bounds the concurrent collections
+def test_get_metrics_batch_limited():
+    """Test that the global limiter bounds the concurrent collections."""
+    manager = _get_manager([SlowCollector("a", 1)], limiter=trio.CapacityLimiter(2))
+
+    async def main():
+        start = trio.current_time()
+        await manager.get_metrics_batch(["host1", "host2", "host3", "host4"])
+        return trio.current_time() - start
+
+    elapsed = trio.run(main, clock=MockClock(autojump_threshold=0))
+    assert elapsed == 2
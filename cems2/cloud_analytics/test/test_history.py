@@ -0,0 +1,206 @@
+"""Unit tests of the history of the metrics."""
+
+import os
+from datetime import datetime
+
+import pytest
+
+from cems2.cloud_analytics import history
+from cems2.schemas.metric import Metric
+
+
+def _metrics(hostname, timestamp, **values):
+    """Get the metrics of a machine with the specified values."""
+    return {
+        hostname: [
+            Metric(
+                name=name,
+                value=value,
+                hostname=hostname,
+                timestamp=datetime.fromtimestamp(timestamp),
+                collected_by="test",
+            )
+            for name, value in values.items()
+        ]
+    }
+
+
+@pytest.fixture
+def memory_history():
+    """Create an in-memory history with small chunks."""
+    retention = {history.RAW: 600, history.MINUTE: 7200, history.HOUR: 86400}
+    return history.MetricHistory(retention, chunk_size=4)
+
+
+# Test the raw samples and the aggregates of the in-memory history
+def test_memory_query(memory_history, monkeypatch):
+    """Test the raw samples and the aggregates of the in-memory history."""
+    monkeypatch.setattr(history.time, "time", lambda: 200)
+    for timestamp in (100, 130, 170, 200):
+        memory_history.add_metrics(_metrics("host1", timestamp, utilization=timestamp))
+
+    samples = memory_history.query(
+        "host1",
+        "utilization",
+        start=datetime.fromtimestamp(130),
+        end=datetime.fromtimestamp(170),
+    )
+    assert samples == [(130, 130, 130, 130, 1), (170, 170, 170, 170, 1)]
+
+    # The last aggregate is still open
+    samples = memory_history.query("host1", "utilization", resolution=history.MINUTE)
+    assert samples == [
+        (60, 100, 100, 100, 1),
+        (120, 150, 130, 170, 2),
+        (180, 200, 200, 200, 1),
+    ]
+    assert memory_history.get_metric_names("host1") == ["utilization"]
+    assert memory_history.query("host2", "utilization") == []
+
+
+# Test that the samples older than the retention are dropped
+def test_memory_retention(memory_history, monkeypatch):
+    """Test that the samples older than the retention are dropped."""
+    now = 0
+    monkeypatch.setattr(history.time, "time", lambda: now)
+    for now in range(0, 1200, 60):
+        memory_history.add_metrics(_metrics("host1", now, utilization=1))
+
+    # Raw samples of the last 10 minutes (expired by whole chunks of 4 samples)
+    raw = memory_history.query("host1", "utilization")
+    assert now - 600 - 4 * 60 < raw[0][0] <= now - 600
+    assert len(raw) < 20
+
+    # Aggregates of all of them
+    minutes = memory_history.query("host1", "utilization", resolution=history.MINUTE)
+    assert len(minutes) == 20
+
+
+# Test that an invalid resolution is rejected
+def test_invalid_resolution(memory_history):
+    """Test that an invalid resolution is rejected."""
+    with pytest.raises(ValueError):
+        memory_history.query("host1", "utilization", resolution="1d")
+
+
+@pytest.fixture
+def mmap_history(tmp_path):
+    """Create an on-disk history with a small capacity."""
+    return history.MmapMetricHistory(str(tmp_path / "history"), 4)
+
+
+# Test that each metric of each machine keeps its own retention
+def test_mmap_series_of_each_machine(mmap_history):
+    """Test that each metric of each machine keeps its own retention."""
+    for timestamp in range(10):
+        mmap_history.add_metrics(_metrics("host1", timestamp, utilization=timestamp))
+        mmap_history.add_metrics(_metrics("host2", timestamp, utilization=-timestamp))
+
+    samples = mmap_history.query("host1", "utilization")
+    assert [sample[0] for sample in samples] == [6, 7, 8, 9]
+    assert [sample[1] for sample in samples] == [6, 7, 8, 9]
+    samples = mmap_history.query("host2", "utilization")
+    assert [sample[1] for sample in samples] == [-6, -7, -8, -9]
+
+    assert mmap_history.query("host3", "utilization") == []
+    assert mmap_history.query("host1", "power") == []
+
+
+# Test that a query only returns the samples of its range
+def test_mmap_query_range(mmap_history):
+    """Test that a query only returns the samples of its range."""
+    for timestamp in (100, 130, 170, 200):
+        mmap_history.add_metrics(_metrics("host1", timestamp, utilization=timestamp))
+
+    samples = mmap_history.query(
+        "host1",
+        "utilization",
+        start=datetime.fromtimestamp(130),
+        end=datetime.fromtimestamp(170),
+    )
+    assert [sample[0] for sample in samples] == [130, 170]
+
+    # Aggregates of 1 minute (timestamp, mean, min, max, count)
+    samples = mmap_history.query("host1", "utilization", resolution=history.MINUTE)
+    assert samples == [
+        (60, 100, 100, 100, 1),
+        (120, 150, 130, 170, 2),
+        (180, 200, 200, 200, 1),
+    ]
+
+
+# Test that the old or repeated samples are not appended
+def test_mmap_chronological(mmap_history):
+    """Test that the old or repeated samples are not appended."""
+    mmap_history.add_metrics(_metrics("host1", 2, utilization=2))
+    mmap_history.add_metrics(_metrics("host1", 2, utilization=3))
+    mmap_history.add_metrics(_metrics("host1", 1, utilization=1))
+    assert mmap_history.query("host1", "utilization") == [(2, 2, 2, 2, 1)]
+
+
+# Test that the names can not escape the directory of the history
+@pytest.mark.parametrize("name", ["../escape", "a/b", "..", ".hidden", "%2F"])
+def test_mmap_file_names(tmp_path, name):
+    """Test that the names can not escape the directory of the history."""
+    directory = tmp_path / "history"
+    mmap_history = history.MmapMetricHistory(str(directory), 4)
+    mmap_history.add_metrics(_metrics(name, 1, **{name: 1.0}))
+
+    assert mmap_history.query(name, name) == [(1, 1, 1, 1, 1)]
+    assert mmap_history.get_metric_names(name) == [name]
+
+    # All the files are in a directory of a machine inside the history
+    assert os.listdir(tmp_path) == ["history"]
+    for host_dir in directory.iterdir():
+        assert host_dir.is_dir()
+        assert not host_dir.name.startswith(".")
+        for file in host_dir.iterdir():
+            assert file.is_file() and not file.name.startswith(".")
+
+
+# Test that the history survives reopening the directory
+def test_mmap_reopen(tmp_path):
+    """Test that the history survives reopening the directory."""
+    directory = str(tmp_path / "history")
+    mmap_history = history.MmapMetricHistory(directory, 4)
+    mmap_history.add_metrics(_metrics("host1", 1, utilization=1, power=100))
+    mmap_history.close()
+
+    mmap_history = history.MmapMetricHistory(directory, 4)
+    assert mmap_history.get_metric_names("host1") == ["power", "utilization"]
+    assert mmap_history.query("host1", "power") == [(1, 100, 100, 100, 1)]
+
+    # The samples older than the last one stored are not appended
+    mmap_history.add_metrics(_metrics("host1", 1, power=50))
+    assert mmap_history.query("host1", "power") == [(1, 100, 100, 100, 1)]
+
+
+# Test that only the most recently used ring buffers are kept open
+def test_mmap_max_open(tmp_path):
+    """Test that only the most recently used ring buffers are kept open."""
+    mmap_history = history.MmapMetricHistory(str(tmp_path / "history"), 4, 2)
+    for timestamp in range(3):
+        for hostname in ("host1", "host2", "host3"):
+            mmap_history.add_metrics(
+                _metrics(hostname, timestamp, utilization=timestamp)
+            )
+
+    assert list(mmap_history._buffers) == [
+        ("host2", "utilization"),
+        ("host3", "utilization"),
+    ]
+    # The closed ones are opened again when needed
+    assert len(mmap_history.query("host1", "utilization")) == 3
+    assert len(mmap_history._buffers) == 2
+
+
+# Test that the ring buffers of the machines no longer monitored are closed
+def test_mmap_close_hosts(mmap_history):
+    """Test that the ring buffers of the machines no longer monitored are closed."""
+    mmap_history.add_metrics(_metrics("host1", 1, utilization=1, power=100))
+    mmap_history.add_metrics(_metrics("host2", 1, utilization=1))
+
+    mmap_history.close_hosts({"host1"})
+
+    assert list(mmap_history._buffers) == [("host2", "utilization")]
+    assert mmap_history.get_metric_names("host1") == ["power", "utilization"]
@@ -0,0 +1,65 @@
+"""Unit tests of the reporter manager."""
+
+import trio
+
+from cems2.cloud_analytics.reporter.base import MetricReporterBase
+from cems2.cloud_analytics.reporter.manager import Manager
+from cems2.schemas.metric import Metric
+
+
+class RecordingReporter(MetricReporterBase):
+    """Reporter that records the calls of each machine."""
+
+    def __init__(self):
+        """Initialize the reporter."""
+        self.calls = []
+
+    async def report_metric(self, metric_list):
+        """Record the report of the metrics of a machine."""
+        self.calls.append(metric_list[0].hostname)
+
+
+class BatchReporter(RecordingReporter):
+    """Reporter that writes all the machines at once."""
+
+    supports_batch = True
+
+    async def report_metrics_batch(self, metrics):
+        """Record the report of the metrics of all the machines."""
+        self.calls.append(tuple(metrics))
+
+
+def _metrics(*hostnames):
+    """Get the metrics of the machines."""
+    return {
+        hostname: [
+            Metric(name="utilization", value=1.0, hostname=hostname, collected_by="t")
+        ]
+        for hostname in hostnames
+    }
+
+
+# Test that the default batch report reports the machines one by one
+def test_default_batch():
+    """Test that the default batch report reports the machines one by one."""
+    reporter = RecordingReporter()
+    assert not reporter.supports_batch
+
+    trio.run(reporter.report_metrics_batch, _metrics("host1", "host2"))
+
+    assert reporter.calls == ["host1", "host2"]
+
+
+# Test that only the reporters that support it receive the batch
+def test_send_metrics_batch():
+    """Test that only the reporters that support it receive the batch."""
+    single, batch = RecordingReporter(), BatchReporter()
+    manager = Manager.__new__(Manager)
+    manager.reporters = [("single", single), ("batch", batch)]
+    manager.timeout = 10
+    manager.limiter = None
+
+    trio.run(manager.send_metrics_batch, {**_metrics("host1", "host2"), "host3": []})
+
+    assert sorted(single.calls) == ["host1", "host2"]
+    assert batch.calls == [("host1", "host2")]
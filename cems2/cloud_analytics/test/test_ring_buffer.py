@@ -0,0 +1,84 @@
+"""Unit tests of the memory-mapped ring buffer."""
+
+import os
+
+import numpy as np
+import pytest
+
+from cems2.cloud_analytics.ring_buffer import RingBuffer
+
+
+def _append(buffer, timestamps):
+    """Append samples whose value is their timestamp."""
+    timestamps = np.asarray(timestamps, dtype="<f8")
+    buffer.append(timestamps, timestamps * 10)
+
+
+# Test the range of samples before the buffer wraps around
+def test_range(tmp_path):
+    """Test the range of samples before the buffer wraps around."""
+    buffer = RingBuffer(str(tmp_path / "series.ring"), 8)
+    assert buffer.last_timestamp() == float("-inf")
+
+    _append(buffer, [1, 2, 3, 4])
+    assert len(buffer) == 4
+    assert buffer.last_timestamp() == 4
+
+    timestamps, values = buffer.range(2, 3)
+    assert timestamps.tolist() == [2, 3]
+    assert values.tolist() == [20, 30]
+
+
+# Test that the oldest samples are overwritten when the buffer is full
+def test_wrap_around(tmp_path):
+    """Test that the oldest samples are overwritten when the buffer is full."""
+    buffer = RingBuffer(str(tmp_path / "series.ring"), 4)
+    _append(buffer, [1, 2, 3])
+    _append(buffer, [4, 5, 6])
+
+    assert len(buffer) == 4
+    assert buffer.last_timestamp() == 6
+    assert buffer.range(float("-inf"), float("inf"))[0].tolist() == [3, 4, 5, 6]
+    assert buffer.range(4, 5)[0].tolist() == [4, 5]
+
+    # A batch larger than the buffer keeps its last samples
+    _append(buffer, [7, 8, 9, 10, 11])
+    assert buffer.range(float("-inf"), float("inf"))[0].tolist() == [8, 9, 10, 11]
+
+
+# Test that the samples survive reopening the file
+def test_reopen(tmp_path):
+    """Test that the samples survive reopening the file."""
+    path = str(tmp_path / "series.ring")
+    buffer = RingBuffer(path, 4)
+    _append(buffer, [1, 2, 3, 4, 5])
+    buffer.flush()
+
+    # The file keeps its own capacity
+    buffer = RingBuffer(path, 16)
+    assert buffer.capacity == 4
+    assert buffer.range(float("-inf"), float("inf"))[0].tolist() == [2, 3, 4, 5]
+
+
+# Test that a file that is not a ring buffer is rejected
+def test_not_ring_buffer(tmp_path):
+    """Test that a file that is not a ring buffer is rejected."""
+    path = tmp_path / "series.ring"
+    path.write_bytes(b"\0" * 128)
+    with pytest.raises(RuntimeError):
+        RingBuffer(str(path), 4)
+
+
+# Test that the file is mapped once and released when the buffer is closed
+@pytest.mark.skipif(
+    not os.path.isdir("/proc/self/fd"), reason="The open files can not be counted"
+)
+def test_close(tmp_path):
+    """Test that the file is mapped once and released when the buffer is closed."""
+    open_files = len(os.listdir("/proc/self/fd"))
+    buffers = [RingBuffer(str(tmp_path / f"{i}.ring"), 8) for i in range(10)]
+    assert len(os.listdir("/proc/self/fd")) - open_files == 10
+
+    for buffer in buffers:
+        buffer.close()
+    assert len(os.listdir("/proc/self/fd")) == open_files
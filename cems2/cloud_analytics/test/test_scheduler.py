@@ -0,0 +1,139 @@
+"""Unit tests of the scheduler of the monitoring."""
+
+from cems2.cloud_analytics.scheduler import Scheduler
+from cems2.schemas.metric import Metric
+
+
+def _utilization(value):
+    """Get the metric list of a machine with the specified utilization."""
+    return [
+        Metric(name="utilization", value=value, hostname="host1", collected_by="test")
+    ]
+
+
+def _get_scheduler(**kwargs):
+    """Create an adaptive scheduler."""
+    return Scheduler(
+        240,
+        adaptive=True,
+        min_interval=60,
+        max_interval=960,
+        volatility_threshold=10.0,
+        backoff_factor=2.0,
+        **kwargs,
+    )
+
+
+# Test that a fixed interval schedules every machine each interval
+def test_fixed_interval():
+    """Test that a fixed interval schedules every machine each interval."""
+    scheduler = Scheduler(240)
+    scheduler.add("host1", 0)
+    assert scheduler.due(["host1"], 0) == ["host1"]
+
+    # Only the first monitoring of a machine is new
+    assert scheduler.update("host1", _utilization(10), 0)
+    assert not scheduler.update("host1", _utilization(90), 240)
+    assert scheduler.next_due["host1"] == 480
+    assert scheduler.due(["host1"], 479) == []
+    assert scheduler.time_to_next(["host1"], 400) == 80
+
+
+# Test that a stable machine backs off until the maximum interval
+def test_adaptive_backoff():
+    """Test that a stable machine backs off until the maximum interval."""
+    scheduler = _get_scheduler()
+
+    # A new machine is polled at the minimum interval
+    assert scheduler.update("host1", _utilization(10), 0)
+    assert scheduler.intervals["host1"] == 60
+
+    intervals = []
+    for _ in range(6):
+        assert not scheduler.update("host1", _utilization(12), 0)
+        intervals.append(scheduler.intervals["host1"])
+    assert intervals == [120, 240, 480, 960, 960, 960]
+
+
+# Test that a volatile machine goes back to the minimum interval
+def test_adaptive_volatile():
+    """Test that a volatile machine goes back to the minimum interval."""
+    scheduler = _get_scheduler()
+    scheduler.update("host1", _utilization(10), 0)
+    scheduler.update("host1", _utilization(10), 0)
+    assert scheduler.intervals["host1"] == 120
+
+    assert scheduler.update("host1", _utilization(50), 0)
+    assert scheduler.intervals["host1"] == 60
+
+
+# Test that a machine without utilization keeps its interval
+def test_adaptive_without_utilization():
+    """Test that a machine without utilization keeps its interval."""
+    scheduler = _get_scheduler()
+    assert not scheduler.update("host1", [], 0)
+    assert scheduler.intervals["host1"] == 240
+
+
+# Test that a machine monitored before it was due does not back off
+def test_no_backoff():
+    """Test that a machine monitored before it was due does not back off."""
+    scheduler = _get_scheduler()
+    scheduler.update("host1", _utilization(10), 0)
+    for _ in range(3):
+        scheduler.update("host1", _utilization(10), 0, backoff=False)
+    assert scheduler.intervals["host1"] == 60
+
+
+# Test that a changed machine is due and polled at the minimum interval
+def test_mark_changed():
+    """Test that a changed machine is due and polled at the minimum interval."""
+    scheduler = _get_scheduler()
+    scheduler.update("host1", _utilization(10), 0)
+    for _ in range(4):
+        scheduler.update("host1", _utilization(10), 0)
+    assert scheduler.intervals["host1"] == 960
+
+    scheduler.mark_changed(["host1", "host2"], 100)
+    assert scheduler.due(["host1"], 100) == ["host1"]
+    assert "host2" not in scheduler.next_due
+
+    # Its next utilization is handled as the first one
+    assert scheduler.update("host1", _utilization(10), 100)
+    assert scheduler.intervals["host1"] == 60
+
+
+# Test that a removed machine is forgotten
+def test_remove():
+    """Test that a removed machine is forgotten."""
+    scheduler = _get_scheduler()
+    scheduler.update("host1", _utilization(10), 0)
+    scheduler.remove("host1")
+    assert scheduler.due(["host1"], 0) == ["host1"]
+    assert scheduler.time_to_next([], 0) == 240
+
+
+# Test that the staggered machines are spread within the interval
+def test_stagger_spread():
+    """Test that the staggered machines are spread within the interval."""
+    scheduler = Scheduler(240, stagger=True)
+    hostnames = [f"host{i}" for i in range(100)]
+    for hostname in hostnames:
+        scheduler.update(hostname, [], 0)
+
+    next_due = [scheduler.next_due[hostname] for hostname in hostnames]
+    assert all(120 <= due <= 360 for due in next_due)
+    # More than one machine per slot of 1/10 of the interval on average
+    assert len({int(due % 240 // 24) for due in next_due}) == 10
+
+
+# Test that a staggered machine keeps its phase
+def test_stagger_phase():
+    """Test that a staggered machine keeps its phase."""
+    scheduler = Scheduler(240, stagger=True)
+    scheduler.update("host1", [], 0)
+    first = scheduler.next_due["host1"]
+
+    # Monitored late, the next slot is still in the phase of the machine
+    scheduler.update("host1", [], first + 30)
+    assert scheduler.next_due["host1"] == first + 240
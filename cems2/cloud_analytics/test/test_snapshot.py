@@ -0,0 +1,100 @@
+"""Unit tests of the columnar snapshot of the fleet."""
+
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from cems2.cloud_analytics.snapshot import FleetSnapshot
+from cems2.schemas.metric import Metric
+from cems2.schemas.vm import VM, Amount
+
+
+def _vm(vcpus, memory, disk):
+    """Create a VM with the specified resources."""
+    return VM(
+        vcpus=vcpus,
+        memory=Amount(amount=memory[0], unit=memory[1]),
+        disk=Amount(amount=disk[0], unit=disk[1]),
+        managed_by="test",
+    )
+
+
+@pytest.fixture
+def snapshot():
+    """Create a snapshot from the metrics of 3 machines."""
+    metrics = {
+        "host2": [
+            Metric(name="utilization", value=20.0, hostname="host2", collected_by="t"),
+            Metric(
+                name="vms",
+                vms={
+                    "uuid1": _vm(2, (2, "GB"), (20, "GB")),
+                    "uuid2": _vm(4, (1024, "MB"), (1, "TB")),
+                },
+                hostname="host2",
+                collected_by="t",
+            ),
+        ],
+        "host1": [
+            Metric(name="utilization", value=50.0, hostname="host1", collected_by="t"),
+        ],
+        "host3": [
+            Metric(
+                name="vms",
+                vms={"uuid3": _vm(1, (512, "MB"), (10, "GB"))},
+                hostname="host3",
+                collected_by="t",
+            ),
+        ],
+    }
+    return FleetSnapshot.from_metrics(metrics, datetime(2023, 5, 1))
+
+
+# Test the arrays of the machines and their VMs
+def test_from_metrics(snapshot):
+    """Test the arrays of the machines and their VMs."""
+    assert snapshot.hostnames == ("host1", "host2", "host3")
+    assert len(snapshot) == 3
+    assert snapshot.vm_ptr.tolist() == [0, 0, 2, 3]
+    assert snapshot.vm_host.tolist() == [1, 1, 2]
+    assert snapshot.vm_uuids == ("uuid1", "uuid2", "uuid3")
+
+    # Resources in vCPUs, MB and GB
+    assert snapshot.vm_memory.tolist() == [2048, 1024, 512]
+    assert snapshot.vm_disk.tolist() == [20, 1024, 10]
+    assert snapshot.vcpus.tolist() == [0, 6, 1]
+    assert snapshot.memory.tolist() == [0, 3072, 512]
+
+    # The utilization is only known where it is collected
+    assert snapshot.get_utilizations() == {"host1": 50.0, "host2": 20.0}
+
+
+# Test the VMs of each machine
+def test_get_vms(snapshot):
+    """Test the VMs of each machine."""
+    assert snapshot.get_vms("host1") == ()
+    assert [list(vm) for vm in snapshot.get_vms("host2")] == [["uuid1"], ["uuid2"]]
+
+    # The entries are shared by all the calls
+    assert snapshot.get_vms("host3")[0] is snapshot.get_vms("host3")[0]
+    assert snapshot.vm_slice("host3") == slice(2, 3)
+
+
+# Test that the snapshot can not be modified
+def test_readonly(snapshot):
+    """Test that the snapshot can not be modified."""
+    for array in (snapshot.utilization, snapshot.vm_ptr, snapshot.vm_memory):
+        with pytest.raises(ValueError):
+            array[0] = 1
+    with pytest.raises(TypeError):
+        snapshot.host_index["host4"] = 3
+
+
+# Test an empty snapshot
+def test_empty():
+    """Test an empty snapshot."""
+    snapshot = FleetSnapshot.from_metrics({})
+    assert len(snapshot) == 0
+    assert snapshot.vm_ptr.tolist() == [0]
+    assert np.array_equal(snapshot.vcpus, [])
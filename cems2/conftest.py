@@ -0,0 +1,6 @@
+"""Configuration of the tests of CEMS2."""
+
+from cems2 import config_loader
+
+# Log only to the console while testing (the log file may not exist)
+config_loader.config.set("log", "handlers", "console")
@@ -0,0 +1,70 @@
+"""Event that wakes up trio tasks from any thread."""
+
+import threading
+
+import trio
+
+
+class ThreadSafeEvent(object):
+    """Event flag that can be set from any thread and awaited from any trio run.
+
+    The API runs in other threads than the trio event loop of the managers,
+    so a trio.Event cannot be set from it. Each waiter registers its own
+    trio.Event together with the token of its trio run, and set() wakes it
+    up through that token without polling.
+    """
+
+    def __init__(self):
+        """Initialize the event (not set)."""
+        self._flag = False
+        self._lock = threading.Lock()
+        # Waiting tasks (trio token of the run, trio event of the task)
+        self._waiters = []
+
+    def is_set(self):
+        """Get if the event is set.
+
+        :return: True if the event is set
+        :rtype: bool
+        """
+        return self._flag
+
+    def set(self):
+        """Set the event and wake up all the waiting tasks."""
+        with self._lock:
+            self._flag = True
+            waiters = self._waiters
+            self._waiters = []
+
+        for trio_token, event in waiters:
+            try:
+                trio_token.run_sync_soon(event.set)
+            except trio.RunFinishedError:
+                # The trio run of the waiter has already finished
+                pass
+
+    def clear(self):
+        """Clear the event."""
+        with self._lock:
+            self._flag = False
+
+    async def wait(self):
+        """Wait until the event is set."""
+        with self._lock:
+            if self._flag:
+                waiter = None
+            else:
+                waiter = (trio.lowlevel.current_trio_token(), trio.Event())
+                self._waiters.append(waiter)
+
+        # If the event is already set, just yield to the scheduler
+        if waiter is None:
+            await trio.lowlevel.checkpoint()
+            return
+
+        try:
+            await waiter[1].wait()
+        finally:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
@@ -0,0 +1,257 @@
+"""Process pool to run the optimization algorithms on several cores."""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from cems2 import log
+from cems2.event import ThreadSafeEvent
+
+# Get the logger
+LOG = log.get_logger(__name__)
+
+# Arrays of the snapshot shared with the workers
+SHARED_ARRAYS = (
+    "utilization",
+    "vm_ptr",
+    "vm_host",
+    "vm_vcpus",
+    "vm_memory",
+    "vm_disk",
+    "vcpus",
+    "memory",
+    "disk",
+)
+
+
+class SnapshotArrays(object):
+    """Read-only view of the arrays of a snapshot in a worker.
+
+    It has the hostnames and the NumPy arrays of a FleetSnapshot (but not its
+    VMs), so the algorithms that only work with the arrays accept both.
+    """
+
+    def __init__(self, hostnames, timestamp, arrays):
+        """Initialize the view.
+
+        :param hostnames: Hostnames of the machines
+        :type hostnames: tuple[str]
+        :param timestamp: Timestamp of the snapshot
+        :type timestamp: datetime
+        :param arrays: The arrays (key: name, value: array)
+        :type arrays: dict
+        """
+        self.hostnames = hostnames
+        self.host_index = {hostname: i for i, hostname in enumerate(hostnames)}
+        self.timestamp = timestamp
+        for name, array in arrays.items():
+            array.flags.writeable = False
+            setattr(self, name, array)
+
+    def __len__(self):
+        """Get the number of machines of the snapshot."""
+        return len(self.hostnames)
+
+
+class SharedSnapshot(object):
+    """Arrays of a snapshot copied to a single block of shared memory."""
+
+    def __init__(self, snapshot):
+        """Copy the arrays of the snapshot to a new block of shared memory.
+
+        :param snapshot: The snapshot
+        :type snapshot: FleetSnapshot
+        """
+        arrays = [(name, getattr(snapshot, name)) for name in SHARED_ARRAYS]
+
+        # Layout of the block: (name, dtype, shape, offset) of each array
+        self.layout = []
+        size = 0
+        for name, array in arrays:
+            self.layout.append((name, array.dtype.str, array.shape, size))
+            # Keep each array aligned to 8 bytes
+            size += -(-array.nbytes // 8) * 8
+
+        self._shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        for (name, array), (_, dtype, shape, offset) in zip(arrays, self.layout):
+            view = np.ndarray(shape, dtype=dtype, buffer=self._shm.buf, offset=offset)
+            view[...] = array
+        del view
+
+        # Picklable reference to the block sent to the workers
+        self.handle = (
+            self._shm.name,
+            snapshot.hostnames,
+            snapshot.timestamp,
+            tuple(self.layout),
+        )
+
+        # Number of algorithms running on the snapshot
+        self.users = 0
+
+    def release(self):
+        """Free the block of shared memory."""
+        self._shm.close()
+        self._shm.unlink()
+
+
+def _run_on_shared_snapshot(function, handle, args):
+    """Run an algorithm in a worker on a snapshot in shared memory.
+
+    :param function: The algorithm (function(snapshot, *args))
+    :type function: callable
+    :param handle: Reference to the shared snapshot
+    :type handle: tuple
+    :param args: Arguments of the algorithm
+    :type args: tuple
+
+    :return: The result of the algorithm
+    """
+    name, hostnames, timestamp, layout = handle
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        arrays = {
+            array_name: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+            for array_name, dtype, shape, offset in layout
+        }
+        snapshot = SnapshotArrays(hostnames, timestamp, arrays)
+        try:
+            return function(snapshot, *args)
+        finally:
+            # Release the views of the block before closing it
+            del snapshot, arrays
+    finally:
+        try:
+            shm.close()
+        except BufferError as e:
+            # A view is still referenced (e.g. by the traceback of an error of
+            # the algorithm), the block is unmapped when it is released
+            LOG.debug("Shared snapshot %s still in use when closing it: %s", name, e)
+
+
+class OptimizationExecutor(object):
+    """Run the CPU-heavy work of the optimizations in a pool of processes.
+
+    The optimizations run as trio tasks of the same thread, so their
+    algorithms would run one after the other and block the event loop. The
+    algorithms submitted here run in worker processes instead, and the
+    arrays of the snapshot are passed through shared memory (copied once per
+    snapshot, whatever the number of algorithms running on it).
+
+    With 0 workers, the algorithms run directly in the event loop.
+
+    A running algorithm can not be interrupted: if its task is cancelled
+    (e.g. the manager is stopped), the algorithm is only cancelled if it has
+    not started yet, if not it runs to completion in its worker (holding it)
+    and its result is discarded. The algorithms must be bounded in time.
+    """
+
+    def __init__(self, workers):
+        """Initialize the executor (the workers are started on first use).
+
+        :param workers: Number of worker processes
+        :type workers: int
+        """
+        self.workers = workers
+        self._pool = None
+
+        # Snapshots in shared memory (key: id of the snapshot)
+        self._shared = {}
+
+    def _get_pool(self):
+        """Get the pool of processes (starting it if needed).
+
+        :return: The pool
+        :rtype: ProcessPoolExecutor
+        """
+        if self._pool is None:
+            LOG.debug("Starting %s optimization workers", self.workers)
+            # Spawn the workers (forking a process with threads is not safe)
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._pool
+
+    async def run(self, function, snapshot, *args):
+        """Run an algorithm on a snapshot.
+
+        The algorithm gets the snapshot as a SnapshotArrays (only the hostnames
+        and the arrays are available), so it must be a module-level function
+        and its arguments and result must be picklable. The result must not
+        be a view of the arrays of the snapshot.
+
+        :param function: The algorithm (function(snapshot, *args))
+        :type function: callable
+        :param snapshot: The snapshot
+        :type snapshot: FleetSnapshot
+
+        :return: The result of the algorithm
+        """
+        if self.workers == 0:
+            return function(snapshot, *args)
+
+        shared = self._share(snapshot)
+        try:
+            future = self._get_pool().submit(
+                _run_on_shared_snapshot, function, shared.handle, args
+            )
+
+            # Wake up the task when the worker finishes
+            done_event = ThreadSafeEvent()
+            future.add_done_callback(lambda _: done_event.set())
+            try:
+                await done_event.wait()
+            except BaseException:
+                # Only a pending algorithm can be cancelled (not a running one)
+                if not future.cancel():
+                    LOG.debug("Optimization algorithm %s left running", function)
+                raise
+
+            return future.result()
+        finally:
+            self._unshare(snapshot)
+
+    def _share(self, snapshot):
+        """Put a snapshot in shared memory (if it is not already there).
+
+        :param snapshot: The snapshot
+        :type snapshot: FleetSnapshot
+
+        :return: The shared snapshot
+        :rtype: SharedSnapshot
+        """
+        shared = self._shared.get(id(snapshot))
+        if shared is None:
+            shared = SharedSnapshot(snapshot)
+            self._shared[id(snapshot)] = shared
+        shared.users += 1
+        return shared
+
+    def _unshare(self, snapshot):
+        """Free the shared memory of a snapshot when no algorithm uses it.
+
+        :param snapshot: The snapshot
+        :type snapshot: FleetSnapshot
+        """
+        shared = self._shared[id(snapshot)]
+        shared.users -= 1
+        if shared.users == 0:
+            del self._shared[id(snapshot)]
+            shared.release()
+
+    def close(self):
+        """Stop the workers and free the shared memory.
+
+        The pending algorithms are cancelled and the running ones are not
+        waited for (the workers exit when they finish).
+        """
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+        for shared in self._shared.values():
+            shared.release()
+        self._shared = {}
@@ -8,8 +8,11 @@ import cems2.machines_control.vm_connector.manager as vm_connector_manager
 import cems2.machines_control.vm_optimization.manager as vm_optimization_manager
 from cems2 import config_loader, log
 from cems2.API.routes.actions import actions_controller
+from cems2.event import ThreadSafeEvent
+from cems2.machines_control.executor import OptimizationExecutor
 from cems2.schemas.machine import Machine
 from cems2.schemas.plugin import Plugin
+from cems2.schemas.power_action import DONE
 
 # Get the logger
 LOG = log.get_logger(__name__)
@@ -39,17 +42,33 @@ class Manager(object):
         self.vm_connector = None
         self.pm_connector = None
 
+        # Executor of the optimization algorithms (process pool)
+        self.executor = OptimizationExecutor(
+            CONFIG.getint("machines_control", "optimization_workers", fallback=0)
+        )
+
         # List of PMs to control
         self._pm_monitoring = None
 
         # Baseline
         self.baseline = None
 
+        # Result of the power actions of the last PM optimization applied
+        self.last_power_actions = []
+
+        # Trio token of the event loop running the manager (to call it from the API)
+        self.trio_token = None
+
         # On/off switch
         self._running = None
 
+        # Events to wake up the control tasks (set from any thread)
+        self._running_event = ThreadSafeEvent()
+        self._stopped_event = ThreadSafeEvent()
+        self._stopped_event.set()  # Not running until there are PMs to control
+
         # New metrics event trigger
-        self.new_metrics_event = False
+        self.new_metrics_event = ThreadSafeEvent()
 
     @property
     def running(self):
@@ -66,8 +85,12 @@ class Manager(object):
         self._running = value
         if value is True:
             LOG.warning("Machines Control Manager started")
+            self._stopped_event.clear()
+            self._running_event.set()
         else:
             LOG.warning("Machines Control Manager stopped")
+            self._running_event.clear()
+            self._stopped_event.set()
 
     @property
     def pm_monitoring(self):
@@ -87,6 +110,10 @@ class Manager(object):
             [machine.hostname for machine in self.pm_monitoring],
         )
 
+        # The state of the PMs in the database is known (no need to query them)
+        if self.pm_connector is not None:
+            self.pm_connector.remember_states(self.pm_monitoring)
+
         if self.pm_monitoring:
             self._set_baseline()
             self.running = True
@@ -123,7 +150,7 @@ class Manager(object):
         # Notify the pm_optimization manager of the new baseline
         self.pm_optimization.new_baseline(self.baseline)
 
-    def run(self):
+    async def run(self):
         """Run the machines_control manager.
 
         - Load the managers
@@ -132,47 +159,67 @@ class Manager(object):
         - Get the PM optimizations
         - Apply the PM optimizations
         """
-        # Load the managers
-        self._load_managers()
-
-        # Set the current state of the PMs
-        trio.run(self._get_pms_energy_status)
-
-        # Get the machines to control from the API controller
-        self.pm_monitoring = self.api_controller.machines_monitoring()
-
-        # Run the manager asynchronously (2 subtasks + 2 plugins)
-        trio.run(self._run_async)
-
-    async def _run_async(self):
-        """Run the machines_control manager asynchronously."""
-        # Create 2 tasks to run in parallel: Running control and Control tasks
-        async with trio.open_nursery() as nursery:
-            # Start the running control task
-            nursery.start_soon(self._running_control_task)
-            # Start the defaul_vm_optimization
-            nursery.start_soon(self.vm_optimization.default_vm_optimization.run, True)
-            # Start the defaul_pm_optimization
-            nursery.start_soon(self.pm_optimization.default_pm_optimization.run, True)
-            # Start the control tasks
-            nursery.start_soon(self._control_tasks)
+        # Load the managers (in a thread, the plug-ins may block on initialization)
+        await trio.to_thread.run_sync(self._load_managers)
+
+        # Share the metric history with the optimizations
+        history = self.api_controller.metric_history()
+        self.vm_optimization.new_history(history)
+        self.pm_optimization.new_history(history)
+
+        # Share the executor of the algorithms with the optimizations
+        self.vm_optimization.new_executor(self.executor)
+        self.pm_optimization.new_executor(self.executor)
+
+        # Save the trio token to bridge the API calls into this event loop (once
+        # the managers are loaded, the API calls need them)
+        self.trio_token = trio.lowlevel.current_trio_token()
+
+        try:
+            # Set the current state of the PMs
+            await self._get_pms_energy_status()
+
+            # Get the machines to control from the API controller
+            self.pm_monitoring = self.api_controller.machines_monitoring()
+
+            # Create 2 tasks to run in parallel: Running control and Control tasks
+            async with trio.open_nursery() as nursery:
+                # Start the running control task
+                nursery.start_soon(self._running_control_task)
+                # Start the defaul_vm_optimization
+                nursery.start_soon(
+                    self.vm_optimization.default_vm_optimization.run, True
+                )
+                # Start the defaul_pm_optimization
+                nursery.start_soon(
+                    self.pm_optimization.default_pm_optimization.run, True
+                )
+                # Start the control tasks
+                nursery.start_soon(self._control_tasks)
+        finally:
+            # Reject the API calls, the event loop is about to finish
+            self.trio_token = None
+
+            # Stop the workers of the optimization algorithms
+            self.executor.close()
+
+            # Close the PM connectors (e.g. their sessions with the BMCs)
+            with trio.CancelScope(shield=True):
+                await self.pm_connector.close()
 
     async def _running_control_task(self):
         """Control the running status of the manager."""
         # Run the task indefinitely
         while True:
-            # If the running status is set to False
-            if not self.running:
-                # Boot all the PMs
-                await self._boot_all()
-                LOG.debug("Manager control tasks canceled")
-
-                # Wait until the running status is set to True
-                while not self.running:
-                    await trio.sleep(1)
-            else:
-                # Wait 1 second
-                await trio.sleep(1)
+            # Wait until the running status is set to False
+            await self._stopped_event.wait()
+
+            # Boot all the PMs
+            await self._boot_all()
+            LOG.debug("Manager control tasks canceled")
+
+            # Wait until the running status is set to True
+            await self._running_event.wait()
 
     async def _control_tasks(self):
         """Run the control tasks.
@@ -187,15 +234,11 @@ class Manager(object):
         - Notify the API controller to monitor the system again
         """
         while True:
-            # If the running status is set to False
-            if not self.running:
-                # Wait until the running status is set to True
-                while not self.running:
-                    await trio.sleep(1)
+            # Wait until the running status is set to True
+            await self._running_event.wait()
 
             # Wait for new metrics event trigger
-            while not self.new_metrics_event:
-                await trio.sleep(1)
+            await self.new_metrics_event.wait()
 
             # Get the VM current distribution
             current_dist = await self.vm_optimization.get_current_distribution()
@@ -204,17 +247,19 @@ class Manager(object):
             vm_optimization = await self.vm_optimization.get_default_optimization()
 
             # Apply the VM default optimization
-            await self.vm_connector.apply_optimization(current_dist, vm_optimization)
+            targets = await self.vm_connector.apply_optimization(
+                current_dist, vm_optimization
+            )
 
-            # Notify the API controller to monitor the system again
-            self.api_controller.monitor_again()
+            # Notify the API controller to monitor the system again (the PMs
+            # that recieved VMs are polled at the minimum interval)
+            self.api_controller.monitor_again(targets)
 
             # Set the new metrics event trigger to False
-            self.new_metrics_event = False
+            self.new_metrics_event.clear()
 
             # Wait for new metrics event trigger
-            while not self.new_metrics_event:
-                await trio.sleep(1)
+            await self.new_metrics_event.wait()
 
             # Get the PM optimizations
             pm_optimization = await self.pm_optimization.get_default_optimization()
@@ -222,14 +267,23 @@ class Manager(object):
             # Convert the PM optimization from hostnames to Machine objects
             pm_optimization = self._convert_pm_optimization(pm_optimization)
 
-            # Apply the PM optimizations
-            await self.pm_connector.apply_optimization(pm_optimization)
-
-            # Notify the API controller to monitor the system again
-            self.api_controller.monitor_again()
+            # Apply the PM optimizations (and keep the result of each power action)
+            self.last_power_actions = await self.pm_connector.apply_optimization(
+                pm_optimization
+            )
+
+            # Notify the API controller to monitor the system again (the PMs
+            # powered on are polled at the minimum interval)
+            self.api_controller.monitor_again(
+                [
+                    result.hostname
+                    for result in self.last_power_actions
+                    if result.action == "on" and result.status == DONE
+                ]
+            )
 
             # Set the new metrics event trigger to False
-            self.new_metrics_event = False
+            self.new_metrics_event.clear()
 
     def _convert_pm_optimization(self, pm_optimization: dict):
         """Convert the PM optimization from hostnames to Machine objects.
@@ -256,11 +310,13 @@ class Manager(object):
 
         return pm_optimization_machines
 
-    def new_metrics(self, metrics: dict):
+    def new_metrics(self, metrics: dict, snapshot=None):
         """Get the last metrics from the monitoring controller.
 
         :param metrics: last metrics
         :type metrics: dict
+        :param snapshot: columnar snapshot of the last metrics
+        :type snapshot: FleetSnapshot
         """
         if not self.running:
             return
@@ -269,11 +325,11 @@ class Manager(object):
             return
 
         # Update the metrics on the optimization managers
-        self.vm_optimization.new_metrics(metrics)
-        self.pm_optimization.new_metrics(metrics)
+        self.vm_optimization.new_metrics(metrics, snapshot)
+        self.pm_optimization.new_metrics(metrics, snapshot)
 
         # Activate the event trigger to start the optimization sprint
-        self.new_metrics_event = True
+        self.new_metrics_event.set()
 
         LOG.critical("New metrics event activated - Resuming control tasks")
 
@@ -288,23 +344,62 @@ class Manager(object):
         # Get the list of PMs available from the API controller
         available_pms = self.api_controller.machines_available()
 
-        for machine in available_pms:
-            # Create an async task for each machine and set a timeout
-            with trio.move_on_after(self.pm_connector.timeout) as cancel_scope:
-                async with trio.open_nursery() as nursery:
-                    # Create an async task an obtain the return value
-                    nursery.start_soon(self._boot_machine, machine)
-
-            if cancel_scope.cancelled_caught:
-                LOG.error(
-                    "PM Connector plugin '%s' timed out for machine: %s",
-                    self.pm_connector.name,
-                    machine.hostname,
-                )
+        # Boot all the PMs concurrently (limited by the concurrency of each
+        # connector), within the time limit of a batch of power actions
+        booted = set()
+
+        async def boot(machine):
+            await self._run_pm_action(self._boot_machine, machine)
+            booted.add(machine.hostname)
+
+        with trio.move_on_after(self.pm_connector.batch_deadline):
+            async with trio.open_nursery() as nursery:
+                for machine in available_pms:
+                    nursery.start_soon(boot, machine)
+
+        # Log the PMs whose boot did not finish in time
+        unfinished = [
+            machine.hostname
+            for machine in available_pms
+            if machine.hostname not in booted
+        ]
+        if unfinished:
+            LOG.error(
+                "Booting all the PMs did not finish in %s seconds: %s",
+                self.pm_connector.batch_deadline,
+                unfinished,
+            )
 
         # Notify the API controller of the current state of the PMs
         self.api_controller.notify_machine_status(available_pms)
 
+    async def _run_pm_action(self, action, machine: Machine):
+        """Run an action on a PM with the timeout of the PM connector.
+
+        The timeout starts when the connector of the PM has a free slot.
+
+        :param action: Action to run (async function of the PM)
+        :type action: callable
+        :param machine: PM
+        :type machine: Machine
+
+        :return: If the action finished before the timeout
+        :rtype: bool
+        """
+        async with self.pm_connector.limit(machine):
+            with trio.move_on_after(self.pm_connector.timeout) as cancel_scope:
+                await action(machine)
+
+        if cancel_scope.cancelled_caught:
+            LOG.error(
+                "PM Connector plugin '%s' timed out for machine: %s",
+                machine.connector,
+                machine.hostname,
+            )
+            return False
+
+        return True
+
     async def _boot_machine(self, machine: Machine):
         """Boot a PM.
 
@@ -322,36 +417,20 @@ class Manager(object):
         # Get the list of PMs available from the API controller
         available_pms = self.api_controller.machines_available()
 
+        # Probe all the PMs concurrently (in batches for the connectors that can)
+        states = await self.pm_connector.get_pm_states(available_pms)
+
+        # Set the state of the PMs (off if it was not obtained)
         for machine in available_pms:
-            # Create an async task for each machine and set a timeout
-            with trio.move_on_after(self.pm_connector.timeout) as cancel_scope:
-                async with trio.open_nursery() as nursery:
-                    # Create an async task an obtain the return value
-                    nursery.start_soon(self._get_current_state, machine)
-
-            if cancel_scope.cancelled_caught:
-                LOG.error(
-                    "PM Connector plugin '%s' timed out for machine: %s",
-                    machine.connector,
-                    machine.hostname,
-                )
-                machine.energy_status = False  # Set the state to off
+            machine.energy_status = states.get(machine.hostname, False)
 
         # Notify the API controller of the current state of the PMs
         self.api_controller.notify_machine_status(available_pms)
 
-    async def _get_current_state(self, machine: Machine):
-        """Get the current state of the PM.
-
-        :param machine: PM
-        :type machine: Machine
-
-        :return: current state of the PM (on/off)
-        :rtype: bool
-        """
-        LOG.debug("Getting the current state of the PM: %s", machine.hostname)
-        # Get the state from the pm_connector
-        machine.energy_status = await self.pm_connector.get_pm_state(machine)
+        # Keep the states obtained (forgotten when they changed in the database)
+        self.pm_connector.remember_states(
+            [machine for machine in available_pms if machine.hostname in states]
+        )
 
     def notify_machine_status(self, machine: Machine):
         """Notify the API controller of the current state of a PM.
@@ -361,6 +440,18 @@ class Manager(object):
         """
         self.api_controller.notify_machine_status([machine])
 
+        # Keep the confirmed state (forgotten when it changed in the database)
+        self.pm_connector.remember_states([machine])
+
+    def forget_power_state(self, m_ip: str):
+        """Forget the cached power state of a PM changed in the database.
+
+        :param m_ip: The management IP of the PM
+        :type m_ip: str
+        """
+        if self.pm_connector is not None:
+            self.pm_connector.forget_state(m_ip)
+
     def get_plugins(self):
         """Obtain the installed plugins.
 
@@ -441,9 +532,15 @@ class Manager(object):
 
         :return: list of VM optimizations
         :rtype:  dict[str, dict]
+
+        :raises RuntimeError: If the manager is not running
         """
-        # Launch the VM optimizations and get the results
-        optimizations = trio.run(self.vm_optimization.get_vm_optimizations, name)
+        self._check_event_loop()
+
+        # Launch the VM optimizations in the manager event loop and get the results
+        optimizations = trio.from_thread.run(
+            self.vm_optimization.get_vm_optimizations, name, trio_token=self.trio_token
+        )
         return optimizations
 
     def get_pm_optimizations(self, name: str):
@@ -454,7 +551,21 @@ class Manager(object):
 
         :return: list of PM optimizations
         :rtype: dict[str, dict]
+
+        :raises RuntimeError: If the manager is not running
         """
-        # Launch the PM optimizations and get the results
-        optimizations = trio.run(self.pm_optimization.get_pm_optimizations, name)
+        self._check_event_loop()
+
+        # Launch the PM optimizations in the manager event loop and get the results
+        optimizations = trio.from_thread.run(
+            self.pm_optimization.get_pm_optimizations, name, trio_token=self.trio_token
+        )
         return optimizations
+
+    def _check_event_loop(self):
+        """Check that the event loop of the manager is running.
+
+        :raises RuntimeError: If the manager is not running
+        """
+        if self.trio_token is None:
+            raise RuntimeError("The machines control manager is not running.")
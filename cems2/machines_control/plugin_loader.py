@@ -1,6 +1,6 @@
 """Module to load the plug-ins into the Machines Control Application."""
 
-import stevedore
+from cems2 import plugin_registry
 
 VM_OPTIMIZATION_NAMESPACE = "cems2.machines_control.vm_optimization"
 PM_OPTIMIZATION_NAMESPACE = "cems2.machines_control.pm_optimization"
@@ -17,8 +17,7 @@ def _get_names(namespace):
     :return: The names of the plug-ins in the specified namespace
     :rtype: frozenset
     """
-    mgr = stevedore.ExtensionManager(namespace=namespace)
-    return frozenset(mgr.names())
+    return plugin_registry.get_names(namespace)
 
 
 def _get_extensions(namespace):
@@ -30,8 +29,18 @@ def _get_extensions(namespace):
     :return: The extensions of the plug-ins in the specified namespace
     :rtype: dict
     """
-    mgr = stevedore.ExtensionManager(namespace=namespace, propagate_map_exceptions=True)
-    return dict(mgr.map(lambda ext: (ext.entry_point.name, ext.plugin)))
+    return plugin_registry.get_extensions(namespace)
+
+
+def refresh():
+    """Scan again the plug-ins installed in the namespaces of this module."""
+    for namespace in (
+        VM_OPTIMIZATION_NAMESPACE,
+        PM_OPTIMIZATION_NAMESPACE,
+        VM_CONNECTOR_NAMESPACE,
+        PM_CONNECTOR_NAMESPACE,
+    ):
+        plugin_registry.refresh(namespace)
 
 
 def get_vm_optimizations_names():
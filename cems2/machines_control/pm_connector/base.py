@@ -6,10 +6,16 @@ from abc import ABCMeta, abstractmethod
 class PMConnectorBase(metaclass=ABCMeta):
     """Allows to connect to the PMs."""
 
+    # If the connector queries several machines at once in get_power_states
+    supports_batch = False
+
     @abstractmethod
     def __init__(self):
         """Initialize the connection to the PMs."""
 
+    async def close(self):
+        """Close the resources opened by the connector (optional)."""
+
     @abstractmethod
     async def power_on(self, m_ip, m_username, m_password, brand_name):
         """Power on the machine.
@@ -63,3 +69,27 @@ class PMConnectorBase(metaclass=ABCMeta):
         :return: The power state of the machine
         :rtype: bool
         """
+
+    async def get_power_states(self, machines):
+        """Get the power state of several machines in a single request.
+
+        The PM connector manager calls this method instead of get_power_state
+        for each machine when supports_batch is True (e.g. for the controllers
+        that report the state of a whole rack or chassis). By default, the
+        machines are queried one after the other with get_power_state.
+
+        :param machines: The machines (with their management IP and credentials)
+        :type machines: list[Machine]
+
+        :return: The power state of each machine obtained
+        :rtype: dict{key: management IP, value: bool}
+        """
+        return {
+            machine.management_ip: await self.get_power_state(
+                machine.management_ip,
+                machine.management_username,
+                machine.management_password,
+                machine.brand_model,
+            )
+            for machine in machines
+        }
@@ -1,10 +1,20 @@
 """PM Connector Manager module."""
 
+from contextlib import asynccontextmanager
+
 import trio
 
 from cems2 import config_loader, log
 from cems2.machines_control import plugin_loader
+from cems2.machines_control.pm_connector.state_cache import PowerStateCache
 from cems2.schemas.machine import Machine
+from cems2.schemas.power_action import (
+    DONE,
+    FAILED,
+    SKIPPED,
+    TIMEOUT,
+    PowerActionResult,
+)
 
 # Get the logger
 LOG = log.get_logger(__name__)
@@ -16,6 +26,36 @@ ON = True
 OFF = False
 
 
+class _PowerAction(object):
+    """Power action in progress on a PM."""
+
+    def __init__(self, pm, state, result):
+        """Initialize the power action (to be sent now).
+
+        :param pm: PM to turn on/off
+        :type pm: Machine
+        :param state: State requested for the PM (on/off)
+        :type state: bool
+        :param result: Result of the power action of the PM
+        :type result: PowerActionResult
+        """
+        self.pm = pm
+        self.state = state
+        self.result = result
+
+        # Time when the power action was first sent
+        self.start = None
+
+        # Time to send the power action (None while it is not to be sent)
+        self.next_send = trio.current_time()
+
+        # Time limit to reach the state (None while it is not waiting for it)
+        self.deadline = None
+
+        # If the power action is finished (done or out of retries)
+        self.finished = False
+
+
 class Manager(object):
     """Manager for the PM Connectors."""
 
@@ -52,33 +92,284 @@ class Manager(object):
         # Set the PM connector plugin timeout
         self.timeout = CONFIG.getint("machines_control", "pm_connector_timeout")
 
+        # Set the retries of the power actions and the delay before the first one
+        self.retries = CONFIG.getint(
+            "machines_control", "pm_connector_retries", fallback=2
+        )
+        self.retry_delay = CONFIG.getfloat(
+            "machines_control", "pm_connector_retry_delay", fallback=5
+        )
+
+        # Set the time a PM has to reach its state after a power action and the
+        # interval to poll its state meanwhile
+        self.action_deadline = CONFIG.getfloat(
+            "machines_control", "pm_action_deadline", fallback=300
+        )
+        self.poll_interval = CONFIG.getfloat(
+            "machines_control", "pm_state_poll_interval", fallback=10
+        )
+
+        # Set the time limit of a batch of power actions (e.g. a PM optimization),
+        # so the PMs that do not answer do not block the control loop
+        self.batch_deadline = CONFIG.getfloat(
+            "machines_control", "pm_batch_deadline", fallback=600
+        )
+
+        # Set the cache of the power states (skips the queries of states just known)
+        self.state_cache = PowerStateCache(
+            CONFIG.getfloat("machines_control", "pm_state_ttl", fallback=60)
+        )
+
+        # Set the limiters of concurrent calls to each PM connector
+        default_concurrency = CONFIG.getint(
+            "machines_control", "pm_connector_concurrency", fallback=20
+        )
+        self.connector_limiters = {}
+        for pm_connector_name, _ in self.pm_connectors:
+            max_concurrency = CONFIG.getint(
+                "machines_control.pm_connector_concurrency",
+                pm_connector_name,
+                fallback=default_concurrency,
+            )
+            self.connector_limiters[pm_connector_name] = trio.CapacityLimiter(
+                max_concurrency
+            )
+            LOG.debug(
+                "Max concurrency of the PM connector '%s' set to %s",
+                pm_connector_name,
+                max_concurrency,
+            )
+
+    async def close(self):
+        """Close the shared resources of all the PM connectors."""
+        for pm_connector_name, pm_connector in self.pm_connectors:
+            LOG.debug("Closing the PM connector '%s'", pm_connector_name)
+            try:
+                await pm_connector.close()
+            except Exception as e:
+                LOG.error(
+                    "Error closing the PM connector '%s': %s", pm_connector_name, e
+                )
+
     async def apply_optimization(self, optimization: dict):
         """Apply the PM optimization.
 
+        The power actions are sent concurrently, each one with the timeout of
+        its connector (so a slow PM does not cancel the actions of the rest).
+        Then the states of the PMs are polled together (grouped by connector)
+        until each PM reaches its state or its own deadline passes (a PM takes
+        a while to boot or to shut down). The power action is only sent again
+        to the PMs whose deadline passed without reaching their state, or
+        whose connector failed. The whole batch has its own deadline: the
+        power actions not finished by then are given up (timed out).
+
         :param optimization: The PM optimization to apply
         :type optimization: dict
+
+        :return: The result of the power action of each PM
+        :rtype: list[PowerActionResult]
         """
-        # Create an async task for each PM to turn on/off
-        # Use a timeout for each task
-        with trio.move_on_after(self.timeout) as cancel_scope:
-            async with trio.open_nursery() as nursery:
-                for pm in optimization["on"]:
-                    nursery.start_soon(self.turn_on, pm)
-                for pm in optimization["off"]:
-                    nursery.start_soon(self.turn_off, pm)
+        actions = [(pm, ON) for pm in optimization["on"]]
+        actions.extend((pm, OFF) for pm in optimization["off"])
+
+        # Result of each power action (skipped if the PM is already in the state)
+        results = {
+            pm.hostname: PowerActionResult(
+                hostname=pm.hostname,
+                connector=pm.connector,
+                action="on" if state == ON else "off",
+                status=SKIPPED,
+                attempts=0,
+                duration=0.0,
+            )
+            for pm, state in actions
+        }
+        pending = [
+            _PowerAction(pm, state, results[pm.hostname])
+            for pm, state in actions
+            if pm.energy_status != state
+        ]
+
+        with trio.move_on_after(self.batch_deadline):
+            while pending:
+                # Send the power actions due (the first ones and the retries)
+                now = trio.current_time()
+                async with trio.open_nursery() as nursery:
+                    for action in pending:
+                        if action.next_send is not None and action.next_send <= now:
+                            nursery.start_soon(self._send_power_action, action)
+
+                # Check the state of the PMs waiting for it
+                waiting = [action for action in pending if action.deadline is not None]
+                if waiting:
+                    await self._check_power_actions(waiting)
+
+                # Time since each power action was first sent until it finished
+                for action in pending:
+                    if action.finished:
+                        action.result.duration = trio.current_time() - action.start
+                pending = [action for action in pending if not action.finished]
+
+                # Wait until the next poll or the next power action to send
+                if pending:
+                    await trio.sleep(self._time_to_next(pending))
+
+        # Give up the power actions not finished before the deadline of the batch
+        for action in pending:
+            if action.finished:
+                continue
+            result = action.result
+            result.status = TIMEOUT
+            result.error = (
+                f"The PM optimization did not finish in {self.batch_deadline} seconds"
+            )
+            if action.start is not None:
+                result.duration = trio.current_time() - action.start
+
+        for result in results.values():
+            if result.status not in (DONE, SKIPPED):
+                LOG.error(
+                    "Failed to turn %s %s using connector %s: %s",
+                    result.action,
+                    result.hostname,
+                    result.connector,
+                    result.error,
+                )
+
+        # Log the summary of the power actions
+        summary = {}
+        for result in results.values():
+            summary[result.status] = summary.get(result.status, 0) + 1
+        LOG.info("PM optimization applied: %s", summary)
+
+        return list(results.values())
+
+    async def _send_power_action(self, action: _PowerAction):
+        """Send the power action to a PM (without checking its state).
+
+        :param action: The power action
+        :type action: _PowerAction
+        """
+        pm, result = action.pm, action.result
+        pm_connector_plugin = self._get_pm_connector(pm)
+        if action.state == ON:
+            power_action = pm_connector_plugin.power_on
+        else:
+            power_action = pm_connector_plugin.power_off
+        result.attempts += 1
+        action.next_send = None
+        if action.start is None:
+            action.start = trio.current_time()
+
+        # The state of the PM is not known until it is checked
+        self.state_cache.invalidate(pm.management_ip)
+
+        try:
+            # Wait for a free slot before starting the timeout of the PM
+            async with self.limit(pm):
+                with trio.move_on_after(self.timeout) as cancel_scope:
+                    LOG.warning("Turning %s %s", result.action, pm.hostname)
+                    await power_action(
+                        pm.management_ip,
+                        pm.management_username,
+                        pm.management_password,
+                        pm.brand_model,
+                    )
+        except Exception as e:
+            result.status, result.error = FAILED, str(e)
+            LOG.error(
+                "PM connector '%s' failed for machine %s: %s",
+                pm.connector,
+                pm.hostname,
+                e,
+            )
+            self._retry_power_action(action)
+            return
 
         if cancel_scope.cancelled_caught:
+            result.status = TIMEOUT
+            result.error = f"Timed out after {self.timeout} seconds"
             LOG.error(
                 "PM connector timeout for machine %s using connector %s.",
                 pm.hostname,
                 pm.connector,
             )
+            self._retry_power_action(action)
+            return
+
+        # Wait for the PM to reach the state
+        action.deadline = trio.current_time() + self.action_deadline
+
+    async def _check_power_actions(self, actions: list):
+        """Check if the PMs reached the state of their power action.
+
+        :param actions: The power actions waiting for the state of their PM
+        :type actions: list[_PowerAction]
+        """
+        # The PMs are changing their state, so they are queried (not cached)
+        states = await self.get_pm_states(
+            [action.pm for action in actions], use_cache=False
+        )
+
+        now = trio.current_time()
+        for action in actions:
+            pm, result = action.pm, action.result
+            if states.get(pm.hostname) == action.state:
+                result.status, result.error = DONE, None
+                action.deadline = None
+                action.finished = True
+                # Update the machine status and notify the controller
+                pm.energy_status = action.state
+                self.machines_control_manager.notify_machine_status(pm)
+            elif now >= action.deadline:
+                result.status = FAILED
+                result.error = (
+                    f"The machine did not reach the state in {self.action_deadline}"
+                    " seconds"
+                )
+                action.deadline = None
+                self._retry_power_action(action)
+
+    def _retry_power_action(self, action: _PowerAction):
+        """Schedule the power action again (doubling the delay each time).
+
+        If there are no retries left, the power action is finished.
+
+        :param action: The power action that failed
+        :type action: _PowerAction
+        """
+        attempts = action.result.attempts
+        if attempts > self.retries:
+            action.finished = True
+            return
+        action.next_send = trio.current_time() + self.retry_delay * 2 ** (attempts - 1)
+
+    def _time_to_next(self, actions: list):
+        """Get the time until the next poll or power action to send.
+
+        :param actions: The power actions in progress
+        :type actions: list[_PowerAction]
+
+        :return: Seconds to wait
+        :rtype: float
+        """
+        now = trio.current_time()
+        times = []
+        for action in actions:
+            if action.next_send is not None:
+                times.append(action.next_send - now)
+            if action.deadline is not None:
+                times.append(min(self.poll_interval, action.deadline - now))
+        return max(min(times), 0)
 
     async def turn_on(self, pm: Machine):
         """Turn on a PM.
 
         :param pm: PM to turn on
         :type pm: Machine
+
+        :return: If the PM is on
+        :rtype: bool
         """
         # Get the connector of the PM
         pm_connector_plugin = self._get_pm_connector(pm)
@@ -86,10 +377,11 @@ class Manager(object):
         # Check if the machine is already on
         if pm.energy_status == ON:
             LOG.debug("%s is already on", pm.hostname)
-            return
+            return True
 
-        # Turn on the machine
+        # Turn on the machine (its state is not known until it is checked)
         LOG.warning("Turning on %s", pm.hostname)
+        self.state_cache.invalidate(pm.management_ip)
         await pm_connector_plugin.power_on(
             pm.management_ip,
             pm.management_username,
@@ -106,18 +398,23 @@ class Manager(object):
             # Update the machine status
             pm.energy_status = ON
             self.machines_control_manager.notify_machine_status(pm)
-        else:
-            LOG.error(
-                "Failed to turn on %s using connector %s",
-                pm.hostname,
-                pm.connector,
-            )
+            return True
+
+        LOG.error(
+            "Failed to turn on %s using connector %s",
+            pm.hostname,
+            pm.connector,
+        )
+        return False
 
     async def turn_off(self, pm: Machine):
         """Turn off a PM.
 
         :param pm: PM to turn off
         :type pm: Machine
+
+        :return: If the PM is off
+        :rtype: bool
         """
         # Get the connector of the PM
         pm_connector_plugin = self._get_pm_connector(pm)
@@ -125,10 +422,11 @@ class Manager(object):
         # Check if the machine is already off
         if pm.energy_status == OFF:
             LOG.debug("%s is already off", pm.hostname)
-            return
+            return True
 
-        # Turn off the machine
+        # Turn off the machine (its state is not known until it is checked)
         LOG.warning("Turning off %s", pm.hostname)
+        self.state_cache.invalidate(pm.management_ip)
         await pm_connector_plugin.power_off(
             pm.management_ip,
             pm.management_username,
@@ -145,22 +443,139 @@ class Manager(object):
             # Update the machine status
             pm.energy_status = OFF
             self.machines_control_manager.notify_machine_status(pm)
-        else:
+            return True
+
+        LOG.error(
+            "Failed to turn off %s using connector %s",
+            pm.hostname,
+            pm.connector,
+        )
+        return False
+
+    async def get_pm_states(self, pms: list, use_cache=True):
+        """Get the state of several PMs.
+
+        The PMs are grouped by connector: the connectors that support
+        get_power_states are queried once for each group, the rest once for
+        each PM (each query with the timeout of the connector). The states in
+        the cache are not queried (unless use_cache is False).
+
+        :param pms: PMs to get the state of
+        :type pms: list[Machine]
+        :param use_cache: If the states in the cache are used
+        :type use_cache: bool
+
+        :return: The state of each PM obtained (key: hostname, value: state)
+        :rtype: dict
+        """
+        states = {}
+
+        # Group the PMs by connector (except the ones with a known state)
+        groups = {}
+        for pm in pms:
+            state = self.state_cache.get(pm.management_ip) if use_cache else None
+            if state is not None:
+                states[pm.hostname] = state
+            else:
+                groups.setdefault(pm.connector, []).append(pm)
+
+        async with trio.open_nursery() as nursery:
+            for group in groups.values():
+                if self._get_pm_connector(group[0]).supports_batch:
+                    nursery.start_soon(self._get_pm_states_batch, group, states)
+                else:
+                    for pm in group:
+                        nursery.start_soon(
+                            self._get_pm_state_with_timeout, pm, states, use_cache
+                        )
+
+        return states
+
+    async def _get_pm_states_batch(self, pms: list, states: dict):
+        """Get the state of a group of PMs of the same connector in one query.
+
+        :param pms: PMs to get the state of
+        :type pms: list[Machine]
+        :param states: Dict to store the state of each PM
+        :type states: dict
+        """
+        pm_connector_plugin = self._get_pm_connector(pms[0])
+
+        try:
+            async with self.limit(pms[0]):
+                with trio.move_on_after(self.timeout) as cancel_scope:
+                    power_states = await pm_connector_plugin.get_power_states(pms)
+        except Exception as e:
+            LOG.error(
+                "PM connector '%s' failed for %s machines: %s",
+                pms[0].connector,
+                len(pms),
+                e,
+            )
+            return
+
+        if cancel_scope.cancelled_caught:
+            LOG.error(
+                "PM connector '%s' timed out for %s machines",
+                pms[0].connector,
+                len(pms),
+            )
+            return
+
+        for pm in pms:
+            if pm.management_ip in power_states:
+                states[pm.hostname] = power_states[pm.management_ip]
+                self.state_cache.set(pm.management_ip, states[pm.hostname])
+
+    async def _get_pm_state_with_timeout(
+        self, pm: Machine, states: dict, use_cache=True
+    ):
+        """Get the state of a PM with the timeout of its connector.
+
+        :param pm: PM to get the state of
+        :type pm: Machine
+        :param states: Dict to store the state of each PM
+        :type states: dict
+        :param use_cache: If the state in the cache is used
+        :type use_cache: bool
+        """
+        try:
+            async with self.limit(pm):
+                with trio.move_on_after(self.timeout) as cancel_scope:
+                    states[pm.hostname] = await self.get_pm_state(pm, use_cache)
+        except Exception as e:
             LOG.error(
-                "Failed to turn off %s using connector %s",
+                "PM connector '%s' failed for machine %s: %s",
+                pm.connector,
                 pm.hostname,
+                e,
+            )
+            return
+
+        if cancel_scope.cancelled_caught:
+            LOG.error(
+                "PM Connector plugin '%s' timed out for machine: %s",
                 pm.connector,
+                pm.hostname,
             )
 
-    async def get_pm_state(self, pm: Machine):
-        """Get the state of a PM.
+    async def get_pm_state(self, pm: Machine, use_cache=True):
+        """Get the state of a PM (from the cache if it is known).
 
         :param pm: PM to get the state of
         :type pm: Machine
+        :param use_cache: If the state in the cache is used
+        :type use_cache: bool
 
         :return: The state of the PM
         :rtype: bool
         """
+        # Check if the state of the machine is known
+        status = self.state_cache.get(pm.management_ip) if use_cache else None
+        if status is not None:
+            LOG.debug("Power state of %s obtained from the cache", pm.hostname)
+            return status
+
         # Get the connector of the PM
         pm_connector_plugin = self._get_pm_connector(pm)
 
@@ -171,10 +586,44 @@ class Manager(object):
             pm.management_password,
             pm.brand_model,
         )
+        self.state_cache.set(pm.management_ip, status)
 
         # Return the state
         return status
 
+    def remember_states(self, pms: list):
+        """Keep in the cache the known state of several PMs.
+
+        The state of the PMs stored in the database (or just confirmed) is
+        used instead of querying them again until it expires.
+
+        :param pms: PMs with their known state (energy_status)
+        :type pms: list[Machine]
+        """
+        for pm in pms:
+            self.state_cache.set(pm.management_ip, pm.energy_status)
+
+    def forget_state(self, m_ip: str):
+        """Forget the cached state of a PM (e.g. changed in the database).
+
+        :param m_ip: The management IP of the PM
+        :type m_ip: str
+        """
+        self.state_cache.invalidate(m_ip)
+
+    @asynccontextmanager
+    async def limit(self, pm: Machine):
+        """Hold a slot of the limiter of the connector of a PM.
+
+        :param pm: PM to connect to
+        :type pm: Machine
+        """
+        # Check that the connector of the PM is loaded
+        self._get_pm_connector(pm)
+
+        async with self.connector_limiters[pm.connector]:
+            yield
+
     def _get_pm_connector(self, pm: Machine):
         """Get the connector of a PM.
 
@@ -1,25 +1,124 @@
 """IPMI Connector plug-in."""
 
+import time
+
 import pyipmi
+import pyipmi.interfaces
+import trio
 
-from cems2 import log
+from cems2 import config_loader, log
 from cems2.machines_control.pm_connector.base import PMConnectorBase
 
 # Get the logger
 LOG = log.get_logger(__name__)
 
+# Get the configuration
+CONFIG = config_loader.get_config()
+
 # Power states
 ON = True
 OFF = False
 
 
+class _Session(object):
+    """Authenticated RMCP session with the BMC of a machine."""
+
+    def __init__(self, host, port, username, password, privilege, timeout):
+        """Open the session (blocking).
+
+        :param host: The IP address of the BMC
+        :type host: str
+        :param port: The RMCP port of the BMC
+        :type port: int
+        :param username: The username to connect to the BMC
+        :type username: str
+        :param password: The password to connect to the BMC
+        :type password: str
+        :param privilege: The privilege level of the session
+        :type privilege: str
+        :param timeout: The timeout of each request (seconds)
+        :type timeout: float
+        """
+        # No keep-alive thread for each session, the idle sessions expire instead
+        interface = pyipmi.interfaces.create_interface(
+            "rmcp", slave_address=0x81, host_target_address=0x20, keep_alive_interval=0
+        )
+        interface.set_timeout(timeout)
+
+        self.ipmi = pyipmi.create_connection(interface)
+        self.ipmi.session.set_session_type_rmcp(host, port)
+        self.ipmi.session.set_auth_type_user(username, password)
+        self.ipmi.session.set_priv_level(privilege)
+        self.ipmi.target = pyipmi.Target(ipmb_address=0x20)
+        self.ipmi.session.establish()
+
+        self.password = password
+        self.last_used = time.monotonic()
+
+    def is_valid(self, password, ttl):
+        """Check if the session can be reused.
+
+        :param password: The current password of the BMC
+        :type password: str
+        :param ttl: Seconds that an idle session is kept
+        :type ttl: float
+
+        :return: If the session can be reused
+        :rtype: bool
+        """
+        return self.password == password and time.monotonic() - self.last_used < ttl
+
+    def close(self):
+        """Close the session (blocking, errors are ignored)."""
+        try:
+            self.ipmi.session.close()
+        except Exception as e:
+            LOG.debug("Error closing the IPMI session: %s", e)
+
+
 class IPMI(PMConnectorBase):
-    """Allows to connect to the IPMI interface of the PMs."""
+    """Allows to connect to the IPMI interface of the PMs.
+
+    The RMCP+ calls of python-ipmi are blocking, so they run in a bounded
+    pool of threads. The authenticated sessions are kept for each BMC and
+    reused by the next calls (e.g. the check of the state after a power
+    action) until they are idle for session_ttl seconds. The calls to the
+    same BMC are serialized, since a session is not shared between threads.
+
+    It can be tested against an IPMI simulator (e.g. ipmi_sim of OpenIPMI)
+    listening on localhost setting its port in the configuration.
+    """
 
     def __init__(self):
         """Initialize the connection to the IPMI interface of the PMs."""
+        # RMCP port of the BMCs and timeout of each request
+        self.port = CONFIG.getint("plugins.IPMI", "port", fallback=623)
+        self.timeout = CONFIG.getfloat("plugins.IPMI", "timeout", fallback=2.0)
+
+        # Privilege level of the sessions
+        self.privilege = CONFIG.get(
+            "plugins.IPMI", "privilege", fallback="administrator"
+        )
 
-    def power_on(self, m_ip, m_username, m_password, brand_name):
+        # Seconds that an idle session is kept
+        self.session_ttl = CONFIG.getfloat("plugins.IPMI", "session_ttl", fallback=30)
+
+        # Power off with an ACPI soft shutdown (or a hard power down)
+        self.soft_shutdown = CONFIG.getboolean(
+            "plugins.IPMI", "soft_shutdown", fallback=True
+        )
+
+        # Limiter of the threads running blocking calls
+        self.limiter = trio.CapacityLimiter(
+            CONFIG.getint("plugins.IPMI", "threads", fallback=16)
+        )
+
+        # Open sessions and locks of each BMC (key: (IP address, username)), the
+        # lock of a BMC is kept while it has an open session or calls waiting
+        self.sessions = {}
+        self.locks = {}
+
+    async def power_on(self, m_ip, m_username, m_password, brand_name):
         """Power on the machine.
 
         :param m_ip: The IP address of the machine
@@ -35,8 +134,11 @@ class IPMI(PMConnectorBase):
         :type brand_name: str
         """
         LOG.critical("Powering on: %s", m_ip)
+        await self._call(
+            m_ip, m_username, m_password, lambda ipmi: ipmi.chassis_control_power_up()
+        )
 
-    def power_off(self, m_ip, m_username, m_password, brand_name):
+    async def power_off(self, m_ip, m_username, m_password, brand_name):
         """Power off the machine.
 
         :param m_ip: The IP address of the machine
@@ -52,8 +154,22 @@ class IPMI(PMConnectorBase):
         :type brand_name: str
         """
         LOG.critical("Powering off: %s", m_ip)
+        if self.soft_shutdown:
+            await self._call(
+                m_ip,
+                m_username,
+                m_password,
+                lambda ipmi: ipmi.chassis_control_soft_shutdown(),
+            )
+        else:
+            await self._call(
+                m_ip,
+                m_username,
+                m_password,
+                lambda ipmi: ipmi.chassis_control_power_down(),
+            )
 
-    def get_power_state(self, m_ip, m_username, m_password, brand_name):
+    async def get_power_state(self, m_ip, m_username, m_password, brand_name):
         """Get the power state of the machine.
 
         :param m_ip: The IP address of the machine
@@ -72,4 +188,103 @@ class IPMI(PMConnectorBase):
         :rtype: bool
         """
         LOG.info("Getting power state of %s", m_ip)
-        return ON
+        power_on = await self._call(
+            m_ip,
+            m_username,
+            m_password,
+            lambda ipmi: ipmi.get_chassis_status().power_on,
+        )
+        return ON if power_on else OFF
+
+    async def close(self):
+        """Close the open sessions with the BMCs."""
+        sessions = list(self.sessions.values())
+        self.sessions = {}
+        self.locks = {}
+        for session in sessions:
+            await trio.to_thread.run_sync(session.close, limiter=self.limiter)
+
+    async def _call(self, m_ip, m_username, m_password, command):
+        """Run a command on the BMC of a machine in a thread.
+
+        The thread is not abandoned if the call is cancelled (so the session
+        stays consistent), the timeout of the requests bounds it.
+
+        :param m_ip: The IP address of the machine
+        :type m_ip: str
+        :param m_username: The username to connect to the machine
+        :type m_username: str
+        :param m_password: The password to connect to the machine
+        :type m_password: str
+        :param command: The command (function of the python-ipmi connection)
+        :type command: callable
+
+        :return: The result of the command
+        """
+        key = (m_ip, m_username)
+        lock = self.locks.setdefault(key, trio.Lock())
+
+        # One call at a time to each BMC
+        async with lock:
+            try:
+                return await trio.to_thread.run_sync(
+                    self._call_sync, key, m_password, command, limiter=self.limiter
+                )
+            finally:
+                # Forget the lock when the session was dropped (if no call waits)
+                if key not in self.sessions and not lock.statistics().tasks_waiting:
+                    if self.locks.get(key) is lock:
+                        del self.locks[key]
+
+    def _call_sync(self, key, password, command):
+        """Run a command on a BMC, reusing its session if possible (blocking).
+
+        :param key: The IP address and the username of the BMC
+        :type key: tuple(str, str)
+        :param password: The password to connect to the BMC
+        :type password: str
+        :param command: The command (function of the python-ipmi connection)
+        :type command: callable
+
+        :return: The result of the command
+        """
+        session = self.sessions.pop(key, None)
+
+        # Close the session if it expired (or the password changed)
+        if session is not None and not session.is_valid(password, self.session_ttl):
+            session.close()
+            session = None
+
+        # Try with the open session first (the BMC may have closed it)
+        if session is not None:
+            try:
+                return self._run_command(key, session, command)
+            except Exception as e:
+                LOG.debug("IPMI session with %s lost, opening a new one: %s", key[0], e)
+                session.close()
+
+        session = _Session(
+            key[0], self.port, key[1], password, self.privilege, self.timeout
+        )
+        try:
+            return self._run_command(key, session, command)
+        except Exception:
+            session.close()
+            raise
+
+    def _run_command(self, key, session, command):
+        """Run a command with a session and keep the session (blocking).
+
+        :param key: The IP address and the username of the BMC
+        :type key: tuple(str, str)
+        :param session: The session with the BMC
+        :type session: _Session
+        :param command: The command (function of the python-ipmi connection)
+        :type command: callable
+
+        :return: The result of the command
+        """
+        result = command(session.ipmi)
+        session.last_used = time.monotonic()
+        self.sessions[key] = session
+        return result
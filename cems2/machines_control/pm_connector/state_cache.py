@@ -0,0 +1,64 @@
+"""Cache of the power state of the PMs."""
+
+import time
+
+
+class PowerStateCache(object):
+    """Power state of the PMs obtained recently (key: management IP).
+
+    The states are kept for ttl seconds, so the PMs whose state was just
+    obtained, confirmed after a power action or is known by the database are
+    not queried again. The state of a PM must be invalidated before a power
+    action on it and when it is changed in the database.
+    """
+
+    def __init__(self, ttl):
+        """Initialize the cache.
+
+        :param ttl: Seconds that a state is kept (0 to disable the cache)
+        :type ttl: float
+        """
+        self.ttl = ttl
+        # Known states (key: management IP, value: (state, time obtained))
+        self._states = {}
+
+    def get(self, m_ip):
+        """Get the state of a PM if it is known and not expired.
+
+        :param m_ip: The management IP of the PM
+        :type m_ip: str
+
+        :return: The state of the PM (None if it is not known)
+        :rtype: bool
+        """
+        entry = self._states.get(m_ip)
+        if entry is None:
+            return None
+
+        state, obtained = entry
+        if time.monotonic() - obtained >= self.ttl:
+            del self._states[m_ip]
+            return None
+
+        return state
+
+    def set(self, m_ip, state):
+        """Set the state of a PM (unknown states are not kept).
+
+        :param m_ip: The management IP of the PM
+        :type m_ip: str
+        :param state: The state of the PM
+        :type state: bool
+        """
+        if state is None or self.ttl <= 0:
+            self.invalidate(m_ip)
+            return
+        self._states[m_ip] = (state, time.monotonic())
+
+    def invalidate(self, m_ip):
+        """Forget the state of a PM.
+
+        :param m_ip: The management IP of the PM
+        :type m_ip: str
+        """
+        self._states.pop(m_ip, None)
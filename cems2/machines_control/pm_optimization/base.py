@@ -30,6 +30,53 @@ class PMOptimizationBase(metaclass=ABCMeta):
         :type metrics: dict
         """
 
+    def recieve_snapshot(self, snapshot):
+        """Recieve the columnar snapshot of the metrics from the manager.
+
+        The snapshot is recieved just before the metrics it was built from.
+
+        :param snapshot: snapshot of the metrics
+        :type snapshot: FleetSnapshot
+        """
+        self.snapshot = snapshot
+
+    def recieve_history(self, history):
+        """Recieve the metric history from the manager.
+
+        The history can be queried to get the trends of the metrics with
+        history.query(hostname, metric_name, start, end, resolution).
+
+        :param history: metric history
+        :type history: MetricHistory
+        """
+        self.history = history
+
+    def recieve_executor(self, executor):
+        """Recieve the executor of the algorithms from the manager.
+
+        :param executor: executor of the algorithms
+        :type executor: OptimizationExecutor
+        """
+        self.executor = executor
+
+    async def run_algorithm(self, function, snapshot, *args):
+        """Run a CPU-heavy algorithm on the snapshot.
+
+        The algorithm runs in the process pool of the executor if there is one
+        (see OptimizationExecutor.run), otherwise in the event loop.
+
+        :param function: The algorithm (function(snapshot, *args))
+        :type function: callable
+        :param snapshot: snapshot of the metrics
+        :type snapshot: FleetSnapshot
+
+        :return: The result of the algorithm
+        """
+        executor = getattr(self, "executor", None)
+        if executor is None:
+            return function(snapshot, *args)
+        return await executor.run(function, snapshot, *args)
+
     @abstractmethod
     def recieve_baseline(self, baseline):
         """Recieve the baseline from the manager.
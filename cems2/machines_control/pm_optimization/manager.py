@@ -23,6 +23,15 @@ class Manager(object):
         # Last metrics recieved
         self.last_metrics = None
 
+        # Last snapshot of the metrics recieved
+        self.last_snapshot = None
+
+        # Metric history recieved
+        self.history = None
+
+        # Executor of the algorithms recieved
+        self.executor = None
+
         # Last baseline recieved
         self.last_baseline = None
 
@@ -65,14 +74,39 @@ class Manager(object):
             list(plugin_loader.get_pm_optimizations_names()),
         )
 
-    def new_metrics(self, new_metrics):
+    def new_history(self, history):
+        """Pass the metric history to the running PM optimizations.
+
+        :param history: metric history
+        :type history: MetricHistory
+        """
+        for pm_optimization in self.running_pm_optimizations:
+            pm_optimization.recieve_history(history)
+        self.history = history
+
+    def new_executor(self, executor):
+        """Pass the executor of the algorithms to the running PM optimizations.
+
+        :param executor: executor of the algorithms
+        :type executor: OptimizationExecutor
+        """
+        for pm_optimization in self.running_pm_optimizations:
+            pm_optimization.recieve_executor(executor)
+        self.executor = executor
+
+    def new_metrics(self, new_metrics, new_snapshot=None):
         """Pass the new metrics to the running PM optimizations.
 
         :param new_metrics: new metrics
         :type new_metrics: dict
+        :param new_snapshot: columnar snapshot of the new metrics
+        :type new_snapshot: FleetSnapshot
         """
         for pm_optimization in self.running_pm_optimizations:
+            # The snapshot first (the metrics trigger the optimization)
+            pm_optimization.recieve_snapshot(new_snapshot)
             pm_optimization.recieve_metrics(new_metrics)
+        self.last_snapshot = new_snapshot
         self.last_metrics = new_metrics
 
     def new_baseline(self, new_baseline):
@@ -167,8 +201,17 @@ class Manager(object):
 
         # Pass the last metrics available to the PM optimization
         if self.last_metrics is not None:
+            pm_optimization.recieve_snapshot(self.last_snapshot)
             pm_optimization.recieve_metrics(self.last_metrics)
 
+        # Pass the metric history to the PM optimization
+        if self.history is not None:
+            pm_optimization.recieve_history(self.history)
+
+        # Pass the executor of the algorithms to the PM optimization
+        if self.executor is not None:
+            pm_optimization.recieve_executor(self.executor)
+
         # Pass the last baseline available to the PM optimization
         if self.last_baseline is not None:
             pm_optimization.recieve_baseline(self.last_baseline)
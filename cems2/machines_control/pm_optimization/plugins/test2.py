@@ -1,12 +1,13 @@
 """PMs Optimization test 2plug-in."""
 
-import json
 import random
 
+import numpy as np
 import rich
 import trio
 
 from cems2 import log
+from cems2.event import ThreadSafeEvent
 from cems2.machines_control.pm_optimization.base import PMOptimizationBase
 
 # Get the logger
@@ -19,9 +20,15 @@ class Test2(PMOptimizationBase):
     def __init__(self):
         """Initialize the test connection."""
         self.metrics = None
+        self.snapshot = None
         self.baseline = None
         self.current_optimization = None
 
+        # Events set when the attributes above are available
+        self.metrics_event = ThreadSafeEvent()
+        self.baseline_event = ThreadSafeEvent()
+        self.optimization_event = ThreadSafeEvent()
+
     async def run(self, always):
         """Run the PMs Optimization."""
         # Run the optimization
@@ -34,6 +41,7 @@ class Test2(PMOptimizationBase):
 
             # Clear the current optimization
             self.current_optimization = None
+            self.optimization_event.clear()
 
             # Clear the current distribution
             self.current_distribution = None
@@ -49,9 +57,11 @@ class Test2(PMOptimizationBase):
 
             # Set the current optimization
             self.current_optimization = optimization
+            self.optimization_event.set()
 
             # Reset the metrics
             self.metrics = None
+            self.metrics_event.clear()
 
             # Note: The baseline is not reset, only when the manager updates it
 
@@ -64,15 +74,13 @@ class Test2(PMOptimizationBase):
         """Wait for the baseline to be recieved."""
         if self.baseline is None:
             LOG.debug("Waiting for baseline to be recieved.")
-        while self.baseline is None:
-            await trio.sleep(1)
+        await self.baseline_event.wait()
 
     async def _wait_for_metrics(self):
         """Wait for the metrics to be recieved."""
         if self.metrics is None:
             LOG.debug("Waiting for metrics to be recieved.")
-        while self.metrics is None:
-            await trio.sleep(1)
+        await self.metrics_event.wait()
 
     def _compute_algorithm(self):
         """Compute the optimization algorithm.
@@ -84,21 +92,14 @@ class Test2(PMOptimizationBase):
         :return: the distribution
         :rtype: dict
         """
-        # Initialize the optimization schema
-        distribution = {"on": [], "off": []}
-
-        # For each entry on the metric dictionary
-        for key, value in self.metrics.items():
-            # Find if there is a "utilization" metric
-            for metric in value:
-                if metric.name == "utilization":
-                    # If the utilization is greater than 0.0
-                    if float(json.loads(metric.payload)["value"]) > 0.0:
-                        # Add the PM to the "on" list
-                        distribution["on"].append(key)
-                    else:
-                        # Add the PM to the "off" list
-                        distribution["off"].append(key)
+        hostnames = self.snapshot.hostnames
+        utilization = self.snapshot.utilization
+
+        # The PMs without utilization metric (NaN) are in none of the lists
+        distribution = {
+            "on": [hostnames[i] for i in np.flatnonzero(utilization > 0.0)],
+            "off": [hostnames[i] for i in np.flatnonzero(utilization <= 0.0)],
+        }
 
         # Return the optimization
         return distribution
@@ -136,8 +137,10 @@ class Test2(PMOptimizationBase):
         LOG.debug("Metrics recieved in the optimization plugin")
         # Reset the current optimization
         self.current_optimization = None
+        self.optimization_event.clear()
         # Set the metrics
         self.metrics = metrics
+        self.metrics_event.set()
 
     def recieve_baseline(self, baseline):
         """Recieve the baseline from the manager.
@@ -148,8 +151,10 @@ class Test2(PMOptimizationBase):
         LOG.debug("Baseline recieved in optimization plugin")
         # Reset the current optimization
         self.current_optimization = None
+        self.optimization_event.clear()
         # Set the baseline
         self.baseline = baseline
+        self.baseline_event.set()
 
     async def get_optimization(self):
         """Get the optimization result.
@@ -159,8 +164,7 @@ class Test2(PMOptimizationBase):
         """
         if self.current_optimization is None:
             LOG.debug("Waiting for optimization to be calculated.")
-        while self.current_optimization is None:
-            await trio.sleep(1)
+        await self.optimization_event.wait()
 
         # Log the optimization
         LOG.debug("Obtained PM optimization.")
@@ -0,0 +1,134 @@
+"""Unit tests of the bin packing VM optimization."""
+
+import numpy as np
+import pytest
+
+from cems2.cloud_analytics.snapshot import FleetSnapshot
+from cems2.machines_control.vm_optimization.plugins import bin_packing
+from cems2.schemas.vm import VM, Amount
+
+CAPACITY = np.array([16.0, 65536.0, 1000.0])
+GRANULARITY = np.array([1.0, 512.0, 10.0])
+
+
+def _snapshot(hosts):
+    """Create a snapshot from the VMs of each host.
+
+    :param hosts: The (vCPUs, memory in MB, disk in GB) of the VMs of each host
+    :type hosts: list[list[tuple]]
+    """
+    vms = [
+        VM(
+            vcpus=vcpus,
+            memory=Amount(amount=memory, unit="MB"),
+            disk=Amount(amount=disk, unit="GB"),
+            managed_by="test",
+        )
+        for host in hosts
+        for vcpus, memory, disk in host
+    ]
+    vm_ptr = np.cumsum([0] + [len(host) for host in hosts])
+    return FleetSnapshot(
+        [f"host{i}" for i in range(len(hosts))],
+        np.zeros(len(hosts)),
+        vm_ptr,
+        [f"vm{i}" for i in range(len(vms))],
+        vms,
+    )
+
+
+def _check_capacity(snapshot, assignment):
+    """Check that no host exceeds its capacity."""
+    demand = np.column_stack((snapshot.vm_vcpus, snapshot.vm_memory, snapshot.vm_disk))
+    used = np.zeros((len(snapshot), 3))
+    np.add.at(used, assignment, demand)
+    assert (used <= CAPACITY).all()
+
+
+# Test that the identical VMs fill the hosts in order of their priority
+@pytest.mark.parametrize("algorithm", bin_packing.ALGORITHMS)
+def test_pack(algorithm):
+    """Test that the identical VMs fill the hosts in order of their priority."""
+    demand = np.tile([4.0, 1024.0, 10.0], (10, 1))
+    capacity = np.tile(CAPACITY, (4, 1))
+    assignment = bin_packing.pack(
+        demand, capacity, np.array([3, 0, 1, 2]), algorithm=algorithm
+    )
+    assert sorted(assignment.tolist()) == [1, 1, 1, 1, 2, 2, 2, 2, 3, 3]
+
+
+# Test that the VMs that do not fit anywhere are not placed
+def test_pack_unplaced():
+    """Test that the VMs that do not fit anywhere are not placed."""
+    demand = np.array([[32.0, 1024.0, 10.0], [8.0, 1024.0, 10.0]])
+    assignment = bin_packing.pack(demand, CAPACITY[None], np.zeros(1))
+    assert assignment.tolist() == [-1, 0]
+
+
+# Test that an invalid algorithm is rejected
+def test_pack_invalid_algorithm():
+    """Test that an invalid algorithm is rejected."""
+    with pytest.raises(ValueError):
+        bin_packing.pack(np.zeros((1, 3)), CAPACITY[None], np.zeros(1), algorithm="x")
+
+
+# Test that an already consolidated fleet is left as it is
+@pytest.mark.parametrize("algorithm", bin_packing.ALGORITHMS)
+def test_consolidated_fleet(algorithm):
+    """Test that an already consolidated fleet is left as it is."""
+    full = [(4, 16384, 100)] * 4
+    snapshot = _snapshot([full] * 20 + [[(2, 2048, 20)] * 3] + [[]] * 5)
+
+    assignment = bin_packing.consolidate(
+        snapshot, CAPACITY, GRANULARITY, algorithm=algorithm
+    )
+    assert (assignment != snapshot.vm_host).sum() == 0
+
+
+# Test that only the VMs of the emptied hosts are moved
+@pytest.mark.parametrize("algorithm", bin_packing.ALGORITHMS)
+def test_consolidate_empties_hosts(algorithm):
+    """Test that only the VMs of the emptied hosts are moved."""
+    half = [(4, 16384, 100)] * 2
+    snapshot = _snapshot([[(4, 16384, 100)] * 3, half, half, [(4, 16384, 100)]])
+
+    assignment = bin_packing.consolidate(
+        snapshot, CAPACITY, GRANULARITY, algorithm=algorithm
+    )
+    _check_capacity(snapshot, assignment)
+
+    # The least loaded host and one of the half-full ones are emptied
+    assert len(set(assignment.tolist())) == 2
+    assert (assignment != snapshot.vm_host).sum() == 3
+    assert (assignment[:3] == 0).all()
+
+
+# Test that only the VMs that exceed the capacity of a host are moved
+def test_consolidate_over_capacity():
+    """Test that only the VMs that exceed the capacity of a host are moved."""
+    snapshot = _snapshot(
+        [[(2, 2048, 10), (8, 8192, 10), (10, 8192, 10)], [(2, 2048, 10)]]
+    )
+
+    assignment = bin_packing.consolidate(snapshot, CAPACITY, GRANULARITY)
+    _check_capacity(snapshot, assignment)
+    assert assignment.tolist() == [0, 0, 1, 1]
+
+
+# Test that a host is not emptied if any of its VMs does not fit
+def test_consolidate_does_not_fit():
+    """Test that a host is not emptied if any of its VMs does not fit."""
+    snapshot = _snapshot([[(12, 8192, 10)], [(12, 8192, 10)]])
+
+    assignment = bin_packing.consolidate(snapshot, CAPACITY, GRANULARITY)
+    assert assignment.tolist() == [0, 1]
+
+
+# Test the distribution of the VMs from their assignment
+def test_get_distribution():
+    """Test the distribution of the VMs from their assignment."""
+    snapshot = _snapshot([[(1, 512, 10), (1, 512, 10)], [(1, 512, 10)]])
+
+    distribution = bin_packing.get_distribution(snapshot, np.array([1, 1, 1]))
+    assert distribution["host0"] == []
+    assert [list(vm) for vm in distribution["host1"]] == [["vm0"], ["vm1"], ["vm2"]]
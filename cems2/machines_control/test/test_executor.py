@@ -0,0 +1,122 @@
+"""Unit tests of the executor of the optimization algorithms."""
+
+import os
+
+import numpy as np
+import pytest
+import trio
+
+from cems2 import config_loader
+from cems2.cloud_analytics.snapshot import FleetSnapshot
+from cems2.machines_control import executor
+from cems2.machines_control.vm_optimization.plugins.bin_packing import consolidate
+from cems2.schemas.vm import VM, Amount
+
+CAPACITY = np.array([16.0, 65536.0, 1000.0])
+GRANULARITY = np.array([1.0, 512.0, 10.0])
+
+# The workers load the configuration file again (and log to the configured file)
+LOG_DIR = os.path.dirname(config_loader.get_config().get("log", "file"))
+
+
+@pytest.fixture
+def snapshot():
+    """Create a snapshot with 3 VMs on 3 hosts."""
+    vms = [
+        VM(
+            vcpus=vcpus,
+            memory=Amount(amount=2048, unit="MB"),
+            disk=Amount(amount=10, unit="GB"),
+            managed_by="test",
+        )
+        for vcpus in (8, 2, 4)
+    ]
+    return FleetSnapshot(
+        ["host0", "host1", "host2"],
+        np.array([50.0, 10.0, 20.0]),
+        np.array([0, 1, 2, 3]),
+        ["vm0", "vm1", "vm2"],
+        vms,
+    )
+
+
+# Test that the arrays of the snapshot are shared with the workers
+def test_shared_snapshot(snapshot):
+    """Test that the arrays of the snapshot are shared with the workers."""
+    shared = executor.SharedSnapshot(snapshot)
+    try:
+        result = executor._run_on_shared_snapshot(
+            consolidate, shared.handle, (CAPACITY, GRANULARITY)
+        )
+        assert result.tolist() == consolidate(snapshot, CAPACITY, GRANULARITY).tolist()
+    finally:
+        shared.release()
+
+
+# Test that the error of an algorithm is not hidden when closing the block
+def test_shared_snapshot_error(snapshot):
+    """Test that the error of an algorithm is not hidden when closing the block."""
+    shared = executor.SharedSnapshot(snapshot)
+    try:
+        with pytest.raises(ValueError, match="Algorithm"):
+            executor._run_on_shared_snapshot(
+                consolidate, shared.handle, (CAPACITY, GRANULARITY, "invalid")
+            )
+    finally:
+        shared.release()
+
+
+# Test that the algorithms run inline without workers
+def test_run_inline(snapshot):
+    """Test that the algorithms run inline without workers."""
+    optimization_executor = executor.OptimizationExecutor(0)
+    result = trio.run(
+        optimization_executor.run, consolidate, snapshot, CAPACITY, GRANULARITY
+    )
+    assert result.tolist() == [0, 0, 0]
+    assert optimization_executor._pool is None
+
+
+# Test that the algorithms run in the workers and the memory is freed
+@pytest.mark.skipif(not os.path.isdir(LOG_DIR), reason="No directory of the log file")
+def test_run_workers(snapshot):
+    """Test that the algorithms run in the workers and the memory is freed."""
+    optimization_executor = executor.OptimizationExecutor(1)
+
+    async def main():
+        results = []
+        async with trio.open_nursery() as nursery:
+            for _ in range(2):
+                nursery.start_soon(
+                    lambda: _append(
+                        results,
+                        optimization_executor.run(
+                            consolidate, snapshot, CAPACITY, GRANULARITY
+                        ),
+                    )
+                )
+        return results
+
+    try:
+        results = trio.run(main)
+        assert [result.tolist() for result in results] == [[0, 0, 0], [0, 0, 0]]
+        assert optimization_executor._shared == {}
+
+        # The error of an algorithm is raised in the caller
+        with pytest.raises(ValueError):
+            trio.run(
+                optimization_executor.run,
+                consolidate,
+                snapshot,
+                CAPACITY,
+                GRANULARITY,
+                "invalid",
+            )
+        assert optimization_executor._shared == {}
+    finally:
+        optimization_executor.close()
+
+
+async def _append(results, coroutine):
+    """Append the result of a coroutine to a list."""
+    results.append(await coroutine)
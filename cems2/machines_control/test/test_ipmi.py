@@ -0,0 +1,208 @@
+"""Unit tests of the IPMI PM connector (with a fake python-ipmi)."""
+
+from types import SimpleNamespace
+
+import pytest
+import trio
+
+from cems2.machines_control.pm_connector.plugins import IPMI
+
+
+class FakeSession(object):
+    """RMCP session of python-ipmi."""
+
+    def __init__(self):
+        """Initialize the session (not established)."""
+        self.established = False
+        self.closed = False
+
+    def set_session_type_rmcp(self, host, port):
+        """Set the host and the port of the BMC."""
+        self.host = host
+
+    def set_auth_type_user(self, username, password):
+        """Set the credentials of the BMC."""
+
+    def set_priv_level(self, privilege):
+        """Set the privilege level of the session."""
+
+    def establish(self):
+        """Establish the session."""
+        self.established = True
+
+    def close(self):
+        """Close the session."""
+        self.closed = True
+
+
+class FakeConnection(object):
+    """Connection of python-ipmi with a BMC (records the commands)."""
+
+    def __init__(self, bmc):
+        """Initialize the connection.
+
+        :param bmc: State of the fake BMC
+        :type bmc: SimpleNamespace
+        """
+        self.bmc = bmc
+        self.session = FakeSession()
+        self.commands = []
+
+    def _command(self, name):
+        """Record a command (failing if the BMC dropped the session)."""
+        if self.bmc.fail_next:
+            self.bmc.fail_next = False
+            raise OSError("Session lost")
+        self.commands.append(name)
+
+    def chassis_control_power_up(self):
+        """Power up the machine."""
+        self._command("power_up")
+        self.bmc.power_on = True
+
+    def chassis_control_power_down(self):
+        """Power down the machine."""
+        self._command("power_down")
+        self.bmc.power_on = False
+
+    def chassis_control_soft_shutdown(self):
+        """Shut down the machine (ACPI)."""
+        self._command("soft_shutdown")
+        self.bmc.power_on = False
+
+    def get_chassis_status(self):
+        """Get the status of the chassis."""
+        self._command("status")
+        return SimpleNamespace(power_on=self.bmc.power_on)
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    """Replace python-ipmi in the IPMI connector with a fake.
+
+    :return: The connections created (one for each session)
+    :rtype: list[FakeConnection]
+    """
+    bmc = SimpleNamespace(power_on=False, fail_next=False)
+    created = []
+
+    def create_connection(interface):
+        created.append(FakeConnection(bmc))
+        return created[-1]
+
+    fake_pyipmi = SimpleNamespace(
+        interfaces=SimpleNamespace(
+            create_interface=lambda *args, **kwargs: SimpleNamespace(
+                set_timeout=lambda timeout: None
+            )
+        ),
+        create_connection=create_connection,
+        Target=lambda **kwargs: None,
+    )
+    monkeypatch.setattr(IPMI, "pyipmi", fake_pyipmi)
+    return created
+
+
+def _run(connector, *calls):
+    """Run several calls to the connector on the same BMC.
+
+    :param connector: The connector
+    :type connector: IPMI.IPMI
+    :param calls: Names of the methods to call
+
+    :return: The result of each call
+    :rtype: list
+    """
+
+    async def main():
+        return [
+            await getattr(connector, call)("10.0.0.1", "admin", "secret", "test")
+            for call in calls
+        ]
+
+    return trio.run(main)
+
+
+# Test that the session with a BMC is reused by the next calls
+def test_session_reuse(connections):
+    """Test that the session with a BMC is reused by the next calls."""
+    connector = IPMI.IPMI()
+
+    states = _run(connector, "get_power_state", "power_on", "get_power_state")
+
+    assert len(connections) == 1
+    assert connections[0].session.established
+    assert not connections[0].session.closed
+    assert connections[0].commands == ["status", "power_up", "status"]
+    assert states == [IPMI.OFF, None, IPMI.ON]
+
+
+# Test that a new session is opened when the BMC drops the open one
+def test_reconnect_after_failure(connections):
+    """Test that a new session is opened when the BMC drops the open one."""
+    connector = IPMI.IPMI()
+    _run(connector, "get_power_state")
+
+    connections[0].bmc.fail_next = True
+    _run(connector, "power_on")
+
+    assert len(connections) == 2
+    assert connections[0].session.closed
+    assert connections[1].commands == ["power_up"]
+    assert connector.sessions[("10.0.0.1", "admin")].ipmi is connections[1]
+
+
+# Test that an expired session is closed and replaced
+def test_expired_session(connections):
+    """Test that an expired session is closed and replaced."""
+    connector = IPMI.IPMI()
+    connector.session_ttl = 0
+
+    _run(connector, "get_power_state", "get_power_state")
+
+    assert len(connections) == 2
+    assert connections[0].session.closed
+
+
+# Test the command used to power off the machine
+@pytest.mark.parametrize(
+    "soft_shutdown, command", [(True, "soft_shutdown"), (False, "power_down")]
+)
+def test_power_off(connections, soft_shutdown, command):
+    """Test the command used to power off the machine."""
+    connector = IPMI.IPMI()
+    connector.soft_shutdown = soft_shutdown
+
+    states = _run(connector, "power_on", "power_off", "get_power_state")
+
+    assert connections[0].commands == ["power_up", command, "status"]
+    assert states[-1] is IPMI.OFF
+
+
+# Test that the lock of a BMC is only kept while it has an open session
+def test_locks(connections):
+    """Test that the lock of a BMC is only kept while it has an open session."""
+    connector = IPMI.IPMI()
+    _run(connector, "get_power_state")
+    assert list(connector.locks) == [("10.0.0.1", "admin")]
+
+    # The session expires and the new one fails (so no session is kept)
+    connector.session_ttl = 0
+    connections[0].bmc.fail_next = True
+    with pytest.raises(OSError):
+        _run(connector, "get_power_state")
+
+    assert connector.sessions == {}
+    assert connector.locks == {}
+
+
+# Test that the open sessions are closed with the connector
+def test_close(connections):
+    """Test that the open sessions are closed with the connector."""
+    connector = IPMI.IPMI()
+    _run(connector, "get_power_state")
+    trio.run(connector.close)
+
+    assert connections[0].session.closed
+    assert connector.sessions == {}
+    assert connector.locks == {}
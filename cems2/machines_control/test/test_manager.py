@@ -0,0 +1,150 @@
+"""Unit tests of the machines control manager."""
+
+from types import SimpleNamespace
+
+import pytest
+import trio
+from trio.testing import MockClock
+
+from cems2.API.routes.actions import ActionsController
+from cems2.machines_control import pm_connector
+from cems2.machines_control.manager import Manager
+from cems2.machines_control.pm_connector.base import PMConnectorBase
+from cems2.machines_control.pm_connector.state_cache import PowerStateCache
+
+
+class SlowConnector(PMConnectorBase):
+    """PM connector that takes 10 seconds to power on a machine."""
+
+    def __init__(self, hanging=()):
+        """Initialize the connector.
+
+        :param hanging: IPs of the machines that never answer
+        :type hanging: tuple[str]
+        """
+        self.hanging = hanging
+        self.running = 0
+        self.max_running = 0
+        self.powered_on = set()
+
+    async def power_on(self, m_ip, m_username, m_password, brand_name):
+        """Power on the machine."""
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            if m_ip in self.hanging:
+                await trio.sleep_forever()
+            await trio.sleep(10)
+            self.powered_on.add(m_ip)
+        finally:
+            self.running -= 1
+
+    async def power_off(self, m_ip, m_username, m_password, brand_name):
+        """Power off the machine (not used)."""
+
+    async def get_power_state(self, m_ip, m_username, m_password, brand_name):
+        """Get the power state of the machine."""
+        return m_ip in self.powered_on
+
+
+# Test that the optimizations can not be obtained before the manager runs
+@pytest.mark.parametrize("method", ["get_vm_optimizations", "get_pm_optimizations"])
+def test_get_optimizations_not_running(method):
+    """Test that the optimizations can not be obtained before the manager runs."""
+    manager = Manager()
+    with pytest.raises(RuntimeError, match="not running"):
+        getattr(manager, method)(None)
+
+
+def _boot_all(connector, batch_deadline=600):
+    """Boot all the PMs of a connector (7 PMs, 3 at a time) with a mock clock.
+
+    :param connector: The PM connector
+    :type connector: SlowConnector
+    :param batch_deadline: Time limit to boot all the PMs
+    :type batch_deadline: float
+
+    :return: The PMs and the seconds it took
+    :rtype: tuple(list, float)
+    """
+    pms = [
+        SimpleNamespace(
+            hostname=f"node{number:02d}",
+            connector="slow",
+            management_ip=f"10.0.0.{number}",
+            management_username="admin",
+            management_password="secret",
+            brand_model="test",
+            energy_status=False,
+        )
+        for number in range(1, 8)
+    ]
+    notified = []
+
+    manager = Manager()
+    manager.api_controller = SimpleNamespace(
+        machines_available=lambda: pms, notify_machine_status=notified.extend
+    )
+    manager.pm_connector = pm_connector.manager.Manager.__new__(
+        pm_connector.manager.Manager
+    )
+    manager.pm_connector.machines_control_manager = manager
+    manager.pm_connector.pm_connectors = [("slow", connector)]
+    manager.pm_connector.timeout = 15
+    manager.pm_connector.batch_deadline = batch_deadline
+    manager.pm_connector.state_cache = PowerStateCache(60)
+    manager.pm_connector.connector_limiters = {"slow": trio.CapacityLimiter(3)}
+
+    async def boot_all():
+        start = trio.current_time()
+        await manager._boot_all()
+        return trio.current_time() - start
+
+    elapsed = trio.run(boot_all, clock=MockClock(autojump_threshold=0))
+
+    # The state of all the PMs is notified at the end (booted or not)
+    assert notified[-len(pms) :] == pms
+    return pms, elapsed
+
+
+# Test that the PMs are booted concurrently within the limit of their connector
+def test_boot_all():
+    """Test that the PMs are booted concurrently within the limit of their connector."""
+    connector = SlowConnector(hanging=("10.0.0.1",))
+
+    pms, elapsed = _boot_all(connector)
+
+    # 3 PMs at a time (70 seconds one after the other), the hanging one only
+    # holds its slot until the timeout (whenever it starts)
+    assert connector.max_running == 3
+    assert 30 <= elapsed <= 35
+    assert [pm.energy_status for pm in pms] == [False] + [True] * 6
+
+
+# Test that booting all the PMs does not take longer than the batch deadline
+def test_boot_all_deadline():
+    """Test that booting all the PMs does not take longer than the batch deadline."""
+    connector = SlowConnector(hanging=tuple(f"10.0.0.{n}" for n in range(1, 8)))
+
+    pms, elapsed = _boot_all(connector, batch_deadline=20)
+
+    # Without the deadline, it would take 45 seconds (3 timeouts one after the other)
+    assert elapsed == 20
+    assert [pm.energy_status for pm in pms] == [False] * 7
+
+
+# Test that a status changed in the database is not kept in the cache
+def test_forget_power_state():
+    """Test that a status changed in the database is not kept in the cache."""
+    manager = Manager()
+    manager.pm_connector = pm_connector.manager.Manager.__new__(
+        pm_connector.manager.Manager
+    )
+    manager.pm_connector.state_cache = PowerStateCache(60)
+    manager.pm_connector.state_cache.set("10.0.0.1", True)
+    actions_controller = ActionsController()
+    actions_controller.set_machines_control_manager(manager)
+
+    actions_controller.notify_status_updated("10.0.0.1")
+
+    assert manager.pm_connector.state_cache.get("10.0.0.1") is None
@@ -0,0 +1,138 @@
+"""Unit tests of the migration-aware VM optimization."""
+
+import numpy as np
+import trio
+
+from cems2.cloud_analytics.snapshot import FleetSnapshot
+from cems2.machines_control.vm_optimization.plugins.migration_aware import (
+    MigrationAware,
+    plan,
+)
+from cems2.schemas.vm import VM, Amount
+
+CAPACITY = np.array([16.0, 65536.0, 1000.0])
+
+
+def _snapshot(hosts):
+    """Create a snapshot from the VMs of each host.
+
+    :param hosts: The (vCPUs, memory in MB) of the VMs of each host
+    :type hosts: list[list[tuple]]
+    """
+    vms = [
+        VM(
+            vcpus=vcpus,
+            memory=Amount(amount=memory, unit="MB"),
+            disk=Amount(amount=10, unit="GB"),
+            managed_by="test",
+        )
+        for host in hosts
+        for vcpus, memory in host
+    ]
+    vm_ptr = np.cumsum([0] + [len(host) for host in hosts])
+    return FleetSnapshot(
+        [f"host{i}" for i in range(len(hosts))],
+        np.zeros(len(hosts)),
+        vm_ptr,
+        [f"vm{i}" for i in range(len(vms))],
+        vms,
+    )
+
+
+# Test that the cheapest hosts are drained to the most loaded ones
+def test_drain_cheapest_hosts():
+    """Test that the cheapest hosts are drained to the most loaded ones."""
+    snapshot = _snapshot(
+        [[(4, 8192)] * 3, [(2, 1024)], [(4, 8192)] * 2, [(4, 4096)] * 2]
+    )
+
+    assignment, draining, moved, migrated = plan(snapshot, CAPACITY, [], 65536, 20)
+
+    # host1 is drained to host0, and host3 (that does not fit) to host2
+    assert assignment.tolist() == [0, 0, 0, 0, 2, 2, 2, 2]
+    assert (moved, migrated) == (3, 1024 + 2 * 4096)
+    assert draining == []
+
+
+# Test that the moves of a cycle are bounded and continued in the next one
+def test_bounded_moves():
+    """Test that the moves of a cycle are bounded and continued in the next one."""
+    snapshot = _snapshot([[(1, 1024)] * 4, [(1, 1024)] * 8])
+
+    # Only 2 migrations in each cycle: host0 is left draining
+    assignment, draining, moved, _ = plan(snapshot, CAPACITY, [], 65536, 2)
+    assert moved == 2
+    assert draining == ["host0"]
+    assert (assignment[:4] == 1).sum() == 2
+
+    # The memory budget also bounds the moves
+    _, draining, moved, migrated = plan(snapshot, CAPACITY, [], 3000, 20)
+    assert moved == 2
+    assert migrated == 2048
+    assert draining == ["host0"]
+
+
+# Test that the host left draining is continued first
+def test_continue_draining():
+    """Test that the host left draining is continued first."""
+    snapshot = _snapshot([[(1, 1024)] * 2, [(1, 1024)] * 3, [(1, 1024)] * 8])
+
+    # Without the previous cycle host0 is the cheapest one
+    assignment, _, _, _ = plan(snapshot, CAPACITY, [], 1024, 20)
+    assert (assignment[:2] != 0).sum() == 1
+
+    # host1 was being drained in the previous cycle
+    assignment, draining, _, _ = plan(snapshot, CAPACITY, ["host1"], 1024, 20)
+    assert (assignment[2:5] != 1).sum() == 1
+    assert draining == ["host1"]
+
+
+# Test that nothing is moved when no host can be drained
+def test_nothing_fits():
+    """Test that nothing is moved when no host can be drained."""
+    snapshot = _snapshot([[(12, 8192)], [(12, 8192)]])
+
+    assignment, draining, moved, migrated = plan(snapshot, CAPACITY, [], 65536, 20)
+    assert assignment.tolist() == [0, 1]
+    assert (draining, moved, migrated) == ([], 0, 0)
+
+
+# Test that the hosts that cannot be drained do not use the migrations cap
+def test_drain_failures():
+    """Test that the hosts that cannot be drained do not use the migrations cap."""
+    snapshot = _snapshot([[(13, 1024)], [(13, 1024)], [(4, 2048)], [(4, 8192)]])
+
+    assignment, draining, moved, migrated = plan(snapshot, CAPACITY, [], 65536, 1)
+    assert assignment.tolist() == [0, 1, 3, 3]
+    assert (draining, moved, migrated) == ([], 1, 2048)
+
+    # Give up after the number of failures
+    assignment, draining, moved, migrated = plan(snapshot, CAPACITY, [], 65536, 1, 2)
+    assert assignment.tolist() == [0, 1, 2, 3]
+    assert (draining, moved, migrated) == ([], 0, 0)
+
+
+# Test a round of the plug-in (with the loop shared by the plug-ins)
+def test_plugin_round():
+    """Test a round of the plug-in (with the loop shared by the plug-ins)."""
+    snapshot = _snapshot([[(4, 8192)], [(2, 1024)]])
+    plugin = MigrationAware()
+
+    async def main():
+        plugin.recieve_snapshot(snapshot)
+        plugin.recieve_metrics({})
+        await plugin.run(False)
+        return (
+            await plugin.get_current_distribution(),
+            await plugin.get_optimization(),
+        )
+
+    distribution, optimization = trio.run(main)
+
+    assert distribution == {
+        "host0": snapshot.get_vms("host0"),
+        "host1": snapshot.get_vms("host1"),
+    }
+    assert [len(vms) for vms in optimization.values()] == [2, 0]
+    assert plugin.metrics is None
+    assert not plugin.metrics_event.is_set()
@@ -0,0 +1,290 @@
+"""Unit tests of the PM connector manager."""
+
+import math
+from types import SimpleNamespace
+
+import trio
+from trio.testing import MockClock
+
+from cems2.machines_control.pm_connector.base import PMConnectorBase
+from cems2.machines_control.pm_connector.manager import Manager
+from cems2.machines_control.pm_connector.state_cache import PowerStateCache
+from cems2.schemas.power_action import DONE, FAILED, SKIPPED, TIMEOUT
+
+
+class BootingConnector(PMConnectorBase):
+    """PM connector whose machines take a while to reach their state."""
+
+    def __init__(self, boot_times=None, hang=False):
+        """Initialize the connector.
+
+        :param boot_times: Seconds each machine takes to boot (key: IP)
+        :type boot_times: dict
+        :param hang: If the power actions never answer
+        :type hang: bool
+        """
+        self.boot_times = boot_times or {}
+        self.hang = hang
+        self.power_on_calls = []
+        self.state_calls = 0
+        # Time of the last power on of each machine
+        self.powered_on = {}
+
+    async def power_on(self, m_ip, m_username, m_password, brand_name):
+        """Power on the machine (it is on after its boot time)."""
+        self.power_on_calls.append(m_ip)
+        if self.hang:
+            await trio.sleep_forever()
+        self.powered_on[m_ip] = trio.current_time()
+
+    async def power_off(self, m_ip, m_username, m_password, brand_name):
+        """Power off the machine (not used)."""
+
+    async def get_power_state(self, m_ip, m_username, m_password, brand_name):
+        """Get the power state of the machine."""
+        self.state_calls += 1
+        powered_on = self.powered_on.get(m_ip)
+        if powered_on is None:
+            return False
+        return trio.current_time() - powered_on >= self.boot_times.get(m_ip, 0)
+
+
+class BatchConnector(BootingConnector):
+    """PM connector that reports the state of several machines at once."""
+
+    supports_batch = True
+
+    def __init__(self, *args, **kwargs):
+        """Initialize the connector."""
+        super().__init__(*args, **kwargs)
+        self.batch_calls = []
+
+    async def get_power_states(self, machines):
+        """Get the power state of several machines."""
+        self.batch_calls.append([machine.hostname for machine in machines])
+        return {
+            machine.management_ip: await self.get_power_state(
+                machine.management_ip, None, None, None
+            )
+            for machine in machines
+        }
+
+
+def _get_manager(
+    connector,
+    timeout=10,
+    retries=2,
+    deadline=300,
+    poll_interval=10,
+    batch_deadline=3600,
+):
+    """Get a PM connector manager with a single connector (without the config).
+
+    :param connector: The PM connector
+    :type connector: PMConnectorBase
+
+    :return: The manager and the machines notified to the controller
+    :rtype: tuple(Manager, list)
+    """
+    notified = []
+    manager = Manager.__new__(Manager)
+    manager.machines_control_manager = SimpleNamespace(
+        notify_machine_status=notified.append
+    )
+    manager.pm_connectors = [("fake", connector)]
+    manager.timeout = timeout
+    manager.retries = retries
+    manager.retry_delay = 5
+    manager.action_deadline = deadline
+    manager.poll_interval = poll_interval
+    manager.batch_deadline = batch_deadline
+    manager.state_cache = PowerStateCache(60)
+    manager.connector_limiters = {"fake": trio.CapacityLimiter(5)}
+    return manager, notified
+
+
+def _get_pm(number, energy_status=False):
+    """Get a PM of the fake connector.
+
+    :param number: Number of the PM
+    :type number: int
+    :param energy_status: Current state of the PM
+    :type energy_status: bool
+
+    :return: The PM
+    :rtype: SimpleNamespace
+    """
+    return SimpleNamespace(
+        hostname=f"node{number:02d}",
+        connector="fake",
+        management_ip=f"10.0.0.{number}",
+        management_username="admin",
+        management_password="secret",
+        brand_model="test",
+        energy_status=energy_status,
+    )
+
+
+def _apply(manager, optimization):
+    """Apply an optimization with a mock clock.
+
+    :return: The results of the power actions
+    :rtype: list[PowerActionResult]
+    """
+    return trio.run(
+        manager.apply_optimization, optimization, clock=MockClock(autojump_threshold=0)
+    )
+
+
+# Test that a PM that takes a while to boot is not sent the power action again
+def test_apply_optimization_slow_boot():
+    """Test that a PM that takes a while to boot is not sent the power action again."""
+    connector = BootingConnector({"10.0.0.1": 120})
+    manager, notified = _get_manager(connector)
+    pm = _get_pm(1)
+
+    (result,) = _apply(manager, {"on": [pm], "off": []})
+
+    assert result.status == DONE
+    assert result.attempts == 1
+    assert connector.power_on_calls == ["10.0.0.1"]
+    assert connector.state_calls > 1
+    assert 120 <= result.duration <= 130
+    assert pm.energy_status is True
+    assert notified == [pm]
+
+
+# Test that the power action is sent again only after the deadline
+def test_apply_optimization_deadline():
+    """Test that the power action is sent again only after the deadline."""
+    connector = BootingConnector({"10.0.0.1": math.inf})
+    manager, notified = _get_manager(connector, retries=1, deadline=60)
+
+    (result,) = _apply(manager, {"on": [_get_pm(1)], "off": []})
+
+    assert result.status == FAILED
+    assert "did not reach the state" in result.error
+    assert result.attempts == 2
+    assert connector.power_on_calls == ["10.0.0.1", "10.0.0.1"]
+    # Two deadlines and the delay before the retry
+    assert result.duration >= 2 * 60 + 5
+    assert notified == []
+
+
+# Test that the duration of each power action is measured from its own start
+def test_apply_optimization_durations():
+    """Test that the duration of each power action is measured from its own start."""
+    connector = BootingConnector({"10.0.0.1": 20, "10.0.0.2": 100})
+    manager, _ = _get_manager(connector)
+
+    results = _apply(manager, {"on": [_get_pm(1), _get_pm(2)], "off": []})
+
+    durations = {result.hostname: result.duration for result in results}
+    assert 20 <= durations["node01"] <= 30
+    assert 100 <= durations["node02"] <= 110
+
+
+# Test that the PMs already in the state are skipped
+def test_apply_optimization_skipped():
+    """Test that the PMs already in the state are skipped."""
+    connector = BootingConnector()
+    manager, _ = _get_manager(connector)
+
+    (result,) = _apply(manager, {"on": [_get_pm(1, True)], "off": []})
+
+    assert result.status == SKIPPED
+    assert result.attempts == 0
+    assert connector.power_on_calls == []
+
+
+# Test that a connector that does not answer times out (and is retried)
+def test_apply_optimization_timeout():
+    """Test that a connector that does not answer times out (and is retried)."""
+    connector = BootingConnector(hang=True)
+    manager, _ = _get_manager(connector, retries=1)
+
+    (result,) = _apply(manager, {"on": [_get_pm(1)], "off": []})
+
+    assert result.status == TIMEOUT
+    assert result.attempts == 2
+    assert connector.state_calls == 0
+
+
+# Test that the unfinished power actions are given up at the batch deadline
+def test_apply_optimization_batch_deadline():
+    """Test that the unfinished power actions are given up at the batch deadline."""
+    connector = BootingConnector({"10.0.0.1": 20, "10.0.0.2": math.inf})
+    manager, notified = _get_manager(connector, batch_deadline=100)
+
+    results = _apply(manager, {"on": [_get_pm(1), _get_pm(2)], "off": []})
+
+    results = {result.hostname: result for result in results}
+    assert results["node01"].status == DONE
+    assert results["node02"].status == TIMEOUT
+    assert "did not finish in 100" in results["node02"].error
+    assert results["node02"].attempts == 1
+    assert results["node02"].duration == 100
+    assert [pm.hostname for pm in notified] == ["node01"]
+
+
+# Test that the default batch query queries the machines one by one
+def test_default_batch():
+    """Test that the default batch query queries the machines one by one."""
+    connector = BootingConnector()
+    assert not connector.supports_batch
+
+    states = trio.run(connector.get_power_states, [_get_pm(1), _get_pm(2)])
+
+    assert states == {"10.0.0.1": False, "10.0.0.2": False}
+    assert connector.state_calls == 2
+
+
+# Test that the PMs of a batch connector are queried together
+def test_get_pm_states_batch():
+    """Test that the PMs of a batch connector are queried together."""
+    single, batch = BootingConnector(), BatchConnector()
+    manager, _ = _get_manager(single)
+    manager.pm_connectors.append(("batch", batch))
+    manager.connector_limiters["batch"] = trio.CapacityLimiter(5)
+    pms = [_get_pm(number) for number in range(1, 6)]
+    for pm in pms[2:]:
+        pm.connector = "batch"
+
+    states = trio.run(manager.get_pm_states, pms)
+
+    assert states == {pm.hostname: False for pm in pms}
+    assert single.state_calls == 2
+    assert batch.batch_calls == [["node03", "node04", "node05"]]
+
+
+# Test that the states in the cache are not queried again
+def test_get_pm_states_cache():
+    """Test that the states in the cache are not queried again."""
+    connector = BootingConnector()
+    manager, _ = _get_manager(connector)
+    pms = [_get_pm(1), _get_pm(2)]
+
+    trio.run(manager.get_pm_states, pms)
+    manager.state_cache.invalidate(pms[1].management_ip)
+    states = trio.run(manager.get_pm_states, pms)
+
+    assert states == {"node01": False, "node02": False}
+    assert connector.state_calls == 3
+
+
+# Test that the known states are not queried
+def test_remember_states():
+    """Test that the known states are not queried."""
+    connector = BootingConnector()
+    manager, _ = _get_manager(connector)
+    pms = [_get_pm(1, True), _get_pm(2, None)]
+
+    manager.remember_states(pms)
+    states = trio.run(manager.get_pm_states, pms)
+
+    assert states == {"node01": True, "node02": False}
+    assert connector.state_calls == 1
+
+    # The cache can be skipped (e.g. while the PMs change their state)
+    trio.run(manager.get_pm_states, pms, False)
+    assert connector.state_calls == 3
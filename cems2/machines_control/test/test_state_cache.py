@@ -0,0 +1,62 @@
+"""Unit tests of the cache of the power states."""
+
+import pytest
+
+from cems2.machines_control.pm_connector import state_cache
+from cems2.machines_control.pm_connector.state_cache import PowerStateCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Replace the monotonic clock of the cache with a manual one.
+
+    :return: The clock (set its "now" item to move it)
+    :rtype: dict
+    """
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(state_cache.time, "monotonic", lambda: clock["now"])
+    return clock
+
+
+# Test that a state is kept until it expires
+def test_ttl(clock):
+    """Test that a state is kept until it expires."""
+    cache = PowerStateCache(60)
+    cache.set("10.0.0.1", True)
+
+    clock["now"] += 59
+    assert cache.get("10.0.0.1") is True
+
+    clock["now"] += 1
+    assert cache.get("10.0.0.1") is None
+
+
+# Test that the unknown states are not kept (and forget the known one)
+def test_unknown_state(clock):
+    """Test that the unknown states are not kept (and forget the known one)."""
+    cache = PowerStateCache(60)
+    cache.set("10.0.0.1", False)
+    assert cache.get("10.0.0.1") is False
+
+    cache.set("10.0.0.1", None)
+    assert cache.get("10.0.0.1") is None
+
+
+# Test that an invalidated state is not returned
+def test_invalidate(clock):
+    """Test that an invalidated state is not returned."""
+    cache = PowerStateCache(60)
+    cache.set("10.0.0.1", True)
+    cache.invalidate("10.0.0.1")
+    cache.invalidate("10.0.0.2")
+
+    assert cache.get("10.0.0.1") is None
+
+
+# Test that a ttl of 0 disables the cache
+def test_disabled(clock):
+    """Test that a ttl of 0 disables the cache."""
+    cache = PowerStateCache(0)
+    cache.set("10.0.0.1", True)
+
+    assert cache.get("10.0.0.1") is None
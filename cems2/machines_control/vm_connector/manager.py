@@ -51,12 +51,16 @@ class Manager(object):
         :type current_dist: dict
         :param optimization: The optimization to apply
         :type optimization: dict
+
+        :return: The hostnames of the PMs that recieved VMs
+        :rtype: list[str]
         """
         # Remove from the optimization the VMs that are already in the correct PM
-        for pm in optimization:
-            for vm in optimization[pm]:
-                if vm in current_dist[pm]:
-                    optimization[pm].remove(vm)
+        # (in a new dict, the optimization is shared with the VM optimization)
+        optimization = {
+            pm: [vm for vm in vms if vm not in current_dist.get(pm, ())]
+            for pm, vms in optimization.items()
+        }
 
         # Migrate the VMs
         for pm in optimization:
@@ -78,6 +82,8 @@ class Manager(object):
                 )
                 raise RuntimeError(f"Timeout reached while migrating VMs to PM '{pm}'.")
 
+        return [pm for pm, vms in optimization.items() if vms]
+
     async def _migrate_vms(self, vms: list, pm_hostname: str):
         """Migrate the VMs to the PM.
 
@@ -100,11 +106,11 @@ class Manager(object):
         :type vms: list
         """
         # Get the VM connector name from the VM metadata
-        vms_connector_name = list(vms[0].values())[0]["managed_by"]
+        vms_connector_name = list(vms[0].values())[0].managed_by
 
         # Check that all the VMs are managed by the same VM connector
         for vm in vms:
-            if list(vm.values())[0]["managed_by"] != vms_connector_name:
+            if list(vm.values())[0].managed_by != vms_connector_name:
                 LOG.error(
                     "VMs are managed by different VM connectors.",
                 )
@@ -2,6 +2,14 @@
 
 from abc import ABCMeta, abstractmethod
 
+import rich
+
+from cems2 import log
+from cems2.event import ThreadSafeEvent
+
+# Get the logger
+LOG = log.get_logger(__name__)
+
 
 class VMOptimizationBase(metaclass=ABCMeta):
     """Allows to optimize the VMs."""
@@ -37,3 +45,165 @@ class VMOptimizationBase(metaclass=ABCMeta):
         :param metrics: metrics
         :type metrics: dict
         """
+
+    def recieve_snapshot(self, snapshot):
+        """Recieve the columnar snapshot of the metrics from the manager.
+
+        The snapshot is recieved just before the metrics it was built from.
+
+        :param snapshot: snapshot of the metrics
+        :type snapshot: FleetSnapshot
+        """
+        self.snapshot = snapshot
+
+    def recieve_history(self, history):
+        """Recieve the metric history from the manager.
+
+        The history can be queried to get the trends of the metrics with
+        history.query(hostname, metric_name, start, end, resolution).
+
+        :param history: metric history
+        :type history: MetricHistory
+        """
+        self.history = history
+
+    def recieve_executor(self, executor):
+        """Recieve the executor of the algorithms from the manager.
+
+        :param executor: executor of the algorithms
+        :type executor: OptimizationExecutor
+        """
+        self.executor = executor
+
+    async def run_algorithm(self, function, snapshot, *args):
+        """Run a CPU-heavy algorithm on the snapshot.
+
+        The algorithm runs in the process pool of the executor if there is one
+        (see OptimizationExecutor.run), otherwise in the event loop.
+
+        :param function: The algorithm (function(snapshot, *args))
+        :type function: callable
+        :param snapshot: snapshot of the metrics
+        :type snapshot: FleetSnapshot
+
+        :return: The result of the algorithm
+        """
+        executor = getattr(self, "executor", None)
+        if executor is None:
+            return function(snapshot, *args)
+        return await executor.run(function, snapshot, *args)
+
+
+class VMOptimizationLoopBase(VMOptimizationBase):
+    """Allows to optimize the VMs each time the metrics are recieved.
+
+    The plug-ins only have to compute the optimization of the snapshot of the
+    metrics (see _compute_algorithm), the rest is shared.
+    """
+
+    def __init__(self):
+        """Initialize the VMs Optimization."""
+        self.metrics = None
+        self.snapshot = None
+        self.current_optimization = None
+        self.current_distribution = None
+
+        # Events set when the attributes above are available
+        self.metrics_event = ThreadSafeEvent()
+        self.optimization_event = ThreadSafeEvent()
+        self.distribution_event = ThreadSafeEvent()
+
+    async def run(self, always):
+        """Run the VMs optimization."""
+        while True:
+            # Await the metrics to be recieved
+            await self._wait_for_metrics()
+
+            # Clear the current optimization
+            self.current_optimization = None
+            self.optimization_event.clear()
+
+            # Set the current distribution (shared with the snapshot)
+            self.current_distribution = {
+                hostname: self.snapshot.get_vms(hostname)
+                for hostname in self.snapshot.hostnames
+            }
+            self.distribution_event.set()
+
+            # Compute the optimization
+            optimization = await self._compute_algorithm()
+
+            # Set the current optimization
+            self.current_optimization = optimization
+            self.optimization_event.set()
+
+            # Reset the metrics
+            self.metrics = None
+            self.metrics_event.clear()
+
+            # If the optimization is not always running, break the loop
+            if not always:
+                break
+
+    async def _wait_for_metrics(self):
+        """Wait for the metrics to be recieved."""
+        if self.metrics is None:
+            LOG.debug("Waiting for metrics to be recieved.")
+        await self.metrics_event.wait()
+
+    @abstractmethod
+    async def _compute_algorithm(self):
+        """Compute the optimization algorithm on the snapshot.
+
+        :return: The distribution.
+        :rtype: dict
+        """
+
+    def recieve_metrics(self, metrics):
+        """Recieve the metrics from the manager.
+
+        :param metrics: The metrics.
+        :type metrics: dict
+        """
+        LOG.debug("Metrics revieved in the optimization plugin.")
+        # Reset the current optimization
+        self.current_optimization = None
+        self.optimization_event.clear()
+        # Reset the current distribution
+        self.current_distribution = None
+        self.distribution_event.clear()
+        # Set the metrics
+        self.metrics = metrics
+        self.metrics_event.set()
+
+    async def get_optimization(self):
+        """Get the optimization result.
+
+        :return: The optimization result.
+        :rtype: dict
+        """
+        if self.current_optimization is None:
+            LOG.debug("Waiting for optimization to be calculated.")
+        await self.optimization_event.wait()
+
+        # Log the optimization
+        LOG.debug("Obtained VM optimization.")
+        rich.print(self.current_optimization)
+
+        return self.current_optimization
+
+    async def get_current_distribution(self):
+        """Get the current distribution of VMs.
+
+        :return: The current distribution of VMs.
+        :rtype: dict
+        """
+        if self.current_distribution is None:
+            LOG.debug("Waiting for distribution to be calculated.")
+        await self.distribution_event.wait()
+
+        # Log the distribution
+        LOG.debug("Obtained current distribution.")
+        rich.print(self.current_distribution)
+
+        return self.current_distribution
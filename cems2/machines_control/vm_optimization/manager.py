@@ -23,6 +23,15 @@ class Manager(object):
         # Last metrics recieved
         self.last_metrics = None
 
+        # Last snapshot of the metrics recieved
+        self.last_snapshot = None
+
+        # Metric history recieved
+        self.history = None
+
+        # Executor of the algorithms recieved
+        self.executor = None
+
         # Obtain the default VM optimization configured in the config file
         self.default_vm_optimization_name = CONFIG.get(
             "machines_control.plugins", "default_vm_optimization"
@@ -62,14 +71,39 @@ class Manager(object):
             list(plugin_loader.get_vm_optimizations_names()),
         )
 
-    def new_metrics(self, new_metrics):
+    def new_history(self, history):
+        """Pass the metric history to the running VM optimizations.
+
+        :param history: metric history
+        :type history: MetricHistory
+        """
+        for vm_optimization in self.running_vm_optimizations:
+            vm_optimization.recieve_history(history)
+        self.history = history
+
+    def new_executor(self, executor):
+        """Pass the executor of the algorithms to the running VM optimizations.
+
+        :param executor: executor of the algorithms
+        :type executor: OptimizationExecutor
+        """
+        for vm_optimization in self.running_vm_optimizations:
+            vm_optimization.recieve_executor(executor)
+        self.executor = executor
+
+    def new_metrics(self, new_metrics, new_snapshot=None):
         """Pass the new metrics to the running optimizations.
 
         :param new_metrics: new metrics
         :type new_metrics: dict
+        :param new_snapshot: columnar snapshot of the new metrics
+        :type new_snapshot: FleetSnapshot
         """
         for vm_optimization in self.running_vm_optimizations:
+            # The snapshot first (the metrics trigger the optimization)
+            vm_optimization.recieve_snapshot(new_snapshot)
             vm_optimization.recieve_metrics(new_metrics)
+        self.last_snapshot = new_snapshot
         self.last_metrics = new_metrics
 
     async def get_default_optimization(self):
@@ -162,8 +196,17 @@ class Manager(object):
 
         # Pass the last metrics available to the optimization
         if self.last_metrics is not None:
+            vm_optimization.recieve_snapshot(self.last_snapshot)
             vm_optimization.recieve_metrics(self.last_metrics)
 
+        # Pass the metric history to the VM optimization
+        if self.history is not None:
+            vm_optimization.recieve_history(self.history)
+
+        # Pass the executor of the algorithms to the VM optimization
+        if self.executor is not None:
+            vm_optimization.recieve_executor(self.executor)
+
         # Run the optimization
         await vm_optimization.run(always)
 
@@ -0,0 +1,283 @@
+"""VM optimization bin packing plug-in."""
+
+import numpy as np
+
+from cems2 import config_loader, log
+from cems2.machines_control.vm_optimization.base import VMOptimizationLoopBase
+
+# Get the logger
+LOG = log.get_logger(__name__)
+
+# Get the configuration
+CONFIG = config_loader.get_config()
+
+# Packing algorithms
+FFD = "ffd"  # First-fit decreasing
+BFD = "bfd"  # Best-fit decreasing
+ALGORITHMS = (FFD, BFD)
+
+
+def pack(demand, capacity, host_priority, vm_priority=None, algorithm=FFD):
+    """Pack the VMs on the hosts with a multi-dimensional FFD or BFD.
+
+    The VMs with the same demand are packed together: for identical items,
+    first-fit fills each host in order as much as possible, and best-fit
+    fills each host in order of its residual capacity, so a size class is
+    placed with a single cumulative sum over the hosts instead of one search
+    per VM. The classes are packed in decreasing size.
+
+    :param demand: Demand of each VM (VMs x dimensions)
+    :type demand: numpy.ndarray
+    :param capacity: Capacity of each host (hosts x dimensions)
+    :type capacity: numpy.ndarray
+    :param host_priority: Order of the hosts to fill (lower first)
+    :type host_priority: numpy.ndarray
+    :param vm_priority: Order of the VMs of the same size (lower first)
+    :type vm_priority: numpy.ndarray
+    :param algorithm: Packing algorithm (ffd or bfd)
+    :type algorithm: str
+
+    :return: Index of the host of each VM (-1 if it does not fit anywhere)
+    :rtype: numpy.ndarray
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Algorithm '{algorithm}' is not one of {ALGORITHMS}")
+
+    demand = np.asarray(demand, dtype=np.float64)
+    free = np.array(capacity, dtype=np.float64)
+    assignment = np.full(len(demand), -1, dtype=np.int64)
+    if len(demand) == 0 or len(free) == 0:
+        return assignment
+
+    if vm_priority is None:
+        vm_priority = np.zeros(len(demand))
+
+    # Scale of each dimension to compare the sizes of the VMs
+    scale = free.mean(axis=0)
+    scale[scale <= 0] = 1
+
+    # Size classes of the VMs (VMs of the same class sorted by their priority)
+    vm_order = np.lexsort((vm_priority,) + tuple(demand.T[::-1]))
+    sorted_demand = demand[vm_order]
+    first = np.flatnonzero(
+        np.concatenate(([True], (sorted_demand[1:] != sorted_demand[:-1]).any(axis=1)))
+    )
+    bounds = np.append(first, len(demand))
+    classes = sorted_demand[first]
+
+    # Packing order of the classes: decreasing size (the largest dimension first)
+    normalized = classes / scale
+    class_order = np.lexsort((normalized.sum(axis=1), normalized.max(axis=1)))[::-1]
+
+    # The hosts are kept in the order of their priority
+    host_order = np.argsort(host_priority, kind="stable")
+    free = free[host_order]
+
+    for c in class_order:
+        vms = vm_order[bounds[c] : bounds[c + 1]]
+        size = classes[c]
+        dims = size > 0
+
+        # Number of VMs of the class that fit on each host
+        if dims.any():
+            fits = np.floor((free[:, dims] / size[dims]).min(axis=1) + 1e-9)
+            fits = np.minimum(fits, len(vms)).astype(np.int64)
+        else:
+            fits = np.full(len(free), len(vms), dtype=np.int64)
+
+        # Hosts where the class fits: in order (FFD) or from the least
+        # residual capacity (BFD, the ties in order)
+        hosts = np.flatnonzero(fits)
+        if algorithm == BFD:
+            residual = (free[hosts] / scale).sum(axis=1)
+            hosts = hosts[np.argsort(residual, kind="stable")]
+
+        # Fill the hosts until all the VMs of the class are placed
+        fits = fits[hosts]
+        placed_before = np.cumsum(fits) - fits
+        taken = np.clip(len(vms) - placed_before, 0, fits)
+        hosts, taken = hosts[taken > 0], taken[taken > 0]
+
+        placed = np.repeat(host_order[hosts], taken)
+        assignment[vms[: len(placed)]] = placed
+        free[hosts] -= taken[:, None] * size
+
+    return assignment
+
+
+def consolidate(snapshot, capacity, granularity, algorithm=FFD):
+    """Pack the VMs of a snapshot on the fewest hosts, moving the fewest VMs.
+
+    Each VM stays on its current host, and only the VMs of the hosts being
+    emptied (the least loaded ones, as many as the free capacity of the rest
+    of the hosts can hold) and the VMs that exceed the capacity of their host
+    are packed again, on the most loaded hosts first. The hosts without VMs
+    only recieve the VMs that do not fit anywhere else. If any VM of a host
+    being emptied does not fit, all the VMs of the host stay on it.
+
+    :param snapshot: The snapshot of the metrics
+    :type snapshot: FleetSnapshot
+    :param capacity: Capacity of each host (vCPUs, memory in MB and disk in GB)
+    :type capacity: numpy.ndarray
+    :param granularity: Granularity of the size classes of the VMs
+    :type granularity: numpy.ndarray
+    :param algorithm: Packing algorithm (ffd or bfd)
+    :type algorithm: str
+
+    :return: Index of the host of each VM (-1 if it does not fit anywhere)
+    :rtype: numpy.ndarray
+    """
+    hosts = len(snapshot)
+    vm_host = np.asarray(snapshot.vm_host, dtype=np.int64)
+
+    # Demand of each VM rounded up to its size class
+    demand = np.column_stack((snapshot.vm_vcpus, snapshot.vm_memory, snapshot.vm_disk))
+    demand = np.ceil(demand / granularity) * granularity
+
+    # The VMs that exceed the capacity of their host (the VMs of each host
+    # are kept from the smallest one until the host is full)
+    order = np.lexsort(((demand / capacity).max(axis=1), vm_host))
+    sorted_hosts = vm_host[order]
+    cumulative = np.cumsum(demand[order], axis=0)
+    first = np.searchsorted(sorted_hosts, sorted_hosts)
+    cumulative -= cumulative[first] - demand[order][first]
+    exceeds = np.zeros(len(demand), dtype=bool)
+    exceeds[order] = (cumulative > capacity + 1e-9).any(axis=1)
+
+    # Demand that stays on each host
+    used = np.zeros((hosts, 3))
+    np.add.at(used, vm_host[~exceeds], demand[~exceeds])
+    free = np.maximum(capacity - used, 0)
+    load = (used / capacity).max(axis=1)
+    active = np.bincount(vm_host[~exceeds], minlength=hosts) > 0
+
+    # Empty the least loaded hosts while the free capacity of the rest of the
+    # active hosts can hold their VMs (and the VMs that exceed their hosts)
+    candidates = np.flatnonzero(active)
+    candidates = candidates[np.argsort(load[candidates], kind="stable")]
+    moved = np.cumsum(used[candidates], axis=0) + demand[exceeds].sum(axis=0)
+    left = free[candidates].sum(axis=0) - np.cumsum(free[candidates], axis=0)
+    count = (moved <= left + 1e-9).all(axis=1).sum()
+    emptied = np.zeros(hosts, dtype=bool)
+    emptied[candidates[:count]] = True
+
+    # Pack the moving VMs on the rest of the active hosts (the most loaded
+    # first), and on the hosts without VMs only if they do not fit there
+    moving = np.flatnonzero(exceeds | emptied[vm_host])
+    targets = np.where(emptied[:, None], 0.0, free)
+    host_priority = np.where(active, -load, 1)
+    host_rank = np.empty(hosts, dtype=np.int64)
+    host_rank[np.argsort(host_priority, kind="stable")] = np.arange(hosts)
+
+    assignment = vm_host.copy()
+    assignment[moving] = pack(
+        demand[moving],
+        targets,
+        host_priority,
+        vm_priority=host_rank[vm_host[moving]],
+        algorithm=algorithm,
+    )
+
+    # Keep all the VMs of the emptied hosts with any VM that does not fit
+    failed = np.zeros(hosts, dtype=bool)
+    failed[vm_host[moving][assignment[moving] < 0]] = True
+    failed &= emptied
+    keep = failed[vm_host] & ~exceeds
+    assignment[keep] = vm_host[keep]
+
+    return assignment
+
+
+def get_distribution(snapshot, assignment):
+    """Get the distribution of the VMs of a snapshot from their assignment.
+
+    :param snapshot: The snapshot of the metrics
+    :type snapshot: FleetSnapshot
+    :param assignment: Index of the host of each VM
+    :type assignment: numpy.ndarray
+
+    :return: The VMs on each machine (Key: hostname, Value: list of VMs)
+    :rtype: dict
+    """
+    order = np.argsort(assignment, kind="stable")
+    ptr = np.zeros(len(snapshot) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(assignment, minlength=len(snapshot)), out=ptr[1:])
+
+    # Gather the (shared) entries of the VMs of each machine
+    entries = np.empty(len(snapshot.vm_entries), dtype=object)
+    entries[:] = snapshot.vm_entries
+    entries = entries[order]
+    return {
+        hostname: entries[ptr[h] : ptr[h + 1]].tolist()
+        for h, hostname in enumerate(snapshot.hostnames)
+    }
+
+
+class BinPacking(VMOptimizationLoopBase):
+    """Consolidate the VMs on the fewest hosts with a vectorized bin packing.
+
+    The VMs are packed by vCPUs, memory and disk on hosts of the configured
+    capacity. The VMs stay on their hosts, except the ones of the least
+    loaded hosts (that are left empty) and the ones that exceed the capacity
+    of their host, which are packed on the most loaded hosts first.
+    """
+
+    def __init__(self):
+        """Initialize the bin packing optimization."""
+        super().__init__()
+
+        # Packing algorithm
+        self.algorithm = CONFIG.get("plugins.bin_packing", "algorithm", fallback=FFD)
+        if self.algorithm not in ALGORITHMS:
+            raise RuntimeError(
+                f"Bin packing algorithm '{self.algorithm}' is not one of {ALGORITHMS}"
+            )
+
+        # Capacity of each host (vCPUs, memory in MB and disk in GB)
+        self.capacity = np.array(
+            [
+                CONFIG.getfloat("plugins.bin_packing", "vcpus", fallback=64),
+                CONFIG.getfloat("plugins.bin_packing", "memory", fallback=262144),
+                CONFIG.getfloat("plugins.bin_packing", "disk", fallback=2048),
+            ]
+        )
+
+        # Granularity of the size classes of the VMs (demands are rounded up)
+        self.granularity = np.array(
+            [
+                1,
+                CONFIG.getfloat(
+                    "plugins.bin_packing", "memory_granularity", fallback=512
+                ),
+                CONFIG.getfloat("plugins.bin_packing", "disk_granularity", fallback=10),
+            ]
+        )
+
+    async def _compute_algorithm(self):
+        """Compute the optimization algorithm.
+
+        :return: The distribution.
+        :rtype: dict
+        """
+        snapshot = self.snapshot
+
+        # Pack the VMs (in the process pool of the executor if there is one)
+        assignment = await self.run_algorithm(
+            consolidate, snapshot, self.capacity, self.granularity, self.algorithm
+        )
+
+        # The VMs that do not fit anywhere stay on their host
+        unplaced = assignment < 0
+        if unplaced.any():
+            LOG.warning("%s VMs do not fit on any host", int(unplaced.sum()))
+            assignment[unplaced] = snapshot.vm_host[unplaced]
+
+        LOG.info(
+            "Bin packing (%s) of %s VMs on %s of %s hosts",
+            self.algorithm,
+            len(assignment),
+            len(np.unique(assignment)),
+            len(snapshot),
+        )
+
+        return get_distribution(snapshot, assignment)
@@ -0,0 +1,212 @@
+"""VM optimization migration-aware plug-in."""
+
+import numpy as np
+
+from cems2 import config_loader, log
+from cems2.machines_control.vm_optimization.base import VMOptimizationLoopBase
+from cems2.machines_control.vm_optimization.plugins.bin_packing import (
+    get_distribution,
+)
+
+# Get the logger
+LOG = log.get_logger(__name__)
+
+# Get the configuration
+CONFIG = config_loader.get_config()
+
+
+def plan(
+    snapshot, capacity, draining, migration_budget, max_migrations, max_failures=None
+):
+    """Plan the migrations of a cycle.
+
+    :param snapshot: The snapshot of the metrics
+    :type snapshot: FleetSnapshot
+    :param capacity: Capacity of each host (vCPUs, memory in MB and disk in GB)
+    :type capacity: numpy.ndarray
+    :param draining: Hosts being drained in the previous cycle
+    :type draining: list[str]
+    :param migration_budget: Memory (MB) that can be migrated
+    :type migration_budget: float
+    :param max_migrations: Number of VMs that can be migrated
+    :type max_migrations: int
+    :param max_failures: Number of hosts that can fail to be drained before
+        giving up (all the candidates if None)
+    :type max_failures: int
+
+    :return: Index of the host of each VM after the migrations, hosts left
+        draining, number of migrations and memory (MB) migrated
+    :rtype: tuple(numpy.ndarray, list[str], int, float)
+    """
+    demand = np.column_stack((snapshot.vm_vcpus, snapshot.vm_memory, snapshot.vm_disk))
+    free = capacity - np.column_stack((snapshot.vcpus, snapshot.memory, snapshot.disk))
+    assignment = snapshot.vm_host.copy()
+
+    # Only the active hosts (with VMs) can recieve VMs
+    targets = np.diff(snapshot.vm_ptr) > 0
+
+    # Candidates to drain: the ones of the previous cycle first, then the
+    # cheapest ones (the least memory to migrate)
+    previous = np.zeros(len(snapshot), dtype=bool)
+    for hostname in draining:
+        if hostname in snapshot.host_index:
+            previous[snapshot.host_index[hostname]] = True
+    candidates = np.flatnonzero(targets)
+    candidates = candidates[
+        np.lexsort((snapshot.memory[candidates], ~previous[candidates]))
+    ]
+
+    # Hosts that recieve VMs in this cycle are not drained
+    recieving = np.zeros(len(snapshot), dtype=bool)
+
+    budget = migration_budget
+    moves_left = max_migrations
+    failures_left = len(candidates) if max_failures is None else max_failures
+    draining = []
+    moved = 0
+
+    for host in candidates.tolist():
+        if moves_left == 0 or failures_left == 0:
+            break
+        if recieving[host]:
+            continue
+
+        # VMs of the host (the largest first to check that all of them fit)
+        vms = np.arange(snapshot.vm_ptr[host], snapshot.vm_ptr[host + 1])
+        vms = vms[np.argsort(-snapshot.vm_memory[vms], kind="stable")]
+
+        # The host is not a target anymore while it is drained
+        targets[host] = False
+        placement = _place(vms, demand, free, targets, capacity)
+        if placement is None:
+            targets[host] = True
+            failures_left -= 1
+            continue
+
+        # Move the smallest VMs first within the budget
+        for vm, target in sorted(
+            zip(vms.tolist(), placement), key=lambda x: demand[x[0], 1]
+        ):
+            if moves_left == 0 or demand[vm, 1] > budget:
+                break
+            assignment[vm] = target
+            recieving[target] = True
+            free[target] -= demand[vm]
+            free[host] += demand[vm]
+            budget -= demand[vm, 1]
+            moves_left -= 1
+            moved += 1
+
+        # Continue draining the host in the next cycle
+        if (assignment[vms] == host).any():
+            draining.append(snapshot.hostnames[host])
+            break
+
+    return assignment, draining, moved, migration_budget - budget
+
+
+def _place(vms, demand, free, targets, capacity):
+    """Find a target for each VM of a host (best fit on the active hosts).
+
+    :param vms: Indexes of the VMs (the largest first)
+    :type vms: numpy.ndarray
+    :param demand: Demand of each VM
+    :type demand: numpy.ndarray
+    :param free: Free capacity of each host
+    :type free: numpy.ndarray
+    :param targets: Hosts that can recieve VMs
+    :type targets: numpy.ndarray
+    :param capacity: Capacity of each host
+    :type capacity: numpy.ndarray
+
+    :return: Index of the target of each VM (None if any of them does not fit)
+    :rtype: list[int]
+    """
+    trial = free.copy()
+    hosts = np.flatnonzero(targets)
+    placement = []
+
+    for vm in vms.tolist():
+        fits = (trial[hosts] >= demand[vm] - 1e-9).all(axis=1)
+        if not fits.any():
+            return None
+
+        # The most loaded host where the VM fits
+        residual = (trial[hosts] / capacity).sum(axis=1)
+        residual[~fits] = np.inf
+        target = int(hosts[np.argmin(residual)])
+
+        trial[target] -= demand[vm]
+        placement.append(target)
+
+    return placement
+
+
+class MigrationAware(VMOptimizationLoopBase):
+    """Consolidate the VMs with a bounded live-migration traffic per cycle.
+
+    The hosts are drained one by one, cheapest first (the memory of their
+    VMs is the cost of their live migration), and their VMs are moved to
+    the most loaded hosts where they fit. The moves of each cycle are bounded
+    by a migration budget (memory) and a maximum number of migrations, and
+    the smallest VMs of a host are moved first. The hosts left half drained
+    by the budget are continued first in the next cycle, so each cycle goes
+    on from the previous solution instead of planning it all again.
+    """
+
+    def __init__(self):
+        """Initialize the migration-aware optimization."""
+        super().__init__()
+
+        # Hosts being drained in the previous cycle
+        self.draining = []
+
+        # Capacity of each host (vCPUs, memory in MB and disk in GB)
+        self.capacity = np.array(
+            [
+                CONFIG.getfloat("plugins.migration_aware", "vcpus", fallback=64),
+                CONFIG.getfloat("plugins.migration_aware", "memory", fallback=262144),
+                CONFIG.getfloat("plugins.migration_aware", "disk", fallback=2048),
+            ]
+        )
+
+        # Memory (MB) and number of VMs that can be migrated in each cycle
+        self.migration_budget = CONFIG.getfloat(
+            "plugins.migration_aware", "migration_budget", fallback=65536
+        )
+        self.max_migrations = CONFIG.getint(
+            "plugins.migration_aware", "max_migrations", fallback=20
+        )
+
+        # Number of hosts that can fail to be drained in each cycle
+        self.max_drain_failures = CONFIG.getint(
+            "plugins.migration_aware", "max_drain_failures", fallback=None
+        )
+
+    async def _compute_algorithm(self):
+        """Compute the optimization algorithm.
+
+        :return: The distribution.
+        :rtype: dict
+        """
+        snapshot = self.snapshot
+
+        # Plan the migrations (in the process pool of the executor if there is one)
+        assignment, self.draining, moved, migrated = await self.run_algorithm(
+            plan,
+            snapshot,
+            self.capacity,
+            self.draining,
+            self.migration_budget,
+            self.max_migrations,
+            self.max_drain_failures,
+        )
+
+        LOG.info(
+            "Migration-aware plan: %s migrations (%.0f MB), %s hosts left draining",
+            moved,
+            migrated,
+            len(self.draining),
+        )
+
+        return get_distribution(snapshot, assignment)
@@ -1,13 +1,12 @@
 """VM optimization test 3 plug-in."""
 
-import copy
-import json
 import random
 
 import rich
 import trio
 
 from cems2 import log
+from cems2.event import ThreadSafeEvent
 from cems2.machines_control.vm_optimization.base import VMOptimizationBase
 
 # Get the logger
@@ -20,9 +19,15 @@ class Test3(VMOptimizationBase):
     def __init__(self):
         """Initialize the test connection."""
         self.metrics = None
+        self.snapshot = None
         self.current_optimization = None
         self.current_distribution = None
 
+        # Events set when the attributes above are available
+        self.metrics_event = ThreadSafeEvent()
+        self.optimization_event = ThreadSafeEvent()
+        self.distribution_event = ThreadSafeEvent()
+
     async def run(self, always):
         """Run the test VMs optimization."""
 
@@ -32,9 +37,11 @@ class Test3(VMOptimizationBase):
 
             # Clear the current optimization
             self.current_optimization = None
+            self.optimization_event.clear()
 
             # Clear the current distribution
             self.current_distribution = None
+            self.distribution_event.clear()
 
             # Compute the optimization
             optimization = self._compute_algorithm()
@@ -44,9 +51,11 @@ class Test3(VMOptimizationBase):
 
             # Set the current optimization
             self.current_optimization = optimization
+            self.optimization_event.set()
 
             # Reset the metrics
             self.metrics = None
+            self.metrics_event.clear()
 
             # If the optimization is not always running, break the loop
             if not always:
@@ -56,8 +65,7 @@ class Test3(VMOptimizationBase):
         """Wait for the metrics to be recieved."""
         if self.metrics is None:
             LOG.debug("Waiting for metrics to be recieved.")
-        while self.metrics is None:
-            await trio.sleep(1)
+        await self.metrics_event.wait()
 
     def _compute_algorithm(self):
         """Compute the optimization algorithm.
@@ -74,16 +82,17 @@ class Test3(VMOptimizationBase):
         distribution = {}
 
         # Get the utilization of each machine
-        utilizations = self._get_utilizations(self.metrics)
+        utilizations = self._get_utilizations(self.snapshot)
 
         # Sort the machines by utilization
         sorted_machines = sorted(utilizations.items(), key=lambda x: x[1])
 
-        # Get the VMs on each machine
-        distribution = self._get_vms_on_machine(self.metrics)
+        # Get the VMs on each machine (immutable tuples shared with the snapshot)
+        self.current_distribution = self._get_vms_on_machine(self.snapshot)
+        self.distribution_event.set()
 
-        # Copy the distribution dict on the actual distribution
-        self.current_distribution = copy.deepcopy(distribution)
+        # The new distribution shares the VMs of the machines that do not change
+        distribution = dict(self.current_distribution)
 
         # Add the VMs on the machines with the lowest utilization to the machines with the highest utilization
         for i in range(len(sorted_machines) // 2):
@@ -94,84 +103,38 @@ class Test3(VMOptimizationBase):
                 < 100
             ):
                 # Add the VMs from the machine with the lowest utilization to the machine with the highest utilization
-                for vm in distribution[sorted_machines[i][0]]:
-                    distribution[sorted_machines[-i - 1][0]].append(vm)
+                distribution[sorted_machines[-i - 1][0]] = (
+                    distribution[sorted_machines[-i - 1][0]]
+                    + distribution[sorted_machines[i][0]]
+                )
 
                 # Remove the VMs from the machine with the lowest utilization
-                distribution[sorted_machines[i][0]] = []
+                distribution[sorted_machines[i][0]] = ()
 
         return distribution
 
-    def _get_utilizations(self, metrics):
+    def _get_utilizations(self, snapshot):
         """Get the utilization of each machine.
 
-        :param metrics: The metrics.
-        :type metrics: dict
+        :param snapshot: The snapshot of the metrics.
+        :type snapshot: FleetSnapshot
 
         :return: The utilizations.
         :rtype: dict
         """
-        utilizations = {}
-
-        for hostname, value in metrics.items():
-            for metric in value:
-                if metric.name == "utilization":
-                    # Get the utilization
-                    utilizations[hostname] = self._get_utilization(metric)
-
-        return utilizations
+        return snapshot.get_utilizations()
 
-    def _get_utilization(self, metric):
-        """Get the utilization of the machine.
-
-        :param metric: The metric.
-        :type metric: dict
-
-        :return: The utilization.
-        :rtype: float
-        """
-        # Get the value from the payload
-        return float(json.loads(metric.payload)["value"])
-
-    def _get_vms_on_machine(self, metrics):
+    def _get_vms_on_machine(self, snapshot):
         """Get the VMs on each machine.
 
-        :param metrics: The metrics.
-        :type metrics: dict
+        :param snapshot: The snapshot of the metrics.
+        :type snapshot: FleetSnapshot
 
         :return: The VMs on each machine.
         :rtype: dict
         """
-        # Create a dict of list of VMs (Key: hostname, Value: list of VMs)
-        distribution = {}
-
-        # Initialize the dict
-        for hostname, value in metrics.items():
-            distribution[hostname] = []
-
-        # Get the VMs on each machine
-        for hostname, value in metrics.items():
-            for metric in value:
-                if metric.name == "vms":
-                    # Get the VMs as a dict
-                    vms = self._get_vms(metric)
-                    # Split the VMs into a list
-                    for vm_uuid, vm in vms.items():
-                        distribution[hostname].append({vm_uuid: vm})
-
-        return distribution
-
-    def _get_vms(self, metric):
-        """Get the VMs on the machine.
-
-        :param metric: The metric.
-        :type metric: dict
-
-        :return: The VMs.
-        :rtype: list
-        """
-        # Get the value from the payload and convert it to a dict
-        return json.loads(metric.payload)
+        # Create a dict of tuples of VMs (Key: hostname, Value: tuple of VMs)
+        return {hostname: snapshot.get_vms(hostname) for hostname in snapshot.hostnames}
 
     def recieve_metrics(self, metrics):
         """Recieve the metrics from the manager.
@@ -182,10 +145,13 @@ class Test3(VMOptimizationBase):
         LOG.debug("Metrics revieved in the optimization plugin.")
         # Reset the current optimization
         self.current_optimization = None
+        self.optimization_event.clear()
         # Reset the current distribution
         self.current_distribution = None
+        self.distribution_event.clear()
         # Set the metrics
         self.metrics = metrics
+        self.metrics_event.set()
 
     async def get_optimization(self):
         """Get the optimization result.
@@ -195,8 +161,7 @@ class Test3(VMOptimizationBase):
         """
         if self.current_optimization is None:
             LOG.debug("Waiting for optimization to be calculated.")
-        while self.current_optimization is None:
-            await trio.sleep(1)
+        await self.optimization_event.wait()
 
         # Log the optimization
         LOG.debug("Obtained VM optimization.")
@@ -212,8 +177,7 @@ class Test3(VMOptimizationBase):
         """
         if self.current_distribution is None:
             LOG.debug("Waiting for distribution to be calculated.")
-        while self.current_distribution is None:
-            await trio.sleep(1)
+        await self.distribution_event.wait()
 
         # Log the distribution
         LOG.debug("Obtained current distribution.")
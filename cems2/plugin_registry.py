@@ -0,0 +1,81 @@
+"""Process-wide registry of the plug-ins installed in CEMS2.
+
+The entry points of each namespace are scanned only once and the
+name -> class map is kept in memory until it is explicitly refreshed.
+"""
+
+import threading
+
+import stevedore
+
+# Cache of the plug-ins (key: namespace, value: dict{name: plugin class})
+_REGISTRY = {}
+
+# Lock to protect the cache (the API runs in a different thread)
+_LOCK = threading.Lock()
+
+
+def _scan(namespace):
+    """Scan the entry points of the specified namespace.
+
+    :param namespace: The namespace to search for plug-ins
+    :type namespace: str
+
+    :return: The plug-ins of the namespace
+    :rtype: dict
+    """
+    mgr = stevedore.ExtensionManager(namespace=namespace)
+    # From the loaded extensions (map() raises NoMatches on an empty namespace)
+    return {ext.name: ext.plugin for ext in mgr.extensions}
+
+
+def _get_plugins(namespace):
+    """Get the cached plug-ins of a namespace, scanning it the first time.
+
+    :param namespace: The namespace to search for plug-ins
+    :type namespace: str
+
+    :return: The plug-ins of the namespace
+    :rtype: dict
+    """
+    with _LOCK:
+        if namespace not in _REGISTRY:
+            _REGISTRY[namespace] = _scan(namespace)
+        return _REGISTRY[namespace]
+
+
+def get_names(namespace):
+    """Get the names of the plug-ins in the specified namespace.
+
+    :param namespace: The namespace to search for plug-ins
+    :type namespace: str
+
+    :return: The names of the plug-ins in the specified namespace
+    :rtype: frozenset
+    """
+    return frozenset(_get_plugins(namespace))
+
+
+def get_extensions(namespace):
+    """Get the extensions of the plug-ins in the specified namespace.
+
+    :param namespace: The namespace to search for plug-ins
+    :type namespace: str
+
+    :return: A copy of the extensions of the plug-ins in the specified namespace
+    :rtype: dict
+    """
+    return dict(_get_plugins(namespace))
+
+
+def refresh(namespace=None):
+    """Forget the cached plug-ins so the entry points are scanned again.
+
+    :param namespace: The namespace to refresh (all of them if None)
+    :type namespace: str
+    """
+    with _LOCK:
+        if namespace is None:
+            _REGISTRY.clear()
+        else:
+            _REGISTRY.pop(namespace, None)
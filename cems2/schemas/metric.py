@@ -1,17 +1,29 @@
 """Metric schema using Pydantic ORM (Object Relational Mapper)."""
 
 
+import json
 from datetime import datetime
+from typing import Optional
 
 from pydantic import BaseModel, Field
 
+from cems2.schemas.vm import VM
+
 
 class Metric(BaseModel):
-    """Metric schema using Pydantic ORM (Object Relational Mapper)."""
+    """Metric schema using Pydantic ORM (Object Relational Mapper).
+
+    The metrics are typed: a scalar value (with its unit) or the VMs of the
+    machine. The JSON payload is kept as a compatibility layer for the
+    collectors that still report it, and it is only parsed by get_value()
+    and get_vms() when the typed fields are not set.
+    """
 
     name: str = Field(..., example="vms")
-    payload: str = Field(
-        ...,
+    value: Optional[float] = Field(default=None, example=42.5)
+    unit: Optional[str] = Field(default=None, example="%")
+    vms: Optional[dict[str, VM]] = Field(
+        default=None,
         example={
             "uuid1": {
                 "vcpus": 2,
@@ -27,6 +39,65 @@ class Metric(BaseModel):
             },
         },
     )
+    payload: Optional[str] = Field(default=None, example='{"value": 42.5, "unit": "%"}')
     hostname: str = Field(min_length=2, max_length=50, example="host1")
     timestamp: datetime = Field(default=datetime.now())
     collected_by: str = Field(min_length=1, max_length=50, example="OpenStackVMs")
+
+    def get_value(self):
+        """Get the scalar value of the metric.
+
+        :return: The value (None if the metric is not a scalar)
+        :rtype: float
+        """
+        if self.value is not None:
+            return self.value
+
+        payload = self._parse_payload()
+        if isinstance(payload, dict):
+            payload = payload.get("value")
+
+        if isinstance(payload, (int, float)) and not isinstance(payload, bool):
+            return float(payload)
+        return None
+
+    def get_unit(self):
+        """Get the unit of the scalar value of the metric.
+
+        :return: The unit (None if it is not known)
+        :rtype: str
+        """
+        if self.unit is not None:
+            return self.unit
+
+        payload = self._parse_payload()
+        if isinstance(payload, dict):
+            return payload.get("unit")
+        return None
+
+    def get_vms(self):
+        """Get the VMs of the metric.
+
+        :return: The VMs (key: uuid, value: VM) or None if the metric has no VMs
+        :rtype: dict[str, VM]
+        """
+        if self.vms is not None:
+            return self.vms
+
+        payload = self._parse_payload()
+        if not isinstance(payload, dict) or "value" in payload:
+            return None
+        return {vm_uuid: VM(**vm) for vm_uuid, vm in payload.items()}
+
+    def _parse_payload(self):
+        """Parse the JSON payload of the metric.
+
+        :return: The payload (None if there is no valid payload)
+        :rtype: dict or float
+        """
+        if self.payload is None:
+            return None
+        try:
+            return json.loads(self.payload)
+        except ValueError:
+            return None
@@ -0,0 +1,23 @@
+"""Power action result schema using Pydantic ORM (Object Relational Mapper)."""
+
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+# Status of a power action
+DONE = "done"  # The PM reached the requested state
+SKIPPED = "skipped"  # The PM was already in the requested state
+FAILED = "failed"  # The connector failed or the PM did not reach the state
+TIMEOUT = "timeout"  # The connector did not answer in time
+
+
+class PowerActionResult(BaseModel):
+    """Power action result schema using Pydantic ORM (Object Relational Mapper)."""
+
+    hostname: str = Field(..., example="node01")
+    connector: str = Field(..., example="IPMI")
+    action: str = Field(..., example="on")
+    status: str = Field(..., example=DONE)
+    attempts: int = Field(..., example=1)
+    duration: float = Field(..., example=2.5)
+    error: Optional[str] = Field(None, example="Timed out after 10 seconds")
@@ -0,0 +1,18 @@
+"""Sample of the metric history schema using Pydantic ORM (Object Relational Mapper)."""
+
+from datetime import datetime
+
+from pydantic import BaseModel, Field
+
+
+class Sample(BaseModel):
+    """Sample of the metric history schema.
+
+    Uses Pydantic ORM (Object Relational Mapper).
+    """
+
+    timestamp: datetime = Field(..., example="2023-05-01T12:00:00")
+    value: float = Field(..., example=42.5)
+    min: float = Field(..., example=40.0)
+    max: float = Field(..., example=45.0)
+    count: int = Field(..., example=4)
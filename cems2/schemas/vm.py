@@ -0,0 +1,19 @@
+"""VM schemas using Pydantic ORM (Object Relational Mapper)."""
+
+from pydantic import BaseModel, Field
+
+
+class Amount(BaseModel):
+    """Amount of a resource schema using Pydantic ORM (Object Relational Mapper)."""
+
+    amount: float = Field(..., example=2048)
+    unit: str = Field(..., example="MB")
+
+
+class VM(BaseModel):
+    """VM schema using Pydantic ORM (Object Relational Mapper)."""
+
+    vcpus: int = Field(..., example=2)
+    memory: Amount
+    disk: Amount
+    managed_by: str = Field(..., example="OpenStack")
@@ -0,0 +1,57 @@
+"""Unit tests of the process-wide registry of plug-ins."""
+
+import pytest
+
+from cems2 import plugin_registry
+
+NAMESPACE = "cems2.test.empty"
+
+
+@pytest.fixture(autouse=True)
+def refresh_registry():
+    """Forget the cached plug-ins before and after each test."""
+    plugin_registry.refresh()
+    yield
+    plugin_registry.refresh()
+
+
+# Test that an empty namespace has no plug-ins
+def test_empty_namespace():
+    """Test that an empty namespace has no plug-ins."""
+    assert plugin_registry.get_names(NAMESPACE) == frozenset()
+    assert plugin_registry.get_extensions(NAMESPACE) == {}
+
+
+# Test that the entry points are scanned only once
+def test_scan_cached(monkeypatch):
+    """Test that the entry points are scanned only once."""
+    scans = []
+
+    def _scan(namespace):
+        scans.append(namespace)
+        return {"plugin": object}
+
+    monkeypatch.setattr(plugin_registry, "_scan", _scan)
+
+    assert plugin_registry.get_names(NAMESPACE) == frozenset({"plugin"})
+    assert plugin_registry.get_extensions(NAMESPACE) == {"plugin": object}
+    assert scans == [NAMESPACE]
+
+
+# Test that the namespace is scanned again after a refresh
+def test_refresh(monkeypatch):
+    """Test that the namespace is scanned again after a refresh."""
+    scans = []
+    monkeypatch.setattr(plugin_registry, "_scan", lambda ns: scans.append(ns) or {})
+
+    plugin_registry.get_names(NAMESPACE)
+    plugin_registry.refresh(NAMESPACE)
+    plugin_registry.get_names(NAMESPACE)
+    assert scans == [NAMESPACE, NAMESPACE]
+
+
+# Test that the returned extensions are a copy of the cached ones
+def test_extensions_copy():
+    """Test that the returned extensions are a copy of the cached ones."""
+    plugin_registry.get_extensions(NAMESPACE)["plugin"] = object
+    assert plugin_registry.get_extensions(NAMESPACE) == {}
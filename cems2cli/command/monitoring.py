@@ -297,7 +297,11 @@ def parse_metrics(response, table):
     for machine, metrics in response.items():
         for metric in metrics:
             if metric["name"] == "vms":
-                for vm_uuid, vm_info in json.loads(metric["payload"]).items():
+                # Get the typed VMs (or the legacy JSON payload)
+                vms = metric.get("vms")
+                if vms is None:
+                    vms = json.loads(metric["payload"])
+                for vm_uuid, vm_info in vms.items():
                     vms_list.append({vm_uuid: vm_info})
                 table.add_row(
                     metric["name"],
@@ -308,9 +312,11 @@ def parse_metrics(response, table):
                 )
                 vms_list = []
             else:
-                # Get the payload as a string of a value and a unit from the dictionary
-                payload = json.loads(metric["payload"])
-                value = str(payload["value"]) + " " + payload["unit"] + "\n"
+                # Get the typed value and unit (or the legacy JSON payload)
+                payload = metric
+                if metric.get("value") is None:
+                    payload = json.loads(metric["payload"])
+                value = str(payload["value"]) + " " + str(payload["unit"]) + "\n"
 
                 table.add_row(
                     "\n" + metric["name"],